@@ -1,308 +1,155 @@
-from flask import Flask, request, render_template, send_file, jsonify
+from flask import Flask, Response, request, render_template, send_file, jsonify
 import os
 import zipfile
-import tempfile
-import shutil
-import re
 import uuid
+import sys
+import glob
+import threading
 from werkzeug.utils import secure_filename
-from langchain.llms import Ollama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+
+# Share the cleaning engine with the package when running without installing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from code_cleaner.archive import clean_archive, stream_archive
+from code_cleaner.budget import Budget
+from code_cleaner.deadcode import analyze
+from code_cleaner.jobs import JobQueue, QueueFull, is_job_id
+from code_cleaner.safezip import ArchiveLimits, UnsafeArchive, open_archive
+from code_cleaner.store import ResultStore
+from code_cleaner.uploads import ChunkedUploads, UploadConflict, UploadNotFound, UploadTooLarge
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['PROCESSED_FOLDER'] = 'processed'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload size
+# Largest request body: a whole upload to /upload, or one chunk of a chunked upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('CODE_CLEANER_MAX_REQUEST_MB', 16)) * 1024 * 1024
+# Chunk size suggested to clients, largest chunked upload, and hours before an abandoned one is removed
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('CODE_CLEANER_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('CODE_CLEANER_MAX_UPLOAD_MB', 2048)) * 1024 * 1024
+app.config['UPLOAD_EXPIRY_HOURS'] = float(os.environ.get('CODE_CLEANER_UPLOAD_EXPIRY_HOURS', 24))
+# Entry count, sizes and compression ratio an uploaded archive must stay within
+app.config['ARCHIVE_LIMITS'] = ArchiveLimits.from_env()
+# Seconds and size allowed to clean one file before it is copied unchanged instead;
+# 30 seconds unless configured, so one file can't hold up a worker, and no size limit
+app.config['FILE_BUDGET'] = Budget.from_env(seconds=30.0)
+
+# Jobs processed at the same time, and jobs allowed to wait before uploads get a 503
+app.config['MAX_CONCURRENT_JOBS'] = int(os.environ.get('CODE_CLEANER_MAX_JOBS', 2))
+app.config['MAX_QUEUED_JOBS'] = int(os.environ.get('CODE_CLEANER_MAX_QUEUED', 16))
+
+# Files sent to the LLM at once per job, and the timeout and retries of each request
+app.config['LLM_CONCURRENCY'] = int(os.environ.get('CODE_CLEANER_LLM_CONCURRENCY', 4))
+app.config['LLM_TIMEOUT'] = float(os.environ.get('CODE_CLEANER_LLM_TIMEOUT', 120))
+app.config['LLM_RETRIES'] = int(os.environ.get('CODE_CLEANER_LLM_RETRIES', 2))
+# Files over this many tokens are sent to the LLM in chunks of whole definitions
+# (0 to send them whole, None for the default of code_cleaner.llm)
+app.config['LLM_CHUNK_TOKENS'] = (int(os.environ['CODE_CLEANER_LLM_CHUNK_TOKENS'])
+                                  if os.environ.get('CODE_CLEANER_LLM_CHUNK_TOKENS') else None)
+# Remove provably dead code without the LLM, and send it only the parts that may hold more
+app.config['LLM_STATIC_PASS'] = os.environ.get('CODE_CLEANER_STATIC_PASS', '1') not in ('', '0')
+# Directory of the LLM result cache (empty to disable) and its size limit
+app.config['LLM_CACHE_DIR'] = os.environ.get('CODE_CLEANER_LLM_CACHE', 'llm_cache')
+app.config['LLM_CACHE_MB'] = int(os.environ.get('CODE_CLEANER_LLM_CACHE_MB', 256))
+# Store of cleaned files shared by all jobs (empty to disable), and when its entries are evicted
+app.config['RESULT_STORE'] = os.environ.get('CODE_CLEANER_STORE', 'result_store')
+app.config['RESULT_STORE_MB'] = int(os.environ.get('CODE_CLEANER_STORE_MB', 1024))
+app.config['RESULT_STORE_DAYS'] = float(os.environ.get('CODE_CLEANER_STORE_DAYS', 30))
+# Load the model in the background at startup, so the first upload doesn't wait for it
+app.config['LLM_WARMUP'] = os.environ.get('CODE_CLEANER_LLM_WARMUP', '') not in ('', '0')
 
 # Create necessary directories if they don't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
 
-# Initialize Ollama LLM
-try:
-    ollama_llm = Ollama(model="llama3.2")
-except Exception as e:
-    print(f"Warning: Could not initialize Ollama: {e}")
-    ollama_llm = None
+# Large uploads arrive in chunks, resumed from where they broke off
+chunked_uploads = ChunkedUploads(os.path.join(app.config['UPLOAD_FOLDER'], 'chunked'),
+                                 app.config['MAX_UPLOAD_SIZE'], app.config['UPLOAD_EXPIRY_HOURS'] * 3600)
 
-# Language detection patterns
-def detect_language(file_path):
-    file_extension = os.path.splitext(file_path)[1].lower()
-    
-    language_map = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.java': 'java',
-        '.c': 'c',
-        '.cpp': 'cpp',
-        '.cs': 'csharp',
-        '.go': 'go',
-        '.rb': 'ruby',
-        '.php': 'php',
-        '.swift': 'swift',
-        '.ts': 'typescript',
-        '.html': 'html',
-        '.css': 'css',
-        '.sh': 'shell',
-        '.pl': 'perl',
-        '.kt': 'kotlin',
-        '.rs': 'rust',
-    }
-    
-    return language_map.get(file_extension, 'unknown')
-
-# Comment patterns for different languages
-comment_patterns = {
-    'python': [
-        r'#.*?$',                     # Single line comments
-        r'"""[\s\S]*?"""',           # Triple double quotes
-        r"'''[\s\S]*?'''",           # Triple single quotes
-    ],
-    'javascript': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'java': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'c': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'cpp': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'csharp': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'go': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'ruby': [
-        r'#.*?$',                     # Single line comments
-        r'=begin[\s\S]*?=end',        # Multi-line comments
-    ],
-    'php': [
-        r'//.*?$',                    # Single line comments
-        r'#.*?$',                     # Single line comments (alternative)
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'swift': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'typescript': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'html': [
-        r'<!--[\s\S]*?-->',           # HTML comments
-    ],
-    'css': [
-        r'/\*[\s\S]*?\*/',           # CSS comments
-    ],
-    'shell': [
-        r'#.*?$',                     # Single line comments
-    ],
-    'perl': [
-        r'#.*?$',                     # Single line comments
-        r'=pod[\s\S]*?=cut',          # POD documentation
-    ],
-    'kotlin': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'rust': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'unknown': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-        r'#.*?$',                     # Single line comments (alternative)
-        r'"""[\s\S]*?"""',           # Triple double quotes
-        r"'''[\s\S]*?'''",           # Triple single quotes
-    ],
-}
-
-# Console/log statement patterns for different languages
-log_patterns = {
-    'python': [
-        r'print\s*\(.*?\)',
-        r'logging\.\w+\s*\(.*?\)',
-    ],
-    'javascript': [
-        r'console\.\w+\s*\(.*?\)',
-        r'alert\s*\(.*?\)',
-    ],
-    'java': [
-        r'System\.out\.\w+\s*\(.*?\)',
-        r'System\.err\.\w+\s*\(.*?\)',
-        r'logger\.\w+\s*\(.*?\)',
-    ],
-    'c': [
-        r'printf\s*\(.*?\)',
-        r'fprintf\s*\(.*?\)',
-    ],
-    'cpp': [
-        r'std::cout.*?<<',
-        r'std::cerr.*?<<',
-    ],
-    'csharp': [
-        r'Console\.\w+\s*\(.*?\)',
-        r'Debug\.\w+\s*\(.*?\)',
-    ],
-    'go': [
-        r'fmt\.\w+\s*\(.*?\)',
-        r'log\.\w+\s*\(.*?\)',
-    ],
-    'ruby': [
-        r'puts\s+.*?$',
-        r'print\s+.*?$',
-        r'p\s+.*?$',
-    ],
-    'php': [
-        r'echo\s+.*?;',
-        r'print\s+.*?;',
-        r'var_dump\s*\(.*?\)',
-    ],
-    'swift': [
-        r'print\s*\(.*?\)',
-        r'NSLog\s*\(.*?\)',
-    ],
-    'typescript': [
-        r'console\.\w+\s*\(.*?\)',
-    ],
-    'shell': [
-        r'echo\s+.*?$',
-    ],
-    'perl': [
-        r'print\s+.*?;',
-    ],
-    'kotlin': [
-        r'println\s*\(.*?\)',
-    ],
-    'rust': [
-        r'println!\s*\(.*?\)',
-        r'print!\s*\(.*?\)',
-    ],
-    'unknown': [
-        r'console\.\w+\s*\(.*?\)',
-        r'print\s*\(.*?\)',
-        r'System\.out\.\w+\s*\(.*?\)',
-        r'echo\s+.*?$',
-    ],
-}
-
-# Function to remove comments and log statements from code
-def process_file(file_path, language):
+# Files seen by an earlier job are taken from here instead of being cleaned again
+result_store = None
+if app.config['RESULT_STORE']:
+    result_store = ResultStore(app.config['RESULT_STORE'], app.config['RESULT_STORE_MB'] * 1024 * 1024,
+                               app.config['RESULT_STORE_DAYS'] * 86400)
+
+# One Ollama client shared by all jobs, so connections are kept alive between files.
+# It is created on the first dead-code request, so starting the app costs nothing for it.
+ollama_llm = None
+llm_cache = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    global ollama_llm, llm_cache
+    with _llm_lock:
+        if ollama_llm is None:
+            from code_cleaner.llm import OllamaClient
+            from code_cleaner.llm_cache import LLMCache
+
+            # Re-submitted files get their dead-code results from disk instead of the model
+            if app.config['LLM_CACHE_DIR']:
+                llm_cache = LLMCache(app.config['LLM_CACHE_DIR'], app.config['LLM_CACHE_MB'] * 1024 * 1024)
+            options = {}
+            if app.config['LLM_CHUNK_TOKENS'] is not None:
+                options['max_chunk_tokens'] = app.config['LLM_CHUNK_TOKENS']
+            ollama_llm = OllamaClient(model="llama3.2", concurrency=app.config['LLM_CONCURRENCY'],
+                                      timeout=app.config['LLM_TIMEOUT'], retries=app.config['LLM_RETRIES'],
+                                      cache=llm_cache, static_pass=app.config['LLM_STATIC_PASS'], **options)
+        return ollama_llm
+
+# Load the model ahead of the first upload
+def warm_up_llm():
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            content = file.read()
-        
-        # Remove comments
-        for pattern in comment_patterns.get(language, comment_patterns['unknown']):
-            content = re.sub(pattern, '', content, flags=re.MULTILINE)
-        
-        # Remove log statements
-        for pattern in log_patterns.get(language, log_patterns['unknown']):
-            content = re.sub(pattern, '', content, flags=re.MULTILINE)
-        
-        # Use LLM to identify and remove dead code if available
-        if ollama_llm and language != 'unknown':
-            try:
-                content = remove_dead_code_with_llm(content, language)
-            except Exception as e:
-                print(f"Error using LLM for dead code removal: {e}")
-        
-        # Write processed content back to file
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(content)
-            
-        return True
+        get_llm().warmup()
     except Exception as e:
-        print(f"Error processing file {file_path}: {e}")
-        return False
+        print(f"Warning: Could not warm up the LLM: {e}")
+
+# Background workers that process uploaded ZIP files
+job_queue = JobQueue(app.config['MAX_CONCURRENT_JOBS'], app.config['MAX_QUEUED_JOBS'])
+
+# Extra step run on each cleaned file: use the LLM to identify and remove dead code if available.
+# The static pass runs first, so its removals are kept when the model is down or times out.
+def remove_dead_code(content, language):
+    if language == 'unknown':
+        return content
+    analysis = None
+    if app.config['LLM_STATIC_PASS']:
+        try:
+            analysis = analyze(content, language)
+            content = analysis.text
+        except Exception as e:
+            print(f"Error in static dead code removal: {e}")
+    try:
+        return remove_dead_code_with_llm(content, language, analysis)
+    except Exception as e:
+        print(f"Error using LLM for dead code removal: {e}")
+    return content
 
 # Function to use LLM for dead code removal
-def remove_dead_code_with_llm(code, language):
-    if not ollama_llm:
-        return code
-        
-    prompt = PromptTemplate(
-        input_variables=["code", "language"],
-        template="""You are an expert code analyzer. Analyze the following {language} code and remove any dead code (code that is never executed or has no effect). 
-        Do not remove functional code. Return only the cleaned code without any explanations.
-        
-        CODE:
-        {code}
-        
-        CLEANED CODE:"""
-    )
-    
-    chain = LLMChain(llm=ollama_llm, prompt=prompt)
-    result = chain.run(code=code, language=language)
-    
-    # If the result is empty or significantly shorter than the original, return the original
-    if not result or len(result) < len(code) * 0.5:
-        return code
-        
-    return result
+def remove_dead_code_with_llm(code, language, analysis=None):
+    return get_llm().remove_dead_code(code, language, analysis)
 
-# Process a zip file
-def process_zip_file(zip_path):
+# Process a zip file, member by member, without extracting it
+def process_zip_file(zip_path, job_id=None, progress=None):
     # Create a unique ID for this processing job
-    job_id = str(uuid.uuid4())
-    extract_dir = os.path.join(tempfile.gettempdir(), job_id)
+    job_id = job_id or str(uuid.uuid4())
     
     # Ensure the processed folder exists
     os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
     processed_zip = os.path.join(app.config['PROCESSED_FOLDER'], f"{job_id}_processed.zip")
     
     try:
-        # Create extraction directory
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        # Extract zip file
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Process each file
-        processed_files = 0
-        skipped_files = 0
-        
-        for root, _, files in os.walk(extract_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                language = detect_language(file_path)
-                
-                if language != 'unknown':
-                    success = process_file(file_path, language)
-                    if success:
-                        processed_files += 1
-                    else:
-                        skipped_files += 1
-                else:
-                    skipped_files += 1
-        
-        # Create a new zip file with processed files
-        with zipfile.ZipFile(processed_zip, 'w') as zipf:
-            for root, _, files in os.walk(extract_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, extract_dir)
-                    zipf.write(file_path, arcname)
+        # Comments and log statements are removed in a single pass; other files are copied as they are
+        processed_files, skipped_files, over_budget_files = clean_archive(
+            zip_path, processed_zip, exclude_patterns=(), transform=remove_dead_code,
+            transform_workers=app.config['LLM_CONCURRENCY'], progress=progress, store=result_store,
+            limits=app.config['ARCHIVE_LIMITS'], budget=app.config['FILE_BUDGET'])
+        if result_store is not None:
+            result_store.evict()
         
         return {
             'success': True,
             'processed_zip': processed_zip,
             'processed_files': processed_files,
             'skipped_files': skipped_files,
+            'over_budget_files': over_budget_files,
             'job_id': job_id
         }
     except zipfile.BadZipFile:
@@ -317,10 +164,6 @@ def process_zip_file(zip_path):
             'success': False,
             'error': str(e)
         }
-    finally:
-        # Clean up extraction directory
-        if os.path.exists(extract_dir):
-            shutil.rmtree(extract_dir)
 
 @app.route('/')
 def index():
@@ -339,41 +182,175 @@ def upload_file():
     if not file.filename.endswith('.zip'):
         return jsonify({'error': 'Only ZIP files are supported'}), 400
     
+    # Save the uploaded file under the job ID, so concurrent uploads of the same name don't collide
+    job_id = str(uuid.uuid4())
+    filename = secure_filename(file.filename)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+    file.save(file_path)
+    
+    # Debug: Log the saved file path
+    print(f"Uploaded file saved at: {file_path}")
+    
+    return queue_upload(job_id, file_path)
+
+# Start a chunked upload of a large archive; the chunks are then PUT to the returned URL
+@app.route('/uploads', methods=['POST'])
+def start_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not filename.endswith('.zip'):
+        return jsonify({'error': 'Only ZIP files are supported'}), 400
+    if not isinstance(data.get('size'), int):
+        return jsonify({'error': 'The upload size is required'}), 400
+    
     try:
-        # Save the uploaded file
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        # Debug: Log the saved file path
-        print(f"Uploaded file saved at: {file_path}")
-        
-        # Process the zip file
-        result = process_zip_file(file_path)
-        
-        if result['success']:
-            return jsonify({
-                'success': True,
-                'job_id': result['job_id'],
-                'processed_files': result['processed_files'],
-                'skipped_files': result['skipped_files']
-            })
-        else:
-            print(f"Error during ZIP processing: {result['error']}")
-            return jsonify({'error': result['error']}), 500
-    except Exception as e:
-        print(f"Unexpected error during file upload: {e}")
-        return jsonify({'error': str(e)}), 500
+        upload_id = chunked_uploads.start(filename, data['size'])
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    
+    return jsonify({
+        'upload_id': upload_id,
+        'upload_url': f'/uploads/{upload_id}',
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+# How many bytes of an upload arrived, so a client can resume after a failed chunk
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    try:
+        status = chunked_uploads.status(upload_id)
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'received': status['received'], 'size': status['size']})
+
+# Append the request body at the byte offset given in the Upload-Offset header
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'error': 'Upload-Offset and Content-Length headers are required'}), 400
+    
+    try:
+        received = chunked_uploads.append(upload_id, offset, request.stream, request.content_length)
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadConflict as e:
+        return jsonify({'error': str(e), 'received': e.received}), 409
+    return jsonify({'received': received})
+
+# Turn a fully received chunked upload into a job, as /upload does
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    try:
+        filename = chunked_uploads.status(upload_id)['filename']
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    
+    job_id = str(uuid.uuid4())
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{secure_filename(filename)}")
+    try:
+        chunked_uploads.finish(upload_id, file_path)
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadConflict as e:
+        return jsonify({'error': str(e), 'received': e.received}), 409
+    
+    return queue_upload(job_id, file_path)
+
+# Check a saved upload against the archive limits before queueing it
+def queue_upload(job_id, file_path):
+    try:
+        open_archive(file_path, app.config['ARCHIVE_LIMITS']).close()
+    except zipfile.BadZipFile as e:
+        os.remove(file_path)
+        return jsonify({'error': str(e) if isinstance(e, UnsafeArchive) else 'Invalid ZIP file format'}), 400
+    
+    # Queue the zip file for processing and answer right away
+    try:
+        job_queue.submit(run_upload_job, file_path, job_id=job_id)
+    except QueueFull:
+        os.remove(file_path)
+        return jsonify({'error': 'Server is busy, please retry later'}), 503
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/status/{job_id}'
+    }), 202
+
+def run_upload_job(job, zip_path):
+    result = process_zip_file(zip_path, job.id, job.progress)
+    if not result['success']:
+        print(f"Error during ZIP processing: {result['error']}")
+        raise RuntimeError(result['error'])
+    return {
+        'processed_files': result['processed_files'],
+        'skipped_files': result['skipped_files'],
+        'over_budget_files': result['over_budget_files']
+    }
+
+@app.route('/status/<job_id>')
+def job_status(job_id):
+    if not is_job_id(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    result = job.to_dict()
+    result['queue_position'] = job_queue.position(job)
+    if job.status == 'done':
+        result.update(job.result)
+    return jsonify(result)
+
+@app.route('/llm-cache')
+def llm_cache_stats():
+    if ollama_llm is None:
+        return jsonify({'enabled': bool(app.config['LLM_CACHE_DIR']), 'loaded': False})
+    stats = {'loaded': True, 'chunks_sent': ollama_llm.chunks_sent, 'chunks_skipped': ollama_llm.chunks_skipped}
+    if llm_cache is None:
+        return jsonify(dict(stats, enabled=False))
+    return jsonify(dict(llm_cache.stats(), enabled=True, **stats))
+
+@app.route('/llm-health')
+def llm_health():
+    health = get_llm().health()
+    return jsonify(health), 200 if health['model_available'] else 503
 
 @app.route('/download/<job_id>')
 def download_file(job_id):
+    # Checked before it goes into any path or glob
+    if not is_job_id(job_id):
+        return jsonify({'error': 'Processed file not found'}), 404
     processed_zip = os.path.join(app.config['PROCESSED_FOLDER'], f"{job_id}_processed.zip")
     
     # Debug information
     print(f"Download requested for job_id: {job_id}")
     print(f"Looking for file at path: {processed_zip}")
     
+    job = job_queue.get(job_id)
+    if job is not None and job.status != 'done':
+        return jsonify({'error': 'Job has not finished', 'status': job.status}), 409
+    
     if not os.path.exists(processed_zip):
+        # With ?stream=1, clean an upload that has no job, such as one from before a restart, while sending it
+        uploads = glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], f"{glob.escape(job_id)}_*"))
+        if job is None and request.args.get('stream') == '1' and uploads and zipfile.is_zipfile(uploads[0]):
+            # The stream does a job's work, so it takes a job's slot
+            try:
+                job_queue.start_stream()
+            except QueueFull:
+                return jsonify({'error': 'Server is busy, please retry later'}), 503
+            response = Response(stream_archive(uploads[0], exclude_patterns=(), transform=remove_dead_code,
+                                               transform_workers=app.config['LLM_CONCURRENCY'], store=result_store,
+                                               limits=app.config['ARCHIVE_LIMITS'], budget=app.config['FILE_BUDGET']),
+                                mimetype='application/zip',
+                                headers={'Content-Disposition': 'attachment; filename=processed_code.zip'})
+            response.call_on_close(job_queue.end_stream)
+            return response
+
         print(f"Error: File not found at {processed_zip}")
         # Check if the processed folder exists and is writable
         if not os.path.exists(app.config['PROCESSED_FOLDER']):
@@ -403,5 +380,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Code Cleaner Application')
     parser.add_argument('--port', type=int, default=5000, help='Port to run the server on')
     args = parser.parse_args()
+
+    if app.config['LLM_WARMUP']:
+        threading.Thread(target=warm_up_llm, daemon=True).start()
     
     app.run(host='0.0.0.0', port=args.port)
\ No newline at end of file
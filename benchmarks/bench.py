@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Throughput benchmarks for the cleaning pipeline.
+
+Generates a deterministic corpus (see corpus.py) and times process_file,
+the in-memory clean_many, the scanner next to the ``re.sub`` chain it
+replaced, should_process_file, the directory walk, the extracting ZIP round trip,
+the single-pass archive pipeline, the LLM stage (against the fake
+server in fake_ollama.py) and process startup, reporting files/sec and
+MB/sec. Results can be saved and later compared against a baseline; the
+comparison exits with status 1 on a regression.
+
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --baseline baseline.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Callable, Dict, List
+
+import corpus  # also puts src/ on sys.path
+
+from code_cleaner import clean_many, sniff
+from code_cleaner.cli import process_file, should_process_file
+from code_cleaner.rules import COMMENT_PATTERNS, EXTENSION_MAP, LOG_PATTERNS, rules
+from code_cleaner.walker import walk_files
+
+EXCLUDE_PATTERNS = ['node_modules', '.git', '__pycache__', '.DS_Store']
+
+# Corpus kinds the re.sub chain is timed on; on 'strings' an unclosed block
+# opener inside a literal makes it quadratic, so it would never finish
+REGEX_BASELINE_KINDS = ('small', 'huge', 'nested', 'minified')
+
+
+def _regex_chain(language: str) -> List[str]:
+    """The ``re.sub`` patterns the scanner replaced: each comment kind, then each log pattern.
+
+    They ignore string literals, so they aren't a correct cleaner, but they
+    are the speed the single-pass scanner has to keep up with.
+    """
+    comments = COMMENT_PATTERNS[language]
+    chain = [re.escape(marker) + '.*?$' for marker in comments.get('line', [])]
+    chain += [re.escape(opener) + r'[\s\S]*?' + re.escape(closer) for opener, closer in comments.get('block', [])]
+    return chain + LOG_PATTERNS.get(language, [])
+
+
+def _best_of(repeat: int, run: Callable[[], None], setup: Callable[[], None] = None) -> float:
+    """Return the fastest wall-clock time of ``repeat`` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _result(seconds: float, files: int, size: int) -> Dict[str, float]:
+    return {
+        'seconds': seconds,
+        'files_per_sec': files / seconds if seconds else 0.0,
+        'mb_per_sec': size / (1024 * 1024) / seconds if seconds else 0.0,
+    }
+
+
+def bench_process_file(paths: List[str], output_dir: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time process_file per corpus kind, so regressions point at an input shape."""
+    results = {}
+    for kind in corpus.KINDS:
+        selected = [path for path in paths if os.path.basename(path).startswith(kind + '.')]
+        size = sum(os.path.getsize(path) for path in selected)
+
+        def run():
+            for path in selected:
+                process_file(path, os.path.join(output_dir, os.path.relpath(path, os.path.dirname(output_dir))))
+
+        results[f'process_file.{kind}'] = _result(_best_of(repeat, run), len(selected), size)
+    return results
+
+
+def bench_clean_many(paths: List[str], repeat: int) -> Dict[str, float]:
+    """Time the in-memory API on the corpus, without the file round trip of process_file."""
+    sources = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as file:
+            sources.append((path, file.read()))
+    size = sum(os.path.getsize(path) for path in paths)
+
+    def run():
+        for _ in clean_many(sources):
+            pass
+
+    return _result(_best_of(repeat, run), len(sources), size)
+
+
+def bench_scanner(paths: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time the scanner per corpus kind, next to the ``re.sub`` chain it replaced."""
+    results = {}
+    for kind in corpus.KINDS:
+        sources = []
+        for path in paths:
+            if os.path.basename(path).startswith(kind + '.'):
+                with open(path, 'r', encoding='utf-8', errors='ignore') as file:
+                    sources.append((EXTENSION_MAP[os.path.splitext(path)[1]], file.read()))
+        size = sum(len(text.encode('utf-8')) for _, text in sources)
+        chains = {language: [re.compile(p, re.MULTILINE) for p in _regex_chain(language)] for language, _ in sources}
+
+        def run_scanner():
+            for language, text in sources:
+                rules.get(language).clean(text, {})
+
+        def run_regex():
+            for language, text in sources:
+                for pattern in chains[language]:
+                    text = pattern.sub('', text)
+
+        results[f'scanner.{kind}'] = _result(_best_of(repeat, run_scanner), len(sources), size)
+        if kind in REGEX_BASELINE_KINDS:
+            results[f'regex_baseline.{kind}'] = _result(_best_of(repeat, run_regex), len(sources), size)
+    return results
+
+
+def scanner_slowdown(results: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Return, per corpus kind, how many times slower the scanner is than the re.sub chain."""
+    slowdown = {}
+    for kind in REGEX_BASELINE_KINDS:
+        scanner, regex = results.get(f'scanner.{kind}'), results.get(f'regex_baseline.{kind}')
+        if scanner and regex and regex['seconds']:
+            slowdown[kind] = scanner['seconds'] / regex['seconds']
+    return slowdown
+
+
+def bench_should_process_file(paths: List[str], output_dir: str, repeat: int) -> Dict[str, float]:
+    """Time the file filter with a cold classification cache."""
+    size = sum(os.path.getsize(path) for path in paths)
+
+    def run():
+        for path in paths:
+            should_process_file(path, EXCLUDE_PATTERNS, output_dir)
+
+    return _result(_best_of(repeat, run, sniff._cache.clear), len(paths), size)
+
+
+def bench_walk(root: str, repeat: int) -> Dict[str, float]:
+    """Time walking the corpus tree."""
+    found = []
+
+    def run():
+        found[:] = [path for _, path in walk_files(root, EXCLUDE_PATTERNS)]
+
+    seconds = _best_of(repeat, run)
+    return _result(seconds, len(found), 0)
+
+
+def bench_zip_round_trip(root: str, work_dir: str, repeat: int) -> Dict[str, float]:
+    """Time extract, web.process_files and web.create_zip on a ZIP of the corpus."""
+    from code_cleaner import web
+
+    upload = os.path.join(work_dir, 'upload.zip')
+    with zipfile.ZipFile(upload, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for _, relative_path in walk_files(root):
+            zipf.write(os.path.join(root, relative_path), relative_path)
+    size = os.path.getsize(upload)
+    with zipfile.ZipFile(upload) as zipf:
+        files = len(zipf.namelist())
+
+    def setup():
+        for name in ('extracted', 'processed'):
+            shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+
+    def run():
+        extract_dir = os.path.join(work_dir, 'extracted')
+        processed_dir = os.path.join(work_dir, 'processed')
+        os.makedirs(processed_dir)
+        with zipfile.ZipFile(upload) as zipf:
+            zipf.extractall(extract_dir)
+        web.process_files(extract_dir, processed_dir)
+        web.create_zip(processed_dir, os.path.join(processed_dir, 'processed.zip'))
+
+    return _result(_best_of(repeat, run, setup), files, size)
+
+
+def bench_archive(root: str, work_dir: str, repeat: int) -> Dict[str, float]:
+    """Time archive.clean_archive, which cleans the same ZIP without extracting it."""
+    from code_cleaner.archive import clean_archive
+
+    upload = os.path.join(work_dir, 'upload.zip')
+    if not os.path.exists(upload):
+        with zipfile.ZipFile(upload, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for _, relative_path in walk_files(root):
+                zipf.write(os.path.join(root, relative_path), relative_path)
+    size = os.path.getsize(upload)
+    with zipfile.ZipFile(upload) as zipf:
+        files = len(zipf.namelist())
+
+    def run():
+        clean_archive(upload, os.path.join(work_dir, 'archive.zip'))
+
+    return _result(_best_of(repeat, run), files, size)
+
+
+def bench_llm(paths: List[str], work_dir: str, repeat: int, latency: float = 0.02) -> Dict[str, Dict[str, float]]:
+    """Time the LLM dead-code stage against the fake Ollama server.
+
+    Runs it serially, concurrently, with the static pre-pass and cached.
+    """
+    from code_cleaner.archive import clean_archive
+    from code_cleaner.llm import OllamaClient
+    from code_cleaner.llm_cache import LLMCache
+    from fake_ollama import FakeOllama
+
+    selected = [path for path in paths if os.path.basename(path).startswith('small.')]
+    upload = os.path.join(work_dir, 'llm.zip')
+    with zipfile.ZipFile(upload, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for path in selected:
+            zipf.write(path, os.path.relpath(path, work_dir))
+    size = sum(os.path.getsize(path) for path in selected)
+
+    results = {}
+    with FakeOllama(latency=latency) as fake, OllamaClient(fake.url, concurrency=4, static_pass=False) as client:
+        for name, workers in (('serial', 1), ('concurrent', client.concurrency)):
+            def run():
+                clean_archive(upload, os.path.join(work_dir, 'llm-out.zip'), transform=client.remove_dead_code,
+                              transform_workers=workers)
+
+            results[f'llm.{name}'] = _result(_best_of(repeat, run), len(selected), size)
+
+        # Only the chunks the static pass is unsure about go to the model
+        client.static_pass = True
+        requests = fake.requests
+
+        def run():
+            clean_archive(upload, os.path.join(work_dir, 'llm-out.zip'), transform=client.remove_dead_code,
+                          transform_workers=client.concurrency)
+
+        results['llm.static'] = _result(_best_of(repeat, run), len(selected), size)
+        print(f"llm.static: {(fake.requests - requests) // repeat} model calls per run, "
+              f"{client.chunks_skipped // repeat} chunks skipped", file=sys.stderr)
+
+        # Every run after the first is served from the result cache
+        client.cache = LLMCache(os.path.join(work_dir, 'llm-cache'))
+
+        def run():
+            clean_archive(upload, os.path.join(work_dir, 'llm-out.zip'), transform=client.remove_dead_code)
+
+        run()
+        results['llm.cached'] = _result(_best_of(repeat, run), len(selected), size)
+    return results
+
+
+def bench_startup(repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time fresh interpreters running ``code-cleaner --help`` and importing the web apps.
+
+    Reported as starts/sec in the files/sec column. The web apps are only
+    timed when Flask is installed.
+    """
+    import importlib.util
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(root, 'src'), root]))
+    commands = {'startup.cli_help': [sys.executable, '-m', 'code_cleaner.cli', '--help']}
+    if importlib.util.find_spec('flask') is not None:
+        commands['startup.web_import'] = [sys.executable, '-c', 'import code_cleaner.web']
+        commands['startup.app_import'] = [sys.executable, '-c', 'import app']
+    else:
+        print("Skipping startup.web_import and startup.app_import: Flask is not installed", file=sys.stderr)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='code-cleaner-startup-') as cwd:
+        # app.py creates its folders in the working directory
+        for name, command in commands.items():
+            def run():
+                subprocess.run(command, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+            results[name] = _result(_best_of(repeat, run), 1, 0)
+    return results
+
+
+def run_benchmarks(scale: float, repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    work_dir = tempfile.mkdtemp(prefix='code-cleaner-bench-')
+    try:
+        root = os.path.join(work_dir, 'corpus')
+        paths = corpus.write_corpus(root, scale, seed)
+        output_dir = os.path.join(work_dir, 'copy')
+
+        results = {}
+        results.update(bench_process_file(paths, output_dir, repeat))
+        results['clean_many'] = bench_clean_many(paths, repeat)
+        results.update(bench_scanner(paths, repeat))
+        results['should_process_file'] = bench_should_process_file(paths, output_dir, repeat)
+        results['walk'] = bench_walk(root, repeat)
+        try:
+            results['zip_round_trip'] = bench_zip_round_trip(root, work_dir, repeat)
+        except ImportError as e:
+            print(f"Skipping zip_round_trip: {e}", file=sys.stderr)
+        results['archive'] = bench_archive(root, work_dir, repeat)
+        results.update(bench_llm(paths, work_dir, repeat))
+        results.update(bench_startup(repeat))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """Print throughput changes against a baseline and return the regressed benchmarks."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or not before['files_per_sec']:
+            continue
+        change = result['files_per_sec'] / before['files_per_sec'] - 1
+        flag = ''
+        if change < -tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:32} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Code Cleaner benchmarks')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply corpus file sizes (default: 1.0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the best is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus seed (default: 0)')
+    parser.add_argument('--save', metavar='FILE', help='Write results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed throughput drop before a benchmark counts as regressed (default: 0.10)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scale, args.repeat, args.seed)
+
+    print(f"{'benchmark':32} {'files/s':>10} {'MB/s':>10} {'seconds':>10}")
+    for name, result in results.items():
+        print(f"{name:32} {result['files_per_sec']:10.1f} {result['mb_per_sec']:10.2f} {result['seconds']:10.4f}")
+
+    slowdown = scanner_slowdown(results)
+    if slowdown:
+        print()
+        print(f"{'scanner vs re.sub chain':32} {'slowdown':>10}")
+        for kind, factor in slowdown.items():
+            print(f"{kind:32} {factor:9.2f}x")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump({'scale': args.scale, 'seed': args.seed, 'results': results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('scale') != args.scale or baseline.get('seed') != args.seed:
+            print("Warning: baseline was recorded with a different --scale or --seed", file=sys.stderr)
+        print()
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
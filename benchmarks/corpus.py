@@ -0,0 +1,145 @@
+"""Deterministic synthetic source corpus for the benchmarks."""
+
+import os
+import random
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from code_cleaner.rules import COMMENT_PATTERNS, EXTENSION_MAP, STRING_PATTERNS  # noqa: E402
+
+# A log statement the language's LOG_PATTERNS remove
+LOG_SAMPLES = {
+    'python': 'print("value", {n})',
+    'javascript': 'console.log("value", {n});',
+    'java': 'System.out.println("value " + {n});',
+    'c': 'printf("value %d\\n", {n});',
+    'cpp': 'std::cout << "value" << {n};',
+    'csharp': 'Console.WriteLine("value {n}");',
+    'go': 'fmt.Println("value", {n})',
+    'ruby': 'puts "value #{n}"',
+    'php': 'echo "value {n}";',
+    'swift': 'print("value \\({n})")',
+    'typescript': 'console.log("value", {n});',
+    'html': '<p>value {n}</p>',
+    'css': '.item-{n} {{ color: #{n:06d}; }}',
+    'shell': 'echo "value {n}"',
+    'perl': 'print "value {n}\\n";',
+    'kotlin': 'println("value $x{n}")',
+    'rust': 'println!("value {{}}", {n});',
+}
+
+# Sizes in bytes before scaling
+SMALL_SIZE = 2 * 1024
+LARGE_SIZE = 2 * 1024 * 1024
+
+KINDS = ('small', 'huge', 'nested', 'strings', 'minified')
+
+
+class _Syntax:
+    """The comment, string and log syntax used to generate one language."""
+
+    def __init__(self, language: str):
+        comments = COMMENT_PATTERNS[language]
+        lines = comments.get('line', [])
+        blocks = comments.get('block', [])
+        strings = STRING_PATTERNS.get(language, [])
+        self.line = lines[0] if lines else None
+        self.block = blocks[0] if blocks else None
+        self.quote = strings[0].quote if strings else '"'
+        self.log = LOG_SAMPLES[language]
+
+    def comment(self, text: str) -> str:
+        if self.line:
+            return f'{self.line} {text}'
+        return f'{self.block[0]} {text} {self.block[1]}'
+
+
+def _code_line(syntax: _Syntax, rng: random.Random, n: int) -> str:
+    q = syntax.quote
+    marker = syntax.line or syntax.block[0]
+    choice = rng.random()
+    if choice < 0.45:
+        return f'value_{n} = compute(value_{n - 1}, {rng.randint(0, 999)});'
+    if choice < 0.6:
+        return f'label_{n} = {q}item {n} {marker} kept{q};'
+    if choice < 0.8:
+        return syntax.comment(f'note {n}: ' + 'lorem ipsum ' * rng.randint(1, 6))
+    if choice < 0.9:
+        return syntax.log.format(n=n)
+    if syntax.block:
+        return f'{syntax.block[0]}\n * block {n}\n * ' + 'detail ' * rng.randint(1, 8) + f'\n {syntax.block[1]}'
+    return syntax.comment(f'extra {n}')
+
+
+def _lines(syntax: _Syntax, rng: random.Random, size: int) -> List[str]:
+    lines, total, n = [], 0, 0
+    while total < size:
+        n += 1
+        line = _code_line(syntax, rng, n)
+        lines.append(line)
+        total += len(line) + 1
+    return lines
+
+
+def generate_source(language: str, kind: str, scale: float = 1.0, seed: int = 0) -> str:
+    """Return one synthetic file of the given language and kind."""
+    rng = random.Random(f'{language}:{kind}:{seed}')
+    syntax = _Syntax(language)
+    small = max(256, int(SMALL_SIZE * scale))
+    large = max(4096, int(LARGE_SIZE * scale))
+
+    if kind == 'small':
+        return '\n'.join(_lines(syntax, rng, small)) + '\n'
+    if kind == 'huge':
+        return '\n'.join(_lines(syntax, rng, large)) + '\n'
+    if kind == 'nested':
+        # Comment openers nested inside comments, and long runs of comment lines
+        parts, total = [], 0
+        opener, closer = syntax.block or (syntax.line, '\n')
+        while total < large // 4:
+            depth = rng.randint(1, 20)
+            part = (opener + ' level ') * depth + 'body' + closer + '\n'
+            part += '\n'.join(syntax.comment(f'run {i}') for i in range(depth)) + '\n'
+            part += _code_line(syntax, rng, total) + '\n'
+            parts.append(part)
+            total += len(part)
+        return ''.join(parts)
+    if kind == 'strings':
+        q = syntax.quote
+        marker = syntax.line or syntax.block[0]
+        parts, total, n = [], 0, 0
+        while total < large // 4:
+            n += 1
+            part = f'text_{n} = {q}{marker} not a comment \\{q} escaped {n}{q} + {q}{q};\n'
+            parts.append(part)
+            total += len(part)
+        return ''.join(parts)
+    if kind == 'minified':
+        # Everything on one line, as in bundled JavaScript or CSS
+        lines = [line for line in _lines(syntax, rng, large // 4) if syntax.line is None or syntax.line not in line]
+        return ' '.join(line.replace('\n', ' ') for line in lines)
+    raise ValueError(f'Unknown corpus kind: {kind}')
+
+
+def languages() -> Dict[str, str]:
+    """Map each language to one of its file extensions."""
+    extensions = {}
+    for extension, language in EXTENSION_MAP.items():
+        extensions.setdefault(language, extension)
+    return extensions
+
+
+def write_corpus(directory: str, scale: float = 1.0, seed: int = 0, kinds=KINDS) -> List[str]:
+    """Write one file per language and kind under ``directory`` and return their paths."""
+    paths = []
+    for language, extension in sorted(languages().items()):
+        language_dir = os.path.join(directory, language)
+        os.makedirs(language_dir, exist_ok=True)
+        for kind in kinds:
+            path = os.path.join(language_dir, kind + extension)
+            with open(path, 'w', encoding='utf-8', newline='\n') as file:
+                file.write(generate_source(language, kind, scale, seed))
+            paths.append(path)
+    return paths
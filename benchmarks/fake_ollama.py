@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Ollama HTTP API, for benchmarks and manual testing.
+
+Answers /api/generate by echoing the code of a dead-code prompt back after
+a fixed latency, so the LLM stage can be exercised without a model:
+
+    python benchmarks/fake_ollama.py --port 11434 --latency 0.2
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import corpus  # noqa: F401  puts src/ on sys.path
+
+from code_cleaner.llm import PROMPT
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, as the real server
+    wbufsize = -1  # send headers and body in one segment
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._answer(200, {'models': [{'name': f'{self.server.model}:latest'}]})
+        else:
+            self._answer(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != '/api/generate':
+            self._answer(404, {'error': 'not found'})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            failing = self.server.requests <= self.server.fail_first
+        if failing:
+            self._answer(503, {'error': 'warming up'})
+            return
+        time.sleep(self.server.latency)
+        self._answer(200, {'model': body.get('model'), 'response': _echo_code(body.get('prompt', '')), 'done': True})
+
+    def _answer(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# The text around the code in a dead-code prompt; what precedes it is cut to
+# its last line, as the language is filled in further up
+_BEFORE_CODE, _AFTER_CODE = PROMPT.split('{code}')
+_BEFORE_CODE = _BEFORE_CODE[_BEFORE_CODE.rindex('CODE:'):]
+
+
+def _echo_code(prompt: str) -> str:
+    """Return the code embedded in a dead-code prompt unchanged, or the whole prompt."""
+    start = prompt.find(_BEFORE_CODE)
+    end = prompt.rfind(_AFTER_CODE)
+    if start == -1 or end == -1:
+        return prompt
+    return prompt[start + len(_BEFORE_CODE):end]
+
+
+class FakeOllama:
+    """Fake server running on a background thread; use as a context manager.
+
+    ``latency`` is added to every generate call; the first ``fail_first``
+    calls answer 503, to exercise retries.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, model: str = 'llama3.2', fail_first: int = 0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.model = model
+        self.server.fail_first = fail_first
+        self.server.requests = 0
+        self.server.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Ollama server')
+    parser.add_argument('--port', type=int, default=11434, help='Port to listen on (default: 11434)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds added to each generate call (default: 0.2)')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N generate calls with 503')
+    args = parser.parse_args()
+
+    with FakeOllama(args.port, args.latency, fail_first=args.fail_first) as fake:
+        print(f"Fake Ollama listening on {fake.url}")
+        try:
+            fake._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Adversarial inputs that check cleaning stays linear-time.
+
+For every language, builds single-line inputs that defeat a naive
+scanner (log calls that never close, unterminated strings full of
+escaped quotes, unterminated block comments) and a seeded fuzz mix of
+all its tokens, then cleans each at three sizes, in memory and streamed.
+A case whose time grows more than ``--max-growth`` times when its input
+grows four times is reported as superlinear, and the script exits with
+status 1.
+
+    python benchmarks/pathological.py
+    python benchmarks/pathological.py --size 1024 --language python
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import corpus  # also puts src/ on sys.path
+
+from code_cleaner.rules import COMMENT_PATTERNS, rules
+
+# Input sizes tried for each case, as multiples of --size
+SCALES = (1, 2, 4)
+
+# Characters per chunk when streaming
+CHUNK_SIZE = 64 * 1024
+
+
+def _repeat(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def _unclosed_log(language: str) -> str:
+    """The language's sample log statement, cut before whatever closes it."""
+    sample = corpus.LOG_SAMPLES[language].format(n=1)
+    cut = max(sample.rfind(')'), sample.rfind(';'), sample.rfind('<<'))
+    return sample[:cut] if cut > 0 else sample
+
+
+def cases(language: str, seed: int) -> Dict[str, Callable[[int], str]]:
+    """Return the input generators of a language, each taking a size in characters."""
+    syntax = COMMENT_PATTERNS[language]
+    scanner = rules.get(language).scanner
+    quotes = [rule.quote for rule in scanner.strings]
+    openers = [opener for opener, _ in syntax.get('block', [])]
+    tokens = (syntax.get('line', []) + openers + [closer for _, closer in syntax.get('block', [])]
+              + quotes + ['\\', '(', ')', ';', ' ', 'x', '\n', _unclosed_log(language)])
+
+    generators = {'unclosed_logs': lambda size: _repeat(_unclosed_log(language) + ' ', size)}
+    for quote in quotes:
+        generators[f'unclosed_string {quote}'] = lambda size, quote=quote: quote + _repeat('a\\' + quote, size)
+    for opener in openers:
+        generators[f'unclosed_block {opener}'] = lambda size, opener=opener: _repeat(opener + 'x', size)
+
+    def fuzz(size: int) -> str:
+        generator = random.Random(seed)
+        pieces, length = [], 0
+        while length < size:
+            token = generator.choice(tokens)
+            pieces.append(token)
+            length += len(token)
+        return ''.join(pieces)[:size]
+
+    generators['fuzz'] = fuzz
+    return generators
+
+
+def _best_of(repeat: int, run: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure(language: str, text: str, repeat: int) -> Dict[str, float]:
+    """Time cleaning ``text`` whole and in chunks."""
+    language_rules = rules.get(language)
+
+    def stream():
+        chunks = (text[start:start + CHUNK_SIZE] for start in range(0, len(text), CHUNK_SIZE))
+        for _ in language_rules.clean_stream(chunks):
+            pass
+
+    return {'clean': _best_of(repeat, lambda: language_rules.clean(text)), 'stream': _best_of(repeat, stream)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that cleaning stays linear-time on adversarial inputs')
+    parser.add_argument('--size', type=int, default=128, metavar='KB',
+                        help='Smallest input per case, in thousands of characters (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is kept (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Fuzz seed (default: 0)')
+    parser.add_argument('--language', action='append', help='Only check this language (repeatable)')
+    parser.add_argument('--max-growth', type=float, default=8.0,
+                        help='Largest allowed time growth when the input grows 4 times; linear is 4 and '
+                             'quadratic 16, so the margin absorbs timing noise (default: %(default)s)')
+    args = parser.parse_args()
+
+    languages = args.language or sorted(corpus.LOG_SAMPLES)
+    superlinear: List[str] = []
+    print(f"{'case':40} {'mode':>6} {'MB/s':>10} {'seconds':>10} {'growth':>8}")
+    for language in languages:
+        for name, generate in cases(language, args.seed).items():
+            texts = [generate(args.size * 1000 * scale) for scale in SCALES]
+            timings = [measure(language, text, args.repeat) for text in texts]
+            for mode in ('clean', 'stream'):
+                smallest, largest = timings[0][mode], timings[-1][mode]
+                growth = largest / max(smallest, 1e-6)
+                if growth > args.max_growth:
+                    # Measured again, with more runs, before it counts, as a busy machine can slow any single run
+                    smallest = min(smallest, measure(language, texts[0], 2 * args.repeat)[mode])
+                    largest = min(largest, measure(language, texts[-1], 2 * args.repeat)[mode])
+                    growth = largest / max(smallest, 1e-6)
+                flag = ''
+                # Below a millisecond, timer noise dominates the ratio
+                if growth > args.max_growth and largest > 0.001:
+                    flag = '  SUPERLINEAR'
+                    superlinear.append(f'{language}: {name} ({mode})')
+                megabytes = len(texts[-1].encode('utf-8')) / (1024 * 1024)
+                print(f"{language + ': ' + name:40} {mode:>6} {megabytes / max(largest, 1e-9):10.2f} "
+                      f"{largest:10.4f} {growth:8.1f}{flag}")
+
+    if superlinear:
+        print(f"\n{len(superlinear)} case(s) grew faster than {args.max_growth}x for 4x the input:")
+        for case in superlinear:
+            print(f"  {case}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
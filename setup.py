@@ -13,10 +13,11 @@ setup(
     packages=find_packages(where="src"),
     package_dir={"":"src"},
     install_requires=requirements,
-    python_requires=">=3.6",
+    python_requires=">=3.8",
     entry_points={
         'console_scripts': [
             'code-cleaner=code_cleaner.cli:main',
+            'code-cleaner-hook=code_cleaner.cli:hook_main',
             'code-cleaner-web=code_cleaner.web:main',
         ],
     },
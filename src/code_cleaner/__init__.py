@@ -1,2 +1,6 @@
 # Code Cleaner Package
-__version__ = '0.1.0'
\ No newline at end of file
+__version__ = '0.1.0'
+
+from code_cleaner.api import clean_many, clean_source  # noqa: E402
+
+__all__ = ['clean_many', 'clean_source']
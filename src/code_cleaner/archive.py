@@ -0,0 +1,574 @@
+"""Clean ZIP archives member by member, without extracting them to disk."""
+
+import collections
+import copy
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from code_cleaner.budget import Budget, BudgetExceeded
+from code_cleaner.lexer import SPOOL_SIZE
+from code_cleaner.profiler import NULL_RECORDER, Profiler, StageRecorder
+from code_cleaner.rules import detect_language, rules
+from code_cleaner.safezip import ArchiveLimits, open_archive
+from code_cleaner.sniff import HEADER_SIZE, classify_header
+from code_cleaner.store import ResultStore
+from code_cleaner.walker import compile_excludes
+
+# Paths left out of the output archive, as the web upload has always done
+DEFAULT_EXCLUDES = ('node_modules', '.git', '__pycache__', '.DS_Store')
+
+# Members larger than this are cleaned in chunks and spooled instead of being read whole
+STREAM_THRESHOLD = 32 * 1024 * 1024
+
+# Characters read per chunk when streaming, and bytes per block when copying raw data
+CHUNK_SIZE = 1024 * 1024
+
+# Chunks of CHUNK_SIZE bytes a stream holds for its reader before the cleaning waits
+STREAM_BUFFER_CHUNKS = 2
+
+# Local header flag meaning CRC and sizes follow the data instead of preceding it
+_DATA_DESCRIPTOR = 0x08
+
+# Fixed part of a local file header (APPNOTE 4.3.7), ending with the name and extra field lengths
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+# ZipFile attributes _copy_raw updates the way ZipFile.open(..., 'w') does
+_RAW_COPY_ATTRIBUTES = ('fp', '_seekable', 'start_dir', '_didModify', 'filelist', 'NameToInfo')
+
+
+class _RawCopyUndone(Exception):
+    """Raised by _copy_raw when it failed and removed what it had written, so the member can be copied again."""
+
+
+# Optional extra step run on cleaned text, e.g. the LLM dead-code pass of app.py
+Transform = Callable[[str, str], str]
+
+
+def _can_copy_raw(target: zipfile.ZipFile) -> bool:
+    """Check that this zipfile has the internals ``_copy_raw`` relies on, which aren't public API."""
+    return (callable(getattr(target, '_writecheck', None)) and callable(getattr(zipfile.ZipInfo, 'FileHeader', None))
+            and all(hasattr(target, name) for name in _RAW_COPY_ATTRIBUTES))
+
+
+def _copy_member(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copy a member unchanged, by its compressed bytes where possible, else by recompressing it."""
+    if _can_copy_raw(target):
+        try:
+            _copy_raw(source, target, info)
+            return
+        except _RawCopyUndone:
+            pass
+    _copy_recompressed(source, target, info)
+
+
+def _copy_raw(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copy a member's compressed bytes as they are, without recompressing them.
+
+    zipfile has no public API for this, so the local header is rebuilt from
+    the central directory entry and the data is appended with the same
+    bookkeeping ``ZipFile.open(..., 'w')`` does. If the copy fails and
+    ``target`` is seekable, what was written is dropped again and
+    _RawCopyUndone raised; otherwise the error is passed on.
+    """
+    source.fp.seek(info.header_offset)
+    fields = _LOCAL_HEADER.unpack(source.fp.read(_LOCAL_HEADER.size))
+    data_offset = info.header_offset + _LOCAL_HEADER.size + fields[-2] + fields[-1]
+
+    member = copy.copy(info)
+    # CRC and sizes are known up front, so they go in the local header
+    member.flag_bits &= ~_DATA_DESCRIPTOR
+    if target._seekable:
+        target.fp.seek(target.start_dir)
+    member.header_offset = target.fp.tell()
+    target._writecheck(member)
+    target._didModify = True
+    try:
+        target.fp.write(member.FileHeader(None))
+        source.fp.seek(data_offset)
+        remaining = info.compress_size
+        while remaining:
+            block = source.fp.read(min(remaining, CHUNK_SIZE))
+            if not block:
+                raise zipfile.BadZipFile(f'Truncated data for {info.filename}')
+            target.fp.write(block)
+            remaining -= len(block)
+    except Exception as e:
+        if not target._seekable:
+            raise
+        # Nothing points at the half-written entry yet, so cutting it off undoes it
+        target.fp.seek(member.header_offset)
+        target.fp.truncate()
+        target.start_dir = member.header_offset
+        raise _RawCopyUndone(str(e)) from e
+
+    target.start_dir = target.fp.tell()
+    target.filelist.append(member)
+    target.NameToInfo[member.filename] = member
+
+
+def _copy_recompressed(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copy a member through the public zipfile API, decompressing and recompressing it with the same method."""
+    member = zipfile.ZipInfo(info.filename, info.date_time)
+    member.external_attr = info.external_attr
+    member.compress_type = info.compress_type
+    member.file_size = info.file_size
+    with source.open(info) as data, target.open(member, 'w') as output:
+        shutil.copyfileobj(data, output, CHUNK_SIZE)
+
+
+def _output_info(info: zipfile.ZipInfo, size: int) -> zipfile.ZipInfo:
+    """Return the entry for a cleaned member, keeping its name, date and permissions."""
+    member = zipfile.ZipInfo(info.filename, info.date_time)
+    member.external_attr = info.external_attr
+    member.compress_type = zipfile.ZIP_DEFLATED
+    member.file_size = size
+    return member
+
+
+def _is_source(info: zipfile.ZipInfo) -> bool:
+    """Check a member's name the way should_process_file checks a path."""
+    name = info.filename.rstrip('/').rsplit('/', 1)[-1]
+    return not name.startswith('.') and detect_language(name) != 'unknown'
+
+
+class _CleanedMember:
+    """A source member cleaned by the rules, waiting to be transformed and written out."""
+
+    def __init__(self, info: zipfile.ZipInfo, stats: Dict, recorder, started: float):
+        self.info = info
+        self.stats = stats
+        self.recorder = recorder
+        self.started = started
+        # Cleaned text of members cleaned in memory, or a spool file of the others
+        self.text: Optional[str] = None
+        self.spool = None
+
+    def transform(self, transform: Transform) -> None:
+        if self.text is not None:
+            with self.recorder.stage('transform', len(self.text)):
+                self.text = transform(self.text, self.stats['language'])
+
+    def write(self, source: zipfile.ZipFile, target: zipfile.ZipFile) -> Dict:
+        """Add the member to ``target`` and return its final statistics.
+
+        A member that cleaning left byte for byte as it was, going by its
+        size and CRC, is copied from ``source`` with ``_copy_member``
+        instead of being compressed again.
+        """
+        with self.recorder.stage('write'):
+            if self.spool is not None:
+                with self.spool:
+                    if self.stats['bytes_out'] == self.info.file_size and self._spool_crc() == self.info.CRC:
+                        _copy_member(source, target, self.info)
+                    else:
+                        self.spool.seek(0)
+                        with target.open(_output_info(self.info, self.stats['bytes_out']), 'w') as output:
+                            shutil.copyfileobj(self.spool, output, CHUNK_SIZE)
+            else:
+                encoded = self.text.encode('utf-8')
+                self.stats['bytes_out'] = len(encoded)
+                if len(encoded) == self.info.file_size and zlib.crc32(encoded) == self.info.CRC:
+                    _copy_member(source, target, self.info)
+                else:
+                    target.writestr(_output_info(self.info, len(encoded)), encoded)
+        self.stats['seconds'] = time.perf_counter() - self.started
+        if self.recorder is not NULL_RECORDER:
+            self.stats['profile'] = self.recorder.to_dict()
+        return self.stats
+
+    def _spool_crc(self) -> int:
+        self.spool.seek(0)
+        crc = 0
+        for block in iter(lambda: self.spool.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(block, crc)
+        return crc
+
+    def discard(self) -> None:
+        if self.spool is not None:
+            self.spool.close()
+
+
+def _read_member(source: zipfile.ZipFile, info: zipfile.ZipInfo, stream_threshold: int,
+                 profile: bool, store: Optional[ResultStore] = None,
+                 budget: Optional[Budget] = None) -> Optional[_CleanedMember]:
+    """Read and clean one member, or return None if it turns out to be binary.
+
+    Members cleaned in memory are looked up in ``store`` first, and added
+    to it once cleaned. Raises BudgetExceeded for a member over the size
+    or time of ``budget``.
+    """
+    started = time.perf_counter()
+    deadline = None
+    if budget is not None:
+        budget.check_size(info.file_size)
+        deadline = budget.deadline(started)
+    recorder = StageRecorder() if profile else NULL_RECORDER
+    language = detect_language(info.filename)
+    language_rules = rules.get(language)
+    stats = {'language': language, 'bytes_in': info.file_size, 'bytes_out': 0,
+             'comment_bytes': 0, 'log_statements': 0}
+    member = _CleanedMember(info, stats, recorder, started)
+
+    if info.file_size > stream_threshold:
+        with source.open(info) as data:
+            if not classify_header(data.read(HEADER_SIZE)):
+                return None
+        member.spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        try:
+            with recorder.stage('stream', info.file_size), source.open(info) as data, \
+                    io.TextIOWrapper(data, encoding='utf-8', errors='ignore') as text:
+                for piece in language_rules.clean_stream(iter(lambda: text.read(CHUNK_SIZE), ''), stats, deadline):
+                    member.spool.write(piece.encode('utf-8'))
+            stats['bytes_out'] = member.spool.tell()
+        except BaseException:
+            member.discard()
+            raise
+    else:
+        with recorder.stage('read', info.file_size):
+            data = source.read(info)
+        if not classify_header(data[:HEADER_SIZE]):
+            return None
+        key = None
+        if store is not None:
+            with recorder.stage('store', info.file_size):
+                key = store.key(data, language)
+                cached = store.load(key)
+            if cached is not None:
+                member.text = cached[0].decode('utf-8')
+                stats.update(cached[1])
+                return member
+        # Decode with universal newlines, as clean_file's text-mode open does
+        content = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='ignore').read()
+        with recorder.stage('clean', info.file_size):
+            member.text = language_rules.clean(content, stats, deadline)
+        if profile:
+            recorder.rules = language_rules.profile_rules(content, deadline)
+        if key is not None:
+            encoded = member.text.encode('utf-8')
+            store.save(key, encoded, dict(stats, bytes_out=len(encoded)))
+    return member
+
+
+def clean_member(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo,
+                 stream_threshold: int = STREAM_THRESHOLD, transform: Optional[Transform] = None,
+                 profile: bool = False, store: Optional[ResultStore] = None,
+                 budget: Optional[Budget] = None) -> Optional[Dict]:
+    """Clean one source member of ``source`` into ``target`` and return its statistics.
+
+    Returns None, having written nothing, if the member turns out to be
+    binary. Members up to ``stream_threshold`` bytes are cleaned in memory;
+    larger ones are cleaned in chunks into a spool file first, so a failure
+    never leaves a half-written entry behind. ``transform`` is only applied
+    to members cleaned in memory, and only those are looked up in and
+    added to ``store``. A member over ``budget`` raises BudgetExceeded.
+    """
+    member = _read_member(source, info, stream_threshold, profile, store, budget)
+    if member is None:
+        return None
+    try:
+        if transform is not None:
+            member.transform(transform)
+        return member.write(source, target)
+    finally:
+        member.discard()
+
+
+class _StreamAbandoned(BaseException):
+    """Raised in the cleaning thread of a stream whose reader went away.
+
+    A BaseException, like GeneratorExit, so that the per-member error
+    handling doesn't take it for a failed member and carry on.
+    """
+
+
+class _StreamSink:
+    """Unseekable file object handing what zipfile writes to the reader of a stream in bounded chunks.
+
+    Writes are cut into chunks of CHUNK_SIZE bytes; once ``depth`` of them
+    wait for the reader, the writing thread blocks, so a large member is
+    passed on while it is written rather than held until it is complete.
+    What is written is optionally teed to a cache file.
+    """
+
+    def __init__(self, cache=None, depth: int = STREAM_BUFFER_CHUNKS):
+        self.cache = cache
+        self.depth = depth
+        # Bytes written but not yet taken by the reader, and the most there ever were
+        self.buffered = 0
+        self.peak = 0
+        self._pending = bytearray()
+        self._chunks = collections.deque()
+        self._condition = threading.Condition()
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._abandoned = False
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        if self.cache is not None:
+            self.cache.write(view)
+        for start in range(0, len(view), CHUNK_SIZE):
+            self._pending += view[start:start + CHUNK_SIZE]
+            self._count(min(CHUNK_SIZE, len(view) - start))
+            while len(self._pending) >= CHUNK_SIZE:
+                chunk = bytes(self._pending[:CHUNK_SIZE])
+                del self._pending[:CHUNK_SIZE]
+                self._put(chunk)
+        return len(view)
+
+    def flush(self) -> None:
+        pass
+
+    def end_member(self) -> None:
+        """Hand over what is left of the member just written, so small members aren't held back."""
+        if self._pending:
+            chunk = bytes(self._pending)
+            self._pending.clear()
+            self._put(chunk)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Called by the writing thread once it is done, with the exception it failed with, if any."""
+        if error is None:
+            try:
+                self.end_member()
+            except _StreamAbandoned:
+                pass
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def abandon(self) -> None:
+        """Called by the reader when it stops early; the writing thread's next write raises _StreamAbandoned."""
+        with self._condition:
+            self._abandoned = True
+            self._condition.notify_all()
+
+    def chunks(self) -> Iterator[bytes]:
+        """Yield the chunks as they are written, then raise the writing thread's exception, if any."""
+        while True:
+            with self._condition:
+                while not self._chunks and not self._done:
+                    self._condition.wait()
+                if not self._chunks:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                chunk = self._chunks.popleft()
+                self.buffered -= len(chunk)
+                self._condition.notify_all()
+            yield chunk
+
+    def _count(self, size: int) -> None:
+        with self._condition:
+            self.buffered += size
+            self.peak = max(self.peak, self.buffered)
+
+    def _put(self, chunk: bytes) -> None:
+        with self._condition:
+            while len(self._chunks) >= self.depth and not self._abandoned:
+                self._condition.wait()
+            if self._abandoned:
+                raise _StreamAbandoned()
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+
+
+def _open_source(input_zip, limits: Optional[ArchiveLimits]) -> zipfile.ZipFile:
+    return open_archive(input_zip, limits) if limits is not None else zipfile.ZipFile(input_zip)
+
+
+def _partial_path(path) -> str:
+    """Return a unique temporary name next to ``path``, for writes replaced into place."""
+    return f'{path}.{uuid.uuid4().hex}.partial'
+
+
+def _clean_members(source: zipfile.ZipFile, target: zipfile.ZipFile, exclude_patterns: Iterable[str],
+                   stream_threshold: int, transform: Optional[Transform], transform_workers: int,
+                   profiler: Optional[Profiler], counts: Dict[str, int],
+                   store: Optional[ResultStore] = None,
+                   budget: Optional[Budget] = None) -> Iterator[Tuple[int, int]]:
+    """Clean or copy every member of ``source`` into ``target``, yielding (done, total) after each.
+
+    Source members over ``budget`` are copied unchanged and counted in
+    ``counts['over_budget']`` rather than ``counts['skipped']``.
+
+    With several ``transform_workers``, members are read and cleaned here
+    while their transforms run on a thread pool; they are still written
+    one at a time in archive order, at most ``2 * transform_workers``
+    members behind the reader.
+    """
+    excludes = compile_excludes(tuple(exclude_patterns))
+    members = [info for info in source.infolist()
+               if not info.is_dir() and not excludes.match_path(info.filename)]
+    executor = None
+    if transform is not None and transform_workers > 1:
+        executor = ThreadPoolExecutor(transform_workers, thread_name_prefix='code-cleaner-transform')
+    window = 2 * transform_workers if executor is not None else 0
+    pending = collections.deque()
+    over_budget = set()
+
+    def finish(info, member, future) -> None:
+        stats = None
+        if member is not None:
+            try:
+                if future is not None:
+                    future.result()
+                elif transform is not None:
+                    member.transform(transform)
+                stats = member.write(source, target)
+            except Exception as e:
+                print(f"Error processing file {info.filename}: {e}", file=sys.stderr)
+            finally:
+                member.discard()
+        if stats is None:
+            _copy_member(source, target, info)
+            counts['over_budget' if info.filename in over_budget else 'skipped'] += 1
+        else:
+            if profiler is not None:
+                profiler.add_file(info.filename, stats)
+            counts['processed'] += 1
+
+    try:
+        done = 0
+        for info in members:
+            member = future = None
+            if _is_source(info):
+                try:
+                    member = _read_member(source, info, stream_threshold, profiler is not None, store, budget)
+                except BudgetExceeded as e:
+                    print(f"Warning: Copying {info.filename} unchanged: {e}", file=sys.stderr)
+                    over_budget.add(info.filename)
+                except Exception as e:
+                    print(f"Error processing file {info.filename}: {e}", file=sys.stderr)
+            if member is not None and executor is not None:
+                future = executor.submit(member.transform, transform)
+            pending.append((info, member, future))
+            while len(pending) > window:
+                finish(*pending.popleft())
+                done += 1
+                yield done, len(members)
+        while pending:
+            finish(*pending.popleft())
+            done += 1
+            yield done, len(members)
+    finally:
+        # Only reached with members left over if the caller gave up half way
+        for _, member, future in pending:
+            if future is not None:
+                future.cancel()
+        if executor is not None:
+            executor.shutdown()
+        for _, member, _ in pending:
+            if member is not None:
+                member.discard()
+
+
+def clean_archive(input_zip: str, output_zip, exclude_patterns: Iterable[str] = DEFAULT_EXCLUDES,
+                  stream_threshold: int = STREAM_THRESHOLD, transform: Optional[Transform] = None,
+                  transform_workers: int = 1, progress: Optional[Callable[[int, int], None]] = None,
+                  profiler: Optional[Profiler] = None, store: Optional[ResultStore] = None,
+                  limits: Optional[ArchiveLimits] = None, budget: Optional[Budget] = None) -> Tuple[int, int, int]:
+    """Clean every source member of a ZIP archive into a new archive in one pass.
+
+    Members are read straight from ``input_zip``; source files are cleaned
+    and recompressed, every other member, and every source file cleaning
+    left unchanged, is copied over with its compressed bytes untouched. Excluded paths and directory entries are
+    left out. ``output_zip`` is a path, which is replaced atomically, or a
+    writable binary file object, which is left open. ``transform`` runs on
+    up to ``transform_workers`` members at once. ``progress(done, total)``
+    is called after each member. With a ``store``, members seen before by
+    any job are taken from it instead of being cleaned again. With
+    ``limits``, an archive that breaks them raises UnsafeArchive before
+    anything is written. Source members over the size or time of
+    ``budget`` are copied unchanged. Returns the number of cleaned members,
+    of other copied members and of members copied for being over budget.
+    """
+    if isinstance(output_zip, (str, os.PathLike)):
+        partial = _partial_path(output_zip)
+        try:
+            with open(partial, 'wb') as file:
+                result = clean_archive(input_zip, file, exclude_patterns, stream_threshold, transform,
+                                       transform_workers, progress, profiler, store, limits, budget)
+            os.replace(partial, output_zip)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return result
+
+    counts = {'processed': 0, 'skipped': 0, 'over_budget': 0}
+    with _open_source(input_zip, limits) as source, \
+            zipfile.ZipFile(output_zip, 'w', zipfile.ZIP_DEFLATED) as target:
+        for done, total in _clean_members(source, target, exclude_patterns, stream_threshold, transform,
+                                          transform_workers, profiler, counts, store, budget):
+            if progress is not None:
+                progress(done, total)
+    return counts['processed'], counts['skipped'], counts['over_budget']
+
+
+def stream_archive(input_zip: str, exclude_patterns: Iterable[str] = DEFAULT_EXCLUDES,
+                   stream_threshold: int = STREAM_THRESHOLD, transform: Optional[Transform] = None,
+                   transform_workers: int = 1, cache_path: Optional[str] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   store: Optional[ResultStore] = None, limits: Optional[ArchiveLimits] = None,
+                   budget: Optional[Budget] = None) -> Iterator[bytes]:
+    """Yield the cleaned archive as it is produced, in chunks of at most CHUNK_SIZE bytes.
+
+    The output is what ``clean_archive`` writes, except that entries carry
+    data descriptors since the stream cannot seek back. The archive is
+    written on a separate thread, which waits while STREAM_BUFFER_CHUNKS
+    chunks are waiting to be read, so even a large member is never held
+    in memory whole; ``progress`` is called from that thread. What is left
+    of each member is yielded once it is written. With ``cache_path`` the
+    bytes are also written there, and the file is only put in place once
+    the archive is complete; a stream abandoned half way (the client went
+    away) leaves no cache behind.
+    """
+    partial = _partial_path(cache_path) if cache_path else None
+    cache = open(partial, 'wb') if partial else None
+    sink = _StreamSink(cache)
+
+    def write():
+        counts = {'processed': 0, 'skipped': 0, 'over_budget': 0}
+        try:
+            with _open_source(input_zip, limits) as source, \
+                    zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as target:
+                for done, total in _clean_members(source, target, exclude_patterns, stream_threshold, transform,
+                                                  transform_workers, None, counts, store, budget):
+                    if progress is not None:
+                        progress(done, total)
+                    sink.end_member()
+        except BaseException as e:
+            sink.finish(e)
+        else:
+            # Also hands over the central directory, written when the archive was closed
+            sink.finish()
+
+    writer = threading.Thread(target=write, name='code-cleaner-stream', daemon=True)
+    try:
+        writer.start()
+        yield from sink.chunks()
+        writer.join()
+
+        if cache is not None:
+            cache.close()
+            os.replace(partial, cache_path)
+    finally:
+        sink.abandon()
+        if writer.ident is not None:
+            writer.join()
+        if cache is not None:
+            cache.close()
+            if os.path.exists(partial):
+                os.remove(partial)
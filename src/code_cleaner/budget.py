@@ -0,0 +1,66 @@
+"""Per-file time and size budget, so one adversarial input can't stall a run or a web request."""
+
+import os
+import time
+from typing import NamedTuple, Optional
+
+
+class BudgetExceeded(Exception):
+    """Raised when a file is too large to clean, or cleaning it runs out of time.
+
+    ``reason`` is 'size' or 'time'. Callers copy such a file unchanged and
+    flag it in their results.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class Budget(NamedTuple):
+    """Seconds and bytes allowed per file, where None lifts a limit; both are lifted by default. See ``from_env``."""
+    seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, seconds: Optional[float] = None) -> 'Budget':
+        """Read the budget from CODE_CLEANER_FILE_SECONDS and CODE_CLEANER_MAX_FILE_MB, where 0 lifts a limit.
+
+        ``seconds`` applies when CODE_CLEANER_FILE_SECONDS isn't set; there
+        is no size limit unless CODE_CLEANER_MAX_FILE_MB is. Raises
+        ValueError, naming the variable, for a value that isn't a
+        non-negative number.
+        """
+        seconds = _read_env('CODE_CLEANER_FILE_SECONDS', float, seconds)
+        megabytes = _read_env('CODE_CLEANER_MAX_FILE_MB', int, None)
+        return cls(seconds or None, megabytes * 1024 * 1024 if megabytes else None)
+
+    def check_size(self, size: int) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise BudgetExceeded('size', f'{size} bytes is over the limit of {self.max_bytes}')
+
+    def deadline(self, started: Optional[float] = None) -> Optional[float]:
+        """Return the ``time.perf_counter()`` value by which a file started at ``started`` must be done."""
+        if self.seconds is None:
+            return None
+        return (time.perf_counter() if started is None else started) + self.seconds
+
+
+def _read_env(name: str, convert, default):
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = convert(value)
+    except ValueError:
+        number = -1
+    if not number >= 0:
+        kind = 'a whole number' if convert is int else 'a number'
+        raise ValueError(f'{name} must be {kind} of 0 or more, not {value!r}')
+    return number
+
+
+def check_deadline(deadline: Optional[float]) -> None:
+    """Raise BudgetExceeded once ``deadline`` has passed."""
+    if deadline is not None and time.perf_counter() > deadline:
+        raise BudgetExceeded('time', 'Cleaning ran out of time')
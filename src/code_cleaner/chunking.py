@@ -0,0 +1,141 @@
+"""Split source text into definition-sized chunks for the LLM dead-code pass."""
+
+import functools
+import re
+from typing import List, NamedTuple
+
+from code_cleaner.lexer import string_body
+from code_cleaner.rules import STRING_PATTERNS
+
+# Rough characters per token of source code, for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Lines that continue the statement above them rather than starting a new definition
+_CONTINUATION = re.compile(r'(?:else|elif|except|finally|catch|rescue|ensure|end)\b|[)\]}]')
+
+
+class Line(NamedTuple):
+    """A line of source: its offset, bracket depth at its start, indentation, and text without the indentation."""
+    start: int
+    depth: int
+    indent: int
+    blank: bool
+    head: str
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@functools.lru_cache(maxsize=None)
+def token_pattern(language: str) -> 're.Pattern':
+    """Compile the regex finding strings, brackets and newlines of a language.
+
+    Matches of the ``string`` group are whole literals, so brackets inside
+    them aren't counted; ``deadcode`` uses it to match braces.
+    """
+    strings = []
+    if language == 'python':
+        strings += [r'"""[\s\S]*?"""', r"'''[\s\S]*?'''"]
+    for rule in STRING_PATTERNS.get(language, STRING_PATTERNS['unknown']):
+        strings.append(re.escape(rule.quote) + string_body(rule).pattern)
+    alternatives = [f'(?P<string>{"|".join(strings)})'] if strings else []
+    alternatives += [r'(?P<open>[({\[])', r'(?P<close>[)}\]])', r'(?P<newline>\n)']
+    return re.compile('|'.join(alternatives))
+
+
+def source_lines(text: str, language: str) -> List[Line]:
+    """Return the lines of ``text`` that don't start inside a string, with their bracket depth.
+
+    Shared by the chunker, which cuts at lines of depth 0, and ``deadcode``,
+    which looks for dead-code candidates line by line.
+    """
+    starts = [(0, 0)]
+    depth = 0
+    for match in token_pattern(language).finditer(text):
+        kind = match.lastgroup
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth = max(0, depth - 1)
+        elif kind == 'newline':
+            starts.append((match.end(), depth))
+
+    lines = []
+    for start, depth in starts:
+        end = text.find('\n', start)
+        line = text[start:end if end != -1 else len(text)]
+        head = line.lstrip()
+        lines.append(Line(start, depth, len(line) - len(head), not head, head))
+    return lines
+
+
+def _cuts(lines: List[Line], depth: int, indent: int) -> List[int]:
+    """Return the offsets where a new definition starts at the given depth and indentation."""
+    cuts = []
+    previous = None
+    for line in lines:
+        if line.blank:
+            continue
+        if (previous is not None and line.depth == depth and line.indent == indent
+                and not _CONTINUATION.match(line.head) and not previous.head.startswith('@')):
+            cuts.append(line.start)
+        previous = line
+    return cuts
+
+
+def _split_at(text: str, cuts: List[int]) -> List[str]:
+    bounds = [0] + cuts + [len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def split_units(text: str, language: str) -> List[str]:
+    """Split ``text`` into its top-level definitions, each with the statements that follow it.
+
+    Joining the units gives back ``text`` exactly.
+    """
+    return _split_at(text, _cuts(source_lines(text, language), 0, 0))
+
+
+def split_members(unit: str, language: str) -> List[str]:
+    """Split one definition into its header and members, e.g. a class into its methods.
+
+    Members start on the indented lines at the smallest bracket depth and,
+    among those, the smallest indentation: the body of a brace block, or
+    of an indentation-based one.
+    """
+    lines = source_lines(unit, language)
+    body = [line for line in lines[1:]
+            if line.indent and not line.blank and not _CONTINUATION.match(line.head)]
+    if not body:
+        return [unit]
+    depth = min(line.depth for line in body)
+    indent = min(line.indent for line in body if line.depth == depth)
+    return _split_at(unit, [cut for cut in _cuts(lines, depth, indent) if cut > 0])
+
+
+def chunk_source(text: str, language: str, max_tokens: int) -> List[str]:
+    """Split ``text`` into chunks of whole definitions of at most ``max_tokens`` each.
+
+    Definitions over the budget are split into their members; what is still
+    over the budget becomes a chunk of its own. Consecutive definitions are
+    packed together up to the budget. Joining the chunks gives back ``text``.
+    """
+    units = []
+    for unit in split_units(text, language):
+        if estimate_tokens(unit) > max_tokens:
+            units.extend(split_members(unit, language))
+        else:
+            units.append(unit)
+
+    chunks = []
+    current, size = [], 0
+    for unit in units:
+        if current and (size + len(unit)) // CHARS_PER_TOKEN + 1 > max_tokens:
+            chunks.append(''.join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit)
+    if current or not chunks:
+        chunks.append(''.join(current))
+    return chunks
@@ -1,217 +1,197 @@
  #!/usr/bin/env python3
 
 import os
-import re
 import sys
 import argparse
-import subprocess
-from pathlib import Path
+import filecmp
+import io
+import shutil
+import time
+import uuid
+from contextlib import nullcontext
 from typing import List, Dict, Optional
 
-# Comment patterns for different languages
-COMMENT_PATTERNS = {
-    'python': [
-        r'#.*?$',                     # Single line comments
-        r'"""[\s\S]*?"""',           # Triple double quotes
-        r"'''[\s\S]*?'''",           # Triple single quotes
-    ],
-    'javascript': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'java': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'c': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'cpp': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'csharp': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'go': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'ruby': [
-        r'#.*?$',                     # Single line comments
-        r'=begin[\s\S]*?=end',        # Multi-line comments
-    ],
-    'php': [
-        r'//.*?$',                    # Single line comments
-        r'#.*?$',                     # Single line comments (alternative)
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'swift': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'typescript': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'html': [
-        r'<!--[\s\S]*?-->',           # HTML comments
-    ],
-    'css': [
-        r'/\*[\s\S]*?\*/',           # CSS comments
-    ],
-    'shell': [
-        r'#.*?$',                     # Single line comments
-    ],
-    'perl': [
-        r'#.*?$',                     # Single line comments
-        r'=pod[\s\S]*?=cut',          # POD documentation
-    ],
-    'kotlin': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'rust': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-    ],
-    'unknown': [
-        r'//.*?$',                    # Single line comments
-        r'/\*[\s\S]*?\*/',           # Multi-line comments
-        r'#.*?$',                     # Single line comments (alternative)
-        r'"""[\s\S]*?"""',           # Triple double quotes
-        r"'''[\s\S]*?'''",           # Triple single quotes
-    ],
-}
+from code_cleaner.budget import Budget, BudgetExceeded
+from code_cleaner.clone import clone_file
+from code_cleaner.gitfiles import GitError, changed_files, staged_files
+from code_cleaner.manifest import Manifest, remove_output
+from code_cleaner.parallel import OrderedPool
+from code_cleaner.profiler import NULL_RECORDER, Profiler, StageRecorder
+from code_cleaner.report import Report
+from code_cleaner.rules import detect_language, rules
+from code_cleaner.sniff import is_text_file
+from code_cleaner.store import ResultStore, default_directory
+from code_cleaner.walker import compile_excludes, is_ignored, walk_files, walk_paths
+from code_cleaner.watch import POLL_INTERVAL, debounced, open_watcher
 
-# Console/log statement patterns for different languages
-LOG_PATTERNS = {
-    'python': [
-        r'print\s*\(.*?\)',
-        r'logging\.\w+\s*\(.*?\)',
-    ],
-    'javascript': [
-        r'console\.\w+\s*\(.*?\)',
-        r'alert\s*\(.*?\)',
-    ],
-    'java': [
-        r'System\.out\.\w+\s*\(.*?\)',
-        r'System\.err\.\w+\s*\(.*?\)',
-        r'logger\.\w+\s*\(.*?\)',
-    ],
-    'c': [
-        r'printf\s*\(.*?\)',
-        r'fprintf\s*\(.*?\)',
-    ],
-    'cpp': [
-        r'std::cout.*?<<',
-        r'std::cerr.*?<<',
-    ],
-    'csharp': [
-        r'Console\.\w+\s*\(.*?\)',
-        r'Debug\.\w+\s*\(.*?\)',
-    ],
-    'go': [
-        r'fmt\.\w+\s*\(.*?\)',
-        r'log\.\w+\s*\(.*?\)',
-    ],
-    'ruby': [
-        r'puts\s+.*?$',
-        r'print\s+.*?$',
-        r'p\s+.*?$',
-    ],
-    'php': [
-        r'echo\s+.*?;',
-        r'print\s+.*?;',
-        r'var_dump\s*\(.*?\)',
-    ],
-    'swift': [
-        r'print\s*\(.*?\)',
-        r'NSLog\s*\(.*?\)',
-    ],
-    'typescript': [
-        r'console\.\w+\s*\(.*?\)',
-    ],
-    'shell': [
-        r'echo\s+.*?$',
-    ],
-    'perl': [
-        r'print\s+.*?;',
-    ],
-    'kotlin': [
-        r'println\s*\(.*?\)',
-    ],
-    'rust': [
-        r'println!\s*\(.*?\)',
-        r'print!\s*\(.*?\)',
-    ],
-    'unknown': [
-        r'console\.\w+\s*\(.*?\)',
-        r'print\s*\(.*?\)',
-        r'System\.out\.\w+\s*\(.*?\)',
-        r'echo\s+.*?$',
-    ],
-}
 
+# Files larger than this are cleaned in chunks instead of being read whole
+STREAM_THRESHOLD = 32 * 1024 * 1024
 
-def detect_language(file_path: str) -> str:
-    """Detect the programming language based on file extension."""
-    extension = os.path.splitext(file_path)[1].lower()
-    
-    language_map = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.java': 'java',
-        '.c': 'c',
-        '.cpp': 'cpp',
-        '.cs': 'csharp',
-        '.go': 'go',
-        '.rb': 'ruby',
-        '.php': 'php',
-        '.swift': 'swift',
-        '.ts': 'typescript',
-        '.html': 'html',
-        '.css': 'css',
-        '.sh': 'shell',
-        '.pl': 'perl',
-        '.kt': 'kotlin',
-        '.rs': 'rust',
-    }
-    
-    return language_map.get(extension, 'unknown')
+# Characters read per chunk when streaming
+CHUNK_SIZE = 1024 * 1024
 
 
-def process_file(input_file: str, output_file: str) -> bool:
-    """Process a file to remove comments and log statements."""
+def clean_file(input_file: str, output_file: str, stream_threshold: int = STREAM_THRESHOLD,
+               dry_run: bool = False, profile: bool = False, store: Optional[ResultStore] = None,
+               budget: Optional[Budget] = None, hardlink: bool = False) -> Optional[Dict]:
+    """Clean a file and return its statistics, or None if it could not be processed.
+    
+    With ``dry_run`` the cleaned output is measured but not written. With
+    ``profile`` the statistics also carry per-stage and per-rule timings.
+    With a ``store``, an identical input cleaned before by any run is
+    copied from there instead of being cleaned again.
+    
+    A file over the size of the ``budget``, or not cleaned within its
+    time, is copied unchanged instead, and its statistics say which limit
+    it hit with ``budget``.
+    
+    The output goes to a temporary file that then replaces ``output_file``,
+    so an output hard-linked elsewhere is never written through. If the
+    output would be byte-identical to the input, it is cloned from the
+    input with ``clone_file`` rather than written, hard-linked only with
+    ``hardlink``, and the statistics say how with ``link``.
+    
+    If ``output_file`` is ``input_file``, the file is cleaned in place: it
+    is replaced only if the output differs, and the statistics tell which
+    with ``changed``.
+    """
+    in_place = not dry_run and os.path.abspath(input_file) == os.path.abspath(output_file)
+    target = f'{output_file}.{uuid.uuid4().hex}.tmp'
     try:
+        started = time.perf_counter()
+        recorder = StageRecorder() if profile else NULL_RECORDER
         language = detect_language(input_file)
-        
-        with open(input_file, 'r', encoding='utf-8', errors='ignore') as file:
-            content = file.read()
-        
-        # Remove comments
-        for pattern in COMMENT_PATTERNS.get(language, COMMENT_PATTERNS['unknown']):
-            content = re.sub(pattern, '', content, flags=re.MULTILINE)
-        
-        # Remove log statements
-        for pattern in LOG_PATTERNS.get(language, LOG_PATTERNS['unknown']):
-            content = re.sub(pattern, '', content, flags=re.MULTILINE)
+        language_rules = rules.get(language)
+        stats = {'language': language, 'bytes_in': 0, 'bytes_out': 0, 'comment_bytes': 0, 'log_statements': 0}
+        deadline = budget.deadline(started) if budget is not None else None
         
         # Create output directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        if not dry_run:
+            os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(content)
+        key = None
+        if store is not None and not dry_run and not in_place:
+            with recorder.stage('store'):
+                key = store.key_file(input_file, language)
+                cached = store.fetch(key, output_file)
+            if cached is not None:
+                cached['seconds'] = time.perf_counter() - started
+                if profile:
+                    cached['profile'] = recorder.to_dict()
+                return cached
+        
+        identical = False
+        try:
+            if budget is not None:
+                budget.check_size(os.path.getsize(input_file))
+            with open(input_file, 'r', encoding='utf-8', errors='ignore') as source:
+                size = stats['bytes_in'] = os.fstat(source.fileno()).st_size
+                if size > stream_threshold:
+                    # Bounded memory: read, clean and write one chunk at a time
+                    with recorder.stage('stream', size), \
+                            (open(target, 'w', encoding='utf-8') if not dry_run else nullcontext()) as file:
+                        chunks = iter(lambda: source.read(CHUNK_SIZE), '')
+                        for piece in language_rules.clean_stream(chunks, stats, deadline):
+                            _emit(file, piece, stats, dry_run)
+                        if not dry_run:
+                            file.flush()
+                            stats['bytes_out'] = os.fstat(file.fileno()).st_size
+                    # Only checked when nothing was removed and the sizes match, which rules out most files
+                    identical = (not dry_run and not stats['comment_bytes'] and not stats['log_statements']
+                                 and stats['bytes_out'] == size and filecmp.cmp(target, input_file, shallow=False))
+                else:
+                    with recorder.stage('read', size):
+                        content = source.read()
+                    with recorder.stage('clean', size):
+                        cleaned = language_rules.clean(content, stats, deadline)
+                    if profile:
+                        recorder.rules = language_rules.profile_rules(content, deadline)
+                    with recorder.stage('write'):
+                        if not dry_run and cleaned == content and _encodes_to_file(cleaned, input_file, size):
+                            identical = True
+                            stats['bytes_out'] = size
+                        elif dry_run:
+                            _emit(None, cleaned, stats, dry_run)
+                        else:
+                            with open(target, 'w', encoding='utf-8') as file:
+                                file.write(cleaned)
+                                file.flush()
+                                stats['bytes_out'] = os.fstat(file.fileno()).st_size
+        except BudgetExceeded as e:
+            # Passed through as it is, rather than stalling the run on it
+            print(f"Warning: Copying {input_file} unchanged: {e}", file=sys.stderr)
+            size = os.path.getsize(input_file)
+            stats.update(budget=e.reason, bytes_in=size, bytes_out=size, comment_bytes=0, log_statements=0)
+            identical = not dry_run
         
-        return True
+        if identical:
+            if os.path.exists(target):
+                os.remove(target)
+            if not in_place:
+                stats['link'] = clone_file(input_file, output_file, hardlink)
+        elif not dry_run:
+            if in_place:
+                shutil.copymode(input_file, target)
+            os.replace(target, output_file)
+        if in_place:
+            stats['changed'] = not identical
+        if key is not None and 'budget' not in stats:
+            store.add(key, output_file, stats)
+        stats['seconds'] = time.perf_counter() - started
+        if profile:
+            stats['profile'] = recorder.to_dict()
+        return stats
     except Exception as e:
         print(f"Error processing file {input_file}: {e}", file=sys.stderr)
+        if os.path.exists(target):
+            os.remove(target)
+        return None
+
+
+def _encodes_to_file(text: str, path: str, size: int) -> bool:
+    """Check whether writing ``text`` would reproduce the file at ``path`` byte for byte.
+    
+    Reading drops invalid UTF-8 and translates line endings, so an input
+    that cleaning left alone can still differ from its output.
+    """
+    # Text-mode writes translate newlines on platforms where that isn't a no-op
+    encoded = text.replace('\n', os.linesep).encode('utf-8')
+    if len(encoded) != size:
         return False
+    with open(path, 'rb') as file:
+        return file.read() == encoded
 
 
-def should_process_file(file_path: str, exclude_patterns: List[str], output_dir: str) -> bool:
+def _emit(file, piece: str, stats: Dict, dry_run: bool) -> None:
+    if dry_run:
+        stats['bytes_out'] += len(piece.encode('utf-8'))
+    else:
+        file.write(piece)
+
+
+def process_file(input_file: str, output_file: str, stream_threshold: int = STREAM_THRESHOLD,
+                 budget: Optional[Budget] = None) -> bool:
+    """Process a file to remove comments and log statements."""
+    return clean_file(input_file, output_file, stream_threshold, budget=budget) is not None
+
+
+def filter_stream(source, destination, language: str) -> None:
+    """Clean bytes read from ``source`` into ``destination`` chunk by chunk, as ``code-cleaner -`` does."""
+    reader = io.TextIOWrapper(source, encoding='utf-8', errors='ignore')
+    writer = io.TextIOWrapper(destination, encoding='utf-8', write_through=True)
+    try:
+        for piece in rules.get(language).clean_stream(iter(lambda: reader.read(CHUNK_SIZE), '')):
+            writer.write(piece)
+        writer.flush()
+    finally:
+        # The wrappers don't own the standard streams
+        reader.detach()
+        writer.detach()
+
+
+def should_process_file(file_path: str, exclude_patterns: List[str], output_dir: str,
+                        stat: Optional[os.stat_result] = None) -> bool:
     """Check if a file should be processed."""
     filename = os.path.basename(file_path)
     
@@ -220,108 +200,358 @@ def should_process_file(file_path: str, exclude_patterns: List[str], output_dir:
         return False
     
     # Skip the script itself and the output directory
-    if os.path.abspath(file_path) == os.path.abspath(__file__) or file_path.startswith(output_dir):
+    if os.path.abspath(file_path) == os.path.abspath(__file__) or (output_dir and file_path.startswith(output_dir)):
         return False
     
     # Skip excluded patterns
-    for pattern in exclude_patterns:
-        if pattern in file_path:
-            return False
-    
-    # Skip binary files and other non-text files
-    try:
-        # Use the 'file' command on Unix-like systems if available
-        if sys.platform != 'win32' and subprocess.run(['file', '--mime', file_path], 
-                                                    stdout=subprocess.PIPE, 
-                                                    stderr=subprocess.PIPE).stdout.decode().find('text/') == -1:
-            return False
-    except (subprocess.SubprocessError, FileNotFoundError):
-        # Fallback method: try to open and read the file
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                f.read(1024)  # Read a small chunk to check if it's text
-        except UnicodeDecodeError:
-            return False
+    # Relative to the current directory, which is where the CLI walks from
+    if exclude_patterns and compile_excludes(tuple(exclude_patterns)).match_path(os.path.relpath(file_path)):
+        return False
     
     # Only process files with recognized extensions
     language = detect_language(file_path)
     if language == 'unknown':
         return False
     
+    # Skip binary files and other non-text files
+    if not is_text_file(file_path, stat):
+        return False
+    
     return True
 
 
+def report_results(results, counts: Dict[str, int], manifest: Optional[Manifest] = None,
+                   report: Optional[Report] = None, profiler: Optional[Profiler] = None) -> None:
+    """Print the outcome of processed files and update the processed/skipped counters."""
+    for relative_path, stats in results:
+        success = stats is not None
+        print(f"Processing: {relative_path}")
+        if manifest is not None:
+            # Over-budget files were only copied, so the next run tries them again
+            manifest.commit(relative_path, success and not stats.get('budget'))
+        if success:
+            counts['processed'] += 1
+            if stats.get('cached'):
+                counts['cached'] += 1
+            if stats.get('changed'):
+                counts['changed'] += 1
+            if stats.get('link'):
+                counts['identical'] += 1
+            if stats.get('budget'):
+                counts['over_budget'] += 1
+                print(f"  Copied unchanged: over the {stats['budget']} budget")
+            if report is not None:
+                report.add(relative_path, stats)
+            if profiler is not None:
+                profiler.add_file(relative_path, stats)
+        else:
+            counts['skipped'] += 1
+            print(f"  Skipped due to processing error")
+            if report is not None:
+                report.add_failure(relative_path)
+
+
+def sync_changes(watcher, source_dir: str, output_dir: str, use_ignore_files: bool = False, jobs: int = 1,
+                 stream_threshold: int = STREAM_THRESHOLD, manifest: Optional[Manifest] = None,
+                 store: Optional[ResultStore] = None, budget: Optional[Budget] = None,
+                 hardlink: bool = False) -> None:
+    """Keep ``output_dir`` in sync with the changes ``watcher`` reports until interrupted.
+    
+    Each debounced batch of changed files is cleaned again, and the
+    outputs of removed files and directories are deleted; nothing else in
+    the tree is looked at.
+    """
+    print(f"Watching for changes ({watcher.kind}), press Ctrl+C to stop")
+    try:
+        with OrderedPool(clean_file, jobs) as pool:
+            for changed in debounced(watcher):
+                counts = {'processed': 0, 'skipped': 0, 'cached': 0, 'changed': 0, 'over_budget': 0, 'identical': 0}
+                ignore_cache = {}
+                for relative_path in sorted(changed):
+                    if use_ignore_files and is_ignored(source_dir, relative_path, ignore_cache):
+                        continue
+                    file_path = os.path.join(source_dir, relative_path)
+                    try:
+                        stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        if manifest is not None:
+                            manifest.forget(relative_path)
+                        if remove_output(output_dir, relative_path):
+                            print(f"Removed: {relative_path}")
+                        continue
+                    except OSError:
+                        continue
+                    if os.path.isdir(file_path) or not should_process_file(file_path, [], output_dir, stat):
+                        continue
+                    if manifest is not None and manifest.is_current(relative_path, file_path,
+                                                                    detect_language(file_path), stat):
+                        continue
+                    results = pool.submit(relative_path, file_path, os.path.join(output_dir, relative_path),
+                                          stream_threshold, False, False, store, budget, hardlink)
+                    report_results(results, counts, manifest)
+                report_results(pool.finish(), counts, manifest)
+                if manifest is not None:
+                    manifest.save()
+    except KeyboardInterrupt:
+        print()
+        print("Stopped watching")
+    finally:
+        watcher.close()
+
+
 def main():
     """Main entry point for the CLI."""
+    try:
+        default_budget = Budget.from_env()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
     parser = argparse.ArgumentParser(description='Code Cleaner CLI Tool')
+    parser.add_argument('input', nargs='?', choices=['-'],
+                        help="'-' to clean standard input to standard output instead of the current directory")
+    parser.add_argument('-l', '--language',
+                        help="Language of standard input, such as python or javascript (required with '-')")
     parser.add_argument('-o', '--output', default='copy', help='Set output directory (default: "copy")')
     parser.add_argument('-n', '--no-subdirs', action='store_true', help="Don't process subdirectories")
     parser.add_argument('-e', '--exclude', default='node_modules,.git,__pycache__,.DS_Store',
-                        help='Comma-separated list of patterns to exclude')
+                        help='Comma-separated list of glob patterns to exclude')
+    parser.add_argument('-g', '--gitignore', action='store_true',
+                        help='Also skip paths listed in .gitignore and .ignore files')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of files to clean in parallel (default: CPU count)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Only re-clean files that changed since the last run into the same output directory')
+    changes = parser.add_mutually_exclusive_group()
+    changes.add_argument('--since', metavar='REF',
+                         help='Only clean tracked files that differ from the git commit REF')
+    changes.add_argument('--staged', action='store_true', help='Only clean files staged in git')
+    parser.add_argument('--in-place', action='store_true',
+                        help='Overwrite the files themselves instead of writing an output directory')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='After cleaning, keep the output directory in sync as files change, until Ctrl+C')
+    parser.add_argument('--poll', type=float, nargs='?', const=POLL_INTERVAL, metavar='SECONDS',
+                        help='Watch by rescanning every SECONDS instead of with inotify (default: %(const)s)')
+    parser.add_argument('--stream-threshold', type=int, default=STREAM_THRESHOLD // (1024 * 1024), metavar='MB',
+                        help='Clean files larger than this many MB in chunks to bound memory use (default: %(default)s)')
+    parser.add_argument('--file-timeout', type=float, default=default_budget.seconds or 0, metavar='SECONDS',
+                        help='Copy a file unchanged if cleaning it takes longer than this, 0 for no limit '
+                             '(default: $CODE_CLEANER_FILE_SECONDS or %(default)s)')
+    parser.add_argument('--max-file-mb', type=int, default=(default_budget.max_bytes or 0) // (1024 * 1024),
+                        metavar='MB', help='Copy files larger than this unchanged, 0 for no limit '
+                                           '(default: $CODE_CLEANER_MAX_FILE_MB or %(default)s)')
+    parser.add_argument('--hardlink', action='store_true',
+                        help='Hard-link outputs identical to their source where no reflink is possible, instead '
+                             'of copying them; only if neither side is ever edited in place')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Run detection and cleaning without writing the output directory')
+    parser.add_argument('--report', metavar='FILE',
+                        help='Write per-file and per-language statistics as JSON to FILE')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each stage and rule and show the slowest files')
+    parser.add_argument('--profile-trace', metavar='FILE',
+                        help='Also write the profile as a Chrome trace JSON to FILE (implies --profile)')
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help='Number of slowest files to show when profiling (default: %(default)s)')
+    parser.add_argument('--result-cache', nargs='?', const=default_directory(), metavar='DIR',
+                        help='Reuse cleaned files across runs and repositories from a shared store in DIR '
+                             '(default: $CODE_CLEANER_STORE or ~/.cache/code-cleaner/results)')
+    parser.add_argument('--result-cache-mb', type=int, default=1024, metavar='MB',
+                        help='Size limit of the result cache; older entries are evicted (default: %(default)s)')
     
     args = parser.parse_args()
+    if args.input == '-':
+        if args.language not in rules.languages():
+            parser.error(f"'-' needs --language, one of: {', '.join(rules.languages())}")
+        filter_stream(sys.stdin.buffer, sys.stdout.buffer, args.language)
+        return
+    if args.in_place and args.incremental:
+        parser.error('--in-place cannot be combined with --incremental')
+    if args.watch and (args.in_place or args.dry_run or args.since or args.staged):
+        parser.error('--watch cannot be combined with --in-place, --dry-run, --since or --staged')
     
     current_dir = os.getcwd()
-    output_dir = os.path.join(current_dir, args.output)
+    output_dir = None if args.in_place else os.path.join(current_dir, args.output)
     exclude_patterns = args.exclude.split(',')
     process_subdirs = not args.no_subdirs
+    stream_threshold = args.stream_threshold * 1024 * 1024
+    budget = Budget(args.file_timeout or None, args.max_file_mb * 1024 * 1024 or None)
+    
+    # Ask git for the changed files instead of walking the whole tree
+    changed = None
+    if args.since or args.staged:
+        try:
+            changed = staged_files(current_dir) if args.staged else changed_files(args.since, current_dir)
+        except GitError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+        if not process_subdirs:
+            changed = [path for path in changed if '/' not in path]
     
     print("Code Cleaner CLI Tool")
     print("=====================")
     print(f"Scanning directory: {current_dir}")
-    print(f"Output directory: {output_dir}")
+    print(f"Output directory: {output_dir or 'in place'}")
     print(f"Exclude patterns: {args.exclude}")
+    print(f"Honoring ignore files: {'Yes' if args.gitignore else 'No'}")
     print(f"Processing subdirectories: {'Yes' if process_subdirs else 'No'}")
+    print(f"Parallel jobs: {args.jobs}")
+    print(f"Incremental: {'Yes' if args.incremental else 'No'}")
+    if changed is not None:
+        print(f"Changed files: {len(changed)} ({'staged' if args.staged else f'since {args.since}'})")
+    print(f"Result cache: {args.result_cache or 'No'}")
+    print(f"Hard links: {'Yes' if args.hardlink else 'No'}")
+    print(f"Dry run: {'Yes' if args.dry_run else 'No'}")
     print()
     
     # Create the output directory
-    os.makedirs(output_dir, exist_ok=True)
+    if output_dir is not None and not args.dry_run:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    # Started before the first pass, so files saved while it runs are picked up afterwards
+    watcher = None
+    if args.watch:
+        watcher = open_watcher(current_dir, exclude_patterns, process_subdirs, [output_dir], args.poll)
     
     # Count variables
     total_files = 0
-    processed_files = 0
-    skipped_files = 0
+    counts = {'processed': 0, 'skipped': 0, 'unchanged': 0, 'cached': 0, 'changed': 0, 'over_budget': 0,
+              'identical': 0}
+    manifest = Manifest.load(output_dir) if args.incremental else None
+    report = Report() if args.report else None
+    profile = args.profile or bool(args.profile_trace)
+    profiler = Profiler(args.profile_top) if profile else None
+    stage = profiler.stage if profiler is not None else NULL_RECORDER.stage
+    store = ResultStore(args.result_cache, args.result_cache_mb * 1024 * 1024) if args.result_cache else None
     
-    # Walk through the directory
-    for root, dirs, files in os.walk(current_dir):
-        # Skip the output directory
-        if os.path.abspath(root).startswith(os.path.abspath(output_dir)):
-            continue
+    with OrderedPool(clean_file, args.jobs) as pool:
+        # Excluded and ignored directories are pruned by the walker itself
+        skip = [output_dir] if output_dir is not None else []
+        if changed is not None:
+            entries = walk_paths(current_dir, changed, exclude_patterns, skip=skip)
+        else:
+            entries = walk_files(current_dir, exclude_patterns, recursive=process_subdirs,
+                                 use_ignore_files=args.gitignore, skip=skip)
+        if profiler is not None:
+            entries = profiler.iterate('walk', entries)
         
-        # Skip excluded directories
-        dirs[:] = [d for d in dirs if not any(pattern in os.path.join(root, d) for pattern in exclude_patterns)]
-        
-        # If not processing subdirectories and not in the current directory, skip
-        if not process_subdirs and root != current_dir:
-            continue
-        
-        for file in files:
-            file_path = os.path.join(root, file)
+        for entry, relative_path in entries:
+            file_path = entry.path
             total_files += 1
             
-            if should_process_file(file_path, exclude_patterns, output_dir):
-                # Determine the relative path for the output file
-                relative_path = os.path.relpath(file_path, current_dir)
-                output_file = os.path.join(output_dir, relative_path)
+            with stage('classify'):
+                wanted = should_process_file(file_path, [], output_dir, entry.stat())
+            
+            if wanted:
+                # Determine the output file
+                output_file = file_path if output_dir is None else os.path.join(output_dir, relative_path)
                 
-                # Process the file
-                print(f"Processing: {relative_path}")
-                if process_file(file_path, output_file):
-                    processed_files += 1
-                else:
-                    skipped_files += 1
-                    print(f"  Skipped due to processing error")
+                if manifest is not None:
+                    with stage('manifest'):
+                        current = manifest.is_current(relative_path, file_path,
+                                                      detect_language(file_path), entry.stat())
+                    if current:
+                        counts['unchanged'] += 1
+                        continue
+                
+                # Queue the file; results come back in the order they were queued
+                results = pool.submit(relative_path, file_path, output_file, stream_threshold, args.dry_run, profile,
+                                      store, budget, args.hardlink)
+                report_results(results, counts, manifest, report, profiler)
             else:
-                skipped_files += 1
+                counts['skipped'] += 1
+        
+        with stage('wait'):
+            results = pool.finish()
+        report_results(results, counts, manifest, report, profiler)
+    
+    removed_files = []
+    if manifest is not None and not args.dry_run:
+        removed_files = manifest.remove_stale(current_dir)
+        for relative_path in removed_files:
+            print(f"Removed: {relative_path}")
+        manifest.save()
+    
+    evicted = store.evict() if store is not None else 0
     
     print()
     print("Processing complete!")
     print("------------------")
     print(f"Total files scanned: {total_files}")
-    print(f"Files processed: {processed_files}")
-    print(f"Files skipped: {skipped_files}")
+    print(f"Files processed: {counts['processed']}")
+    print(f"Files skipped: {counts['skipped']}")
+    if manifest is not None:
+        print(f"Files unchanged: {counts['unchanged']}")
+        print(f"Stale outputs removed: {len(removed_files)}")
+    if counts['over_budget']:
+        print(f"Files over the time or size budget, copied unchanged: {counts['over_budget']}")
+    if args.in_place:
+        print(f"Files changed: {counts['changed']}")
+    elif counts['identical']:
+        print(f"Files identical to their source, cloned instead of written: {counts['identical']}")
+    if store is not None:
+        print(f"Files reused from the result cache: {counts['cached']}")
+        print(f"Result cache entries evicted: {evicted}")
+    if report is not None:
+        report.write(args.report, args.dry_run)
+        print(f"Report written to: {args.report}")
+    if profiler is not None:
+        print()
+        profiler.print_summary()
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+            print(f"Trace written to: {args.profile_trace}")
     print()
-    print(f"Processed files are saved in: {output_dir}")
+    if args.dry_run:
+        print("Dry run: no files were written")
+    elif args.in_place:
+        print("Files were cleaned in place")
+    else:
+        print(f"Processed files are saved in: {output_dir}")
+    
+    if watcher is not None:
+        print()
+        sync_changes(watcher, current_dir, output_dir, args.gitignore, args.jobs, stream_threshold, manifest, store,
+                     budget, args.hardlink)
+
+
+def hook_main(argv: Optional[List[str]] = None) -> int:
+    """Pre-commit hook: clean the staged files in place, and fail the commit if any changed.
+
+    Runs as a plain .git/hooks/pre-commit script, or from the pre-commit
+    framework, which passes the staged files as arguments. Only the named
+    files are looked at, one after the other in this process: no tree walk
+    and no worker pool, so the hook stays fast in large repositories.
+    """
+    parser = argparse.ArgumentParser(prog='code-cleaner-hook',
+                                     description='Clean staged files in place before they are committed')
+    parser.add_argument('files', nargs='*', help='Files to clean (default: the files staged in git)')
+    parser.add_argument('-e', '--exclude', default='node_modules,.git,__pycache__,.DS_Store',
+                        help='Comma-separated list of glob patterns to exclude')
+    args = parser.parse_args(argv)
+    
+    root = os.getcwd()
+    try:
+        budget = Budget.from_env()
+        paths = [path.replace(os.sep, '/') for path in args.files] or staged_files(root)
+    except (GitError, ValueError) as e:
+        print(f"code-cleaner: {e}", file=sys.stderr)
+        return 2
+    
+    changed, failed = [], []
+    for entry, relative_path in walk_paths(root, paths, args.exclude.split(',')):
+        if not should_process_file(entry.path, [], None, entry.stat()):
+            continue
+        stats = clean_file(entry.path, entry.path, budget=budget)
+        if stats is None:
+            failed.append(relative_path)
+        elif stats['changed']:
+            changed.append(relative_path)
+    
+    for relative_path in changed:
+        print(f"Cleaned: {relative_path}")
+    if changed:
+        print("code-cleaner removed comments or log statements; review and stage the changes, then commit again")
+    return 1 if changed or failed else 0
 
 
 if __name__ == "__main__":
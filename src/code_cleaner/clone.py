@@ -0,0 +1,70 @@
+"""Copy files without copying their data where the filesystem allows: reflink, then hard link, then a copy."""
+
+import os
+import shutil
+import sys
+import uuid
+from typing import Set, Tuple
+
+# ioctl number of FICLONE, _IOW(0x94, 9, int) in <linux/fs.h>
+FICLONE = 0x40049409
+
+# (source device, destination device) pairs where reflinks or hard links already failed
+_no_reflink: Set[Tuple[int, int]] = set()
+_no_hardlink: Set[Tuple[int, int]] = set()
+
+
+def _reflink(source: str, partial: str) -> bool:
+    # Imported here: fcntl doesn't exist on Windows
+    import fcntl
+    with open(source, 'rb') as src, open(partial, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def clone_file(source: str, destination: str, hardlink: bool = False) -> str:
+    """Make ``destination`` a copy of ``source`` and return how: 'reflink', 'hardlink' or 'copy'.
+
+    A reflink (Btrfs, XFS, overlayfs on either) shares the data blocks
+    copy-on-write, so it costs no data I/O and either file can still be
+    changed on its own. A hard link makes both names one file, so only
+    pass ``hardlink`` where neither is ever modified in place. Copies keep
+    the permissions and times, as ``shutil.copy2`` does. ``destination``
+    is replaced, never written through, so whatever it was linked to
+    before is left alone.
+    """
+    stat = os.stat(source)
+    if hardlink and os.path.exists(destination) and os.path.samestat(stat, os.stat(destination)):
+        # Already linked; renaming a link over itself would leave the temporary name behind
+        return 'hardlink'
+    devices = (stat.st_dev, os.stat(os.path.dirname(os.path.abspath(destination))).st_dev)
+    partial = f'{destination}.{uuid.uuid4().hex}.tmp'
+    try:
+        method = None
+        if sys.platform.startswith('linux') and devices not in _no_reflink:
+            if _reflink(source, partial):
+                method = 'reflink'
+            else:
+                _no_reflink.add(devices)
+                os.remove(partial)
+        if method is None and hardlink and devices not in _no_hardlink:
+            try:
+                os.link(source, partial)
+                method = 'hardlink'
+            except OSError:
+                # Another filesystem, too many links, or no hard links at all
+                _no_hardlink.add(devices)
+        if method is None:
+            shutil.copyfile(source, partial)
+            method = 'copy'
+        if method != 'hardlink':
+            shutil.copystat(source, partial)
+        os.replace(partial, destination)
+        return method
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
@@ -0,0 +1,380 @@
+"""Static dead-code pass run before the LLM.
+
+Removes what it can prove is dead and reports the lines where dead code
+may remain, so that only those parts of a file are sent to the model.
+"""
+
+import ast
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from code_cleaner.chunking import source_lines, token_pattern
+
+# Languages checked with the lexical heuristics below
+C_FAMILY = ('c', 'cpp', 'csharp', 'java', 'javascript', 'typescript', 'go', 'kotlin', 'swift', 'rust', 'php')
+
+
+class Analysis(NamedTuple):
+    """Result of the static pass over one source."""
+    text: str
+    # Statements or blocks removed as provably dead
+    removed: int
+    # 1-based lines of ``text`` holding dead-code candidates that need the
+    # LLM, or None if the language is not analyzed or the source didn't parse
+    uncertain: Optional[List[int]]
+
+
+def analyze(text: str, language: str) -> Analysis:
+    """Remove provably dead code from ``text`` and locate the uncertain candidates."""
+    if language == 'python':
+        return _analyze_python(text)
+    if language in C_FAMILY:
+        return _analyze_c_family(text, language)
+    return Analysis(text, 0, None)
+
+
+def _apply(text: str, ranges: Iterable[Tuple[int, int, Optional[str]]]) -> str:
+    """Replace 1-based inclusive line ranges by a line (or nothing), ignoring nested ranges."""
+    lines = text.splitlines(keepends=True)
+    kept = []
+    for start, end, replacement in sorted(ranges, key=lambda item: (item[0], -item[1])):
+        if kept and start <= kept[-1][1]:
+            continue
+        kept.append((start, end, replacement))
+    for start, end, replacement in reversed(kept):
+        lines[start - 1:end] = [replacement] if replacement is not None else []
+    return ''.join(lines)
+
+
+# Python
+
+def _prefix(line: str, col: int) -> str:
+    """Return the text before a column given as an UTF-8 byte offset, as ast reports it."""
+    return line.encode('utf-8')[:col].decode('utf-8', errors='ignore')
+
+
+def _first_line(node: ast.stmt) -> int:
+    decorators = getattr(node, 'decorator_list', None)
+    return min([node.lineno] + [decorator.lineno for decorator in decorators or ()])
+
+
+def _owns_lines(lines: List[str], first: ast.stmt, last: ast.stmt) -> bool:
+    """Check that the statements from ``first`` to ``last`` share no line with other code."""
+    start = _first_line(first)
+    head = lines[start - 1]
+    col = first.col_offset if start == first.lineno else len(head.encode('utf-8')) - len(head.lstrip().encode('utf-8'))
+    tail = lines[last.end_lineno - 1].encode('utf-8')[last.end_col_offset:].decode('utf-8', errors='ignore')
+    return not _prefix(head, col).strip() and not tail.strip().strip(';')
+
+
+def _bodies(node: ast.AST) -> Iterable[List[ast.stmt]]:
+    for field in ('body', 'orelse', 'finalbody'):
+        body = getattr(node, field, None)
+        if isinstance(body, list) and body and isinstance(body[0], ast.stmt):
+            yield body
+
+
+def _is_false(test: ast.expr) -> bool:
+    return isinstance(test, ast.Constant) and not test.value
+
+
+def _is_exit(node: ast.stmt) -> bool:
+    """Check for a call that ends the process: sys.exit(), exit(), quit() or os._exit()."""
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return False
+    func = node.value.func
+    if isinstance(func, ast.Name):
+        return func.id in ('exit', 'quit')
+    return isinstance(func, ast.Attribute) and func.attr in ('exit', '_exit')
+
+
+def _name_uses(tree: ast.AST) -> Counter:
+    """Count every name read, attribute accessed or mentioned in a string."""
+    uses = Counter()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Store):
+            uses[node.id] += 1
+        elif isinstance(node, ast.Attribute):
+            uses[node.attr] += 1
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            uses.update(re.findall(r'\w+', node.value))
+    return uses
+
+
+def _unused_outside(uses: Counter, definition: ast.AST) -> bool:
+    """Check that a function's name is used nowhere but inside the function itself."""
+    return uses[definition.name] == _name_uses(definition)[definition.name]
+
+
+def _import_names(node: ast.stmt) -> List[str]:
+    return [(alias.asname or alias.name).split('.')[0] for alias in node.names]
+
+
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+
+
+def _bindings(nodes: Iterable[ast.AST], skip: Set[int] = frozenset()) -> Tuple[Set[str], Set[str], bool]:
+    """Return the names stored and loaded by ``nodes`` in their own scope, and whether they yield."""
+    stored, loaded, yields = set(), set(), False
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if id(node) in skip:
+            continue
+        if isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else stored).add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            stored.update(_import_names(node))
+        elif isinstance(node, (ast.Yield, ast.YieldFrom)):
+            yields = True
+        if isinstance(node, _SCOPES):
+            if not isinstance(node, ast.Lambda):
+                stored.add(node.name)
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+    return stored, loaded, yields
+
+
+def _safe_to_drop(dead: List[ast.stmt], scope: ast.AST, uses: Counter) -> bool:
+    """Check that dropping unreachable statements can't change how the rest of the scope runs.
+
+    They still count at compile time: a yield makes the function a
+    generator, and an assignment makes a name local to the whole function.
+    """
+    stored, _, yields = _bindings(dead)
+    if yields:
+        return False
+    if isinstance(scope, ast.Module):
+        return not any(uses[name] for name in stored)
+    stored_elsewhere, loaded_elsewhere, _ = _bindings(ast.iter_child_nodes(scope), {id(node) for node in dead})
+    return all(name in stored_elsewhere or name not in loaded_elsewhere for name in stored)
+
+
+def _python_removals(tree: ast.Module, lines: List[str]) -> List[Tuple[int, int, Optional[str]]]:
+    removals = []
+    uses = _name_uses(tree)
+
+    # Walk blocks together with the function (or module) they belong to
+    stack = [(tree, tree)]
+    while stack:
+        node, scope = stack.pop()
+        for child in ast.iter_child_nodes(node):
+            stack.append((child, child if isinstance(child, _SCOPES) else scope))
+
+        for body in _bodies(node):
+            # Statements after return/raise/continue/break in the same block
+            for index, statement in enumerate(body[:-1]):
+                if isinstance(statement, (ast.Return, ast.Raise, ast.Continue, ast.Break)):
+                    dead = body[index + 1:]
+                    if (_first_line(dead[0]) > statement.end_lineno and _owns_lines(lines, dead[0], dead[-1])
+                            and _safe_to_drop(dead, scope, uses)):
+                        removals.append((_first_line(dead[0]), dead[-1].end_lineno, None))
+                    break
+
+            # if False: / while 0: blocks without an else
+            for statement in body:
+                if (isinstance(statement, (ast.If, ast.While)) and _is_false(statement.test)
+                        and not statement.orelse and _owns_lines(lines, statement, statement)
+                        and _safe_to_drop([statement], scope, uses)):
+                    # A block can't be left empty
+                    indent = lines[statement.lineno - 1][:len(_prefix(lines[statement.lineno - 1],
+                                                                        statement.col_offset))]
+                    replacement = f'{indent}pass\n' if len(body) == 1 else None
+                    removals.append((statement.lineno, statement.end_lineno, replacement))
+
+    return removals
+
+
+def _python_candidates(tree: ast.Module) -> Set[int]:
+    """Lines where dead code may remain that the removals above could not prove."""
+    candidates = set()
+    uses = _name_uses(tree)
+
+    # Module-level names only ever bound to a falsy literal, as in DEBUG = False
+    assigned: Dict[str, List[ast.expr]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    assigned.setdefault(target.id, []).append(node.value)
+    flags = {name for name, values in assigned.items() if all(_is_false(value) for value in values)}
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.If, ast.While, ast.IfExp)):
+            test = node.test
+            if isinstance(test, ast.Constant) or (isinstance(test, ast.Name) and test.id in flags):
+                candidates.add(node.lineno)
+
+        for body in _bodies(node):
+            for index, statement in enumerate(body[:-1]):
+                if _is_exit(statement):
+                    candidates.add(body[index + 1].lineno)
+                    break
+
+        if isinstance(node, ast.Try):
+            for index, handler in enumerate(node.handlers[:-1]):
+                if handler.type is None:
+                    candidates.add(node.handlers[index + 1].lineno)
+
+        # Unused private functions and methods; other modules may still import a private function
+        if isinstance(node, (ast.Module, ast.ClassDef)):
+            for member in node.body:
+                if (isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) and member.name.startswith('_')
+                        and not member.name.startswith('__') and _unused_outside(uses, member)):
+                    candidates.add(member.lineno)
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            candidates.update(_unused_locals(node))
+
+        # Imports may be re-exported or imported for their side effects
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = _import_names(node)
+            if '*' not in names and not all(uses[name] for name in names):
+                candidates.add(node.lineno)
+    return candidates
+
+
+def _unused_locals(function: ast.AST) -> Set[int]:
+    """Lines assigning local variables of ``function`` that it never reads."""
+    stored: Dict[str, int] = {}
+    loaded = set()
+    for node in ast.walk(function):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            loaded.update(node.names)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)) and node is not function:
+            # Closures may read the variable
+            loaded.update(_name_uses(node))
+        elif isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Store):
+                stored.setdefault(node.id, node.lineno)
+            else:
+                loaded.add(node.id)
+    return {line for name, line in stored.items() if name not in loaded and name != '_'}
+
+
+def _analyze_python(text: str) -> Analysis:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return Analysis(text, 0, None)
+
+    removals = _python_removals(tree, text.splitlines(keepends=True))
+    if removals:
+        cleaned = _apply(text, removals)
+        try:
+            tree = ast.parse(cleaned)
+        except (SyntaxError, ValueError):
+            # A removal we got wrong; keep the source as it was
+            removals = []
+        else:
+            text = cleaned
+    return Analysis(text, len(removals), sorted(_python_candidates(tree)))
+
+
+# C family
+
+_FALSE_IF = re.compile(r'(?:if|while)\s*\(\s*(?:0|false|FALSE|NULL|nil|null)\s*\)\s*\{')
+_PREPROCESSOR_IF = re.compile(r'#\s*if(?:def|ndef)?\b(.*)')
+_PREPROCESSOR_ELSE = re.compile(r'#\s*el(?:se|if)\b')
+_PREPROCESSOR_ENDIF = re.compile(r'#\s*endif\b')
+_TERMINATOR = re.compile(r'(?:return\b[^;{}]*|break|continue|throw\b[^;{}]*|goto\s+\w+);\s*$')
+# What makes a dead block matter: JavaScript hoists var and function declarations
+# out of it, and a jump to a label or case inside it still lands there
+_REACHABLE_INSIDE = re.compile(r'\b(?:var|function|case|default)\b|^\s*\w+\s*:(?!:)', re.MULTILINE)
+_LABEL = re.compile(r'(?:case\b|default\b|\w+\s*:(?!:)|[})\]])')
+_PRIVATE_FUNCTION = re.compile(
+    r'^[ \t]*(?:static|private)\b[^;=(){}\n]*?\b(\w+)\s*\([^;{}]*\)[^;{}]*\{', re.MULTILINE)
+
+
+def _matching_brace(text: str, language: str, opener: int) -> int:
+    """Return the offset just past the brace closing the one at ``opener``, or -1."""
+    depth = 0
+    for match in token_pattern(language).finditer(text, opener):
+        if match.lastgroup == 'open' and match.group() == '{':
+            depth += 1
+        elif match.lastgroup == 'close' and match.group() == '}':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return -1
+
+
+def _line_of(text: str, offset: int) -> int:
+    return text.count('\n', 0, offset) + 1
+
+
+def _dead_preprocessor_if(line: str) -> bool:
+    opened = _PREPROCESSOR_IF.match(line.strip())
+    return bool(opened) and opened.group(1).strip() in ('0', 'false')
+
+
+def _c_removals(text: str, language: str) -> List[Tuple[int, int, Optional[str]]]:
+    removals = []
+
+    # #if 0 ... #endif; with an #else, dropping the dead branch is left to the LLM
+    if language in ('c', 'cpp', 'csharp'):
+        stack = []
+        for number, line in enumerate(text.splitlines(), 1):
+            head = line.strip()
+            if _PREPROCESSOR_IF.match(head):
+                stack.append([number, _dead_preprocessor_if(head), False])
+            elif _PREPROCESSOR_ELSE.match(head) and stack:
+                stack[-1][2] = True
+            elif _PREPROCESSOR_ENDIF.match(head) and stack:
+                start, dead, has_else = stack.pop()
+                if dead and not has_else:
+                    removals.append((start, number, None))
+
+    # if (false) { ... } without an else, and while (false) { ... }, each on lines of their own
+    for match in _FALSE_IF.finditer(text):
+        start = text.rfind('\n', 0, match.start()) + 1
+        end = _matching_brace(text, language, match.end() - 1)
+        if end == -1 or text[start:match.start()].strip():
+            continue
+        line_end = text.find('\n', end)
+        line_end = len(text) if line_end == -1 else line_end
+        if text[end:line_end].strip() or text[line_end:].lstrip().startswith('else'):
+            continue
+        if _REACHABLE_INSIDE.search(text, match.end(), end):
+            continue
+        # As the whole body of a brace-less if/for/while/else, the block is
+        # replaced by an empty statement, so the next one doesn't take its place
+        replacement = None
+        before = text[:start].rstrip()
+        if before and before[-1] not in ';{}':
+            replacement = text[start:match.start()] + ';' + ('\n' if line_end < len(text) else '')
+        removals.append((_line_of(text, start), _line_of(text, line_end), replacement))
+    return removals
+
+
+def _c_candidates(text: str, language: str) -> Set[int]:
+    """Lines where dead code may remain that the removals above could not prove."""
+    candidates = set()
+    lines = source_lines(text, language)
+
+    # A statement after return/break/continue/throw at the same depth, unless it is a label
+    for index, line in enumerate(lines):
+        if _TERMINATOR.search(line.head):
+            following = next((other for other in lines[index + 1:] if not other.blank), None)
+            if following is not None and following.depth >= line.depth and not _LABEL.match(following.head):
+                candidates.add(_line_of(text, following.start))
+
+    # static / private functions referenced nowhere else
+    for match in _PRIVATE_FUNCTION.finditer(text):
+        name = match.group(1)
+        if len(re.findall(r'\b%s\b' % re.escape(name), text)) == 1:
+            candidates.add(_line_of(text, match.start(1)))
+
+    # Constant conditions the removals had to leave, because of an else branch
+    if language in ('c', 'cpp', 'csharp'):
+        candidates.update(number for number, line in enumerate(text.splitlines(), 1) if _dead_preprocessor_if(line))
+    candidates.update(_line_of(text, match.start()) for match in _FALSE_IF.finditer(text))
+    return candidates
+
+
+def _analyze_c_family(text: str, language: str) -> Analysis:
+    removals = _c_removals(text, language)
+    if removals:
+        text = _apply(text, removals)
+    return Analysis(text, len(removals), sorted(_c_candidates(text, language)))
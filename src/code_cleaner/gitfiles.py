@@ -0,0 +1,48 @@
+"""Ask the local git repository which files changed, for the --since and --staged modes."""
+
+import os
+import subprocess
+from typing import List
+
+
+class GitError(Exception):
+    """Raised when git is missing, the directory is not in a repository or a ref doesn't exist."""
+
+
+def _git(args: List[str], cwd: str) -> bytes:
+    try:
+        result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise GitError('git is not installed') from None
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode('utf-8', 'replace').strip()
+        raise GitError(message or f'git {args[0]} failed with status {e.returncode}') from None
+    return result.stdout
+
+
+def _paths(output: bytes) -> List[str]:
+    """Split NUL-separated git output into '/'-separated paths."""
+    return [os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+def staged_files(cwd: str = '.') -> List[str]:
+    """Return the files added, copied, modified or renamed in the index, relative to ``cwd``.
+
+    Only files under ``cwd`` are listed; deleted files are left out.
+    """
+    return _paths(_git(['diff', '--cached', '--name-only', '--relative', '-z', '--diff-filter=ACMR'], cwd))
+
+
+def changed_files(since: str, cwd: str = '.') -> List[str]:
+    """Return the tracked files under ``cwd`` that differ from ``since`` in the working tree.
+
+    Untracked files are left out, so that output trees of earlier runs
+    inside the worktree aren't cleaned again; so are deleted files.
+    """
+    if since.startswith('-'):
+        raise GitError(f'Invalid ref: {since}')
+    try:
+        commit = _git(['rev-parse', '--verify', '--quiet', f'{since}^{{commit}}'], cwd).decode().strip()
+    except GitError as e:
+        raise GitError(f'Unknown ref {since!r}: {e}') from None
+    return sorted(_paths(_git(['diff', '--name-only', '--relative', '-z', '--diff-filter=ACMR', commit, '--'], cwd)))
@@ -0,0 +1,140 @@
+"""Background job queue used by the web upload endpoints."""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def is_job_id(job_id: str) -> bool:
+    """Check that ``job_id`` has the form of the ids jobs are given, before it goes into a path."""
+    try:
+        return str(uuid.UUID(job_id)) == job_id
+    except ValueError:
+        return False
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """One queued upload and its progress, as reported by /status/<job_id>."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = 'queued'
+        self.files_total = 0
+        self.files_done = 0
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def progress(self, done: int, total: int) -> None:
+        """Progress callback handed to the processing functions."""
+        self.files_done = done
+        self.files_total = total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'files_done': self.files_done,
+            'files_total': self.files_total,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a fixed pool of worker threads.
+
+    At most ``workers`` jobs run at a time; up to ``max_queued`` more may
+    wait, beyond which ``submit`` raises QueueFull so the endpoint can
+    answer 503 instead of piling up work. Finished jobs are forgotten
+    after ``retention`` seconds. Downloads that clean while they stream
+    take one of the ``workers`` slots too, through ``start_stream``.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 16, retention: float = 3600):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self._jobs: Dict[str, Job] = {}
+        self._waiting: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._running = 0
+        self._streams = 0
+        self._condition = threading.Condition()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'code-cleaner-job-{index}', daemon=True)
+            thread.start()
+
+    def submit(self, func: Callable, *args, job_id: Optional[str] = None) -> Job:
+        """Queue ``func(job, *args)`` and return its Job at once."""
+        with self._condition:
+            self._forget_finished()
+            if len(self._waiting) >= self.max_queued:
+                raise QueueFull(f'{len(self._waiting)} jobs are already waiting')
+            job = Job(job_id or str(uuid.uuid4()))
+            self._jobs[job.id] = job
+            self._waiting[job.id] = (func, args)
+            self._condition.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """Return the 1-based position of a queued job in the queue, 1 being next to run (0 once it is running)."""
+        with self._condition:
+            for index, job_id in enumerate(self._waiting):
+                if job_id == job.id:
+                    return index + 1
+        return 0
+
+    def start_stream(self) -> None:
+        """Take a worker slot for a download that cleans while it streams.
+
+        Raises QueueFull if jobs and other streams hold every slot. The slot
+        is held until ``end_stream``; queued jobs wait for it like for any
+        other running job.
+        """
+        with self._condition:
+            if self._running + self._streams >= self.workers:
+                raise QueueFull(f'{self._running} jobs and {self._streams} streams are already running')
+            self._streams += 1
+
+    def end_stream(self) -> None:
+        """Give back the slot taken by ``start_stream``."""
+        with self._condition:
+            self._streams -= 1
+            self._condition.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._waiting or self._running + self._streams >= self.workers:
+                    self._condition.wait()
+                job_id, (func, args) = self._waiting.popitem(last=False)
+                job = self._jobs[job_id]
+                job.status = 'running'
+                self._running += 1
+
+            try:
+                job.result = func(job, *args)
+                job.status = 'done'
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = 'failed'
+            job.finished = time.time()
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
+
+    def _forget_finished(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
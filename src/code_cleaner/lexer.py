@@ -0,0 +1,462 @@
+"""Single-pass scanner that strips comments and log statements from source text."""
+
+import re
+import tempfile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from code_cleaner.budget import check_deadline
+
+# Bump whenever a change to the scanner can change its output, so that
+# incremental runs re-clean files produced by an older engine
+ENGINE_VERSION = 1
+
+# Characters of a block comment held in memory before it is spooled to disk;
+# also the longest line the streaming scanner waits for before cutting it
+SPOOL_SIZE = 1024 * 1024
+
+# Characters held back when a line has to be cut, so openers are not split
+LOOKAHEAD = 64
+
+# Longest multi-line string literal carried between chunks before giving up on it
+MAX_CARRY = 16 * 1024 * 1024
+
+# Tokens consumed between checks of the deadline
+DEADLINE_EVERY = 256
+
+
+class StringRule(NamedTuple):
+    """A string/char/template literal that the scanner copies through untouched.
+
+    ``body`` is a regex for the rest of the literal after its opening quote,
+    closing quote included, for literals that aren't simply everything up to
+    the next quote, such as Rust char literals next to lifetimes (``'a``).
+    """
+    quote: str
+    multiline: bool = False
+    escapes: bool = True
+    body: Optional[str] = None
+
+
+def string_body(rule: StringRule):
+    """Compile the regex matching the rest of a literal after its opening quote.
+
+    Also used by ``chunking``, so that it skips literals exactly as the
+    scanner does.
+    """
+    if rule.body is not None:
+        return re.compile('(?:%s)' % rule.body)
+    q = re.escape(rule.quote)
+    if rule.escapes:
+        any_char = r'[\s\S]' if rule.multiline else '.'
+        stop = '\\\\' if rule.multiline else '\\\\\\n'
+        return re.compile(r'[^%s%s]*(?:\\%s[^%s%s]*)*%s' % (q, stop, any_char, q, stop, q))
+    stop = '' if rule.multiline else '\\n'
+    return re.compile(r'[^%s%s]*%s' % (q, stop, q))
+
+
+# A log pattern ending in a lazy '.*?' followed by a plain literal, or by '$'
+_LAZY_TAIL = re.compile(r'\.\*\?(\$|(?:\\[^\w\s]|[^\\.^$*+?{}\[\]()|\s])+)\Z')
+
+
+def _split_log(pattern: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Split a log pattern into a regex for its head and the literal its lazy tail runs to.
+
+    The literal is None for a tail running to the end of the line. Returns
+    None for patterns of any other shape.
+    """
+    match = _LAZY_TAIL.search(pattern)
+    if match is None or match.start() == 0 or '|' in pattern:
+        return None
+    head = pattern[:match.start()]
+    if (len(head) - len(head.rstrip('\\'))) % 2:
+        # The '.' is escaped, so it is a literal dot rather than any character
+        return None
+    try:
+        re.compile(head)
+    except re.error:
+        return None
+    tail = match.group(1)
+    return head, None if tail == '$' else re.sub(r'\\(.)', r'\1', tail)
+
+
+def _find_from(text: str, needle: str, index: int, found: Dict[str, Tuple[int, int]]) -> int:
+    """Return ``text.find(needle, index)``, reusing an earlier answer that is still valid.
+
+    Positions only move forward during a scan, so each needle is searched
+    for once per occurrence rather than once per call.
+    """
+    since, position = found.get(needle, (-1, -1))
+    if since == -1 or index < since or -1 < position < index:
+        position = text.find(needle, index)
+        found[needle] = (index, position)
+    return position
+
+
+def _count_comment(stats: Dict[str, int], removed: str) -> None:
+    stats['comment_bytes'] = stats.get('comment_bytes', 0) + len(removed.encode('utf-8'))
+
+
+def _count_log(stats: Dict[str, int]) -> None:
+    stats['log_statements'] = stats.get('log_statements', 0) + 1
+
+
+class Scanner:
+    r"""Walks a source text once, emitting everything except comments and log calls.
+
+    The scanner searches for the next interesting token (a comment opener, a
+    string quote or a log statement), copies the text before it into the
+    output buffer and then consumes the token. String literals are skipped
+    as a whole so that comment markers inside them are preserved.
+
+    Log patterns such as ``print\s*\(.*?\)`` are split into a head the
+    regex finds and a tail found with ``str.find``: as part of the regex,
+    the tail rescans the rest of the line for every head that doesn't
+    close, which is quadratic on a long line full of unclosed calls.
+    """
+
+    def __init__(self, line_comments: Sequence[str], block_comments: Sequence[Tuple[str, str]],
+                 strings: Sequence[StringRule], log_patterns: Sequence[str]):
+        self.blocks = list(block_comments)
+        self.strings = list(strings)
+        self._string_bodies = [string_body(rule) for rule in self.strings]
+        self._string_index = {'s%d' % index: index for index in range(len(self.strings))}
+        split = [_split_log(pattern) for pattern in log_patterns]
+        if split and all(split):
+            self._log_heads = [re.compile(head, re.MULTILINE) for head, _ in split]
+            self._log_tails = [tail for _, tail in split]
+        else:
+            self._log_heads = self._log_tails = None
+
+        # Block openers go first so that e.g. a Python '"""' wins over '"'
+        alternatives = []
+        for index, (opener, _) in enumerate(self.blocks):
+            alternatives.append(('b%d' % index, re.escape(opener)))
+        if line_comments:
+            alternatives.append(('line', '|'.join(re.escape(m) for m in line_comments)))
+        for index, rule in enumerate(self.strings):
+            alternatives.append(('s%d' % index, re.escape(rule.quote)))
+        if self._log_heads is not None:
+            alternatives.extend(('h%d' % index, head.pattern) for index, head in enumerate(self._log_heads))
+        elif log_patterns:
+            alternatives.append(('log', '|'.join('(?:%s)' % p for p in log_patterns)))
+
+        if alternatives:
+            self.pattern = re.compile('|'.join(r'(?P<%s>%s)' % alt for alt in alternatives), re.MULTILINE)
+            # The same alternation without a group around each branch: only then
+            # can re skip ahead by the set of first characters, which makes
+            # searching several times faster
+            self._find = re.compile('|'.join('(?:%s)' % regex for _, regex in alternatives), re.MULTILINE)
+        else:
+            self.pattern = self._find = None
+
+    def _search(self, text: str, index: int):
+        """Return the match of ``pattern`` for the next token at or after ``index``, or None."""
+        token = self._find.search(text, index)
+        return None if token is None else self.pattern.match(text, token.start())
+
+    def _log_end(self, text: str, match, found: Dict[str, Tuple[int, int]]) -> int:
+        """Return where the log statement whose head ``match`` found ends, or -1 if it doesn't close.
+
+        Like the regex alternation, the heads after the one that matched
+        are tried at the same position before giving up.
+        """
+        start = match.start()
+        index = int(match.lastgroup[1:])
+        end = match.end()
+        while True:
+            newline = _find_from(text, '\n', end, found)
+            line_end = len(text) if newline == -1 else newline
+            tail = self._log_tails[index]
+            if tail is None:
+                return line_end
+            close = _find_from(text, tail, end, found)
+            if close != -1 and close + len(tail) <= line_end:
+                return close + len(tail)
+            while True:
+                index += 1
+                if index == len(self._log_heads):
+                    return -1
+                head = self._log_heads[index].match(text, start)
+                if head is not None:
+                    end = head.end()
+                    break
+
+    def _unclosed_end(self, text: str, index: int, end: int, found: Dict[str, Tuple[int, int]]) -> int:
+        """Return how far the body of an unclosed literal of string rule ``index`` was scanned.
+
+        A later quote of the same rule before that point was part of the
+        failed body, as an escaped quote, so its own body fails the same way.
+        That doesn't hold for a custom ``body``, so none is skipped for those.
+        """
+        if self.strings[index].body is not None:
+            return end
+        if self.strings[index].multiline:
+            return len(text)
+        newline = _find_from(text, '\n', end, found)
+        return len(text) if newline == -1 else newline
+
+    def clean(self, text: str, stats: Optional[Dict[str, int]] = None, deadline: Optional[float] = None) -> str:
+        """Return ``text`` with comments and log statements removed.
+
+        If ``stats`` is given, the UTF-8 size of the removed comments and the
+        number of removed log statements are added to its ``comment_bytes``
+        and ``log_statements`` counters. Past the ``time.perf_counter()``
+        value ``deadline``, BudgetExceeded is raised.
+        """
+        if self.pattern is None:
+            return text
+
+        find = self._find.search
+        classify = self.pattern.match
+        string_index = self._string_index
+        out: List[str] = []
+        # Removed comments and the number of removed log statements, counted into stats at the end
+        comments: List[str] = []
+        logs = 0
+        # Closing delimiters already known to be absent from the rest of the text
+        missing = set()
+        found = {}
+        # Per string rule, the end of the text the last unclosed literal ran through
+        unclosed = {}
+        pos = 0    # start of the text not yet copied to the output
+        i = 0      # where to resume searching
+        end_of_text = len(text)
+        tokens = 0
+
+        while True:
+            token = find(text, i)
+            if token is None:
+                break
+            tokens += 1
+            if deadline is not None and not tokens % DEADLINE_EVERY:
+                check_deadline(deadline)
+            start = token.start()
+            match = classify(text, start)
+            kind = match.lastgroup
+            end = match.end()
+            index = string_index.get(kind)
+            if index is not None:
+                # The most common token, so it is tried first
+                body = None if unclosed.get(index, -1) > start else self._string_bodies[index].match(text, end)
+                if body:
+                    i = body.end()
+                else:
+                    i = end
+                    if unclosed.get(index, -1) <= start:
+                        unclosed[index] = self._unclosed_end(text, index, end, found)
+                continue
+            if kind[0] == 'h':
+                end = self._log_end(text, match, found)
+                if end == -1:
+                    i = start + 1
+                    continue
+                kind = 'log'
+
+            if kind == 'line':
+                newline = text.find('\n', end)
+                out.append(text[pos:start])
+                pos = i = end_of_text if newline == -1 else newline
+                comments.append(text[start:pos])
+            elif kind == 'log':
+                out.append(text[pos:start])
+                pos = end
+                i = end if end > start else end + 1
+                logs += 1
+            else:
+                closer = self.blocks[int(kind[1:])][1]
+                close = -1 if closer in missing else text.find(closer, end)
+                if close == -1:
+                    # Unterminated block: leave the opener in place
+                    missing.add(closer)
+                    i = end
+                else:
+                    out.append(text[pos:start])
+                    pos = i = close + len(closer)
+                    comments.append(text[start:pos])
+
+        out.append(text[pos:])
+        if stats is not None:
+            if comments:
+                _count_comment(stats, ''.join(comments))
+            if logs:
+                stats['log_statements'] = stats.get('log_statements', 0) + logs
+        return ''.join(out)
+
+    def clean_stream(self, chunks: Iterable[str], missing: Iterable[str] = (), spool_size: int = SPOOL_SIZE,
+                     stats: Optional[Dict[str, int]] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """Clean text arriving in chunks, yielding the output as it is produced.
+
+        Lexer state (inside a line comment, a block comment or a multi-line
+        string) is carried across chunk boundaries. Only the current chunk
+        and the unfinished tail of the previous one are held in memory: the
+        body of a block comment is spooled to a temporary file, so it can be
+        put back if it turns out to be unterminated. ``stats`` and
+        ``deadline`` work as in ``clean``.
+        """
+        if self.pattern is None:
+            yield from chunks
+            return
+
+        search = self._search
+        missing = set(missing)
+        chunks = iter(chunks)
+        buf = ''
+        in_line = False
+        block = None    # (closer, spool) while inside a block comment
+        final = False
+
+        tokens = 0
+        while not final:
+            check_deadline(deadline)
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                buf += chunk
+
+            if in_line:
+                newline = buf.find('\n')
+                if stats is not None:
+                    _count_comment(stats, buf if newline == -1 else buf[:newline])
+                if newline == -1:
+                    buf = ''
+                    continue
+                buf = buf[newline:]
+                in_line = False
+
+            if block is not None:
+                closer, spool = block
+                close = buf.find(closer)
+                if close == -1 and not final:
+                    # Keep enough of the tail to find a closer split across chunks
+                    keep = max(0, len(buf) - len(closer) + 1)
+                    spool.write(buf[:keep])
+                    buf = buf[keep:]
+                    continue
+                block = None
+                if close == -1:
+                    # Unterminated: put the text back, with the opener left in place
+                    spool.write(buf)
+                    spool.seek(0)
+                    yield from self.clean_stream(iter(lambda: spool.read(spool_size), ''),
+                                                 missing | {closer}, spool_size, stats, deadline)
+                    spool.close()
+                    return
+                if stats is not None:
+                    spool.seek(0)
+                    for piece in iter(lambda: spool.read(spool_size), ''):
+                        _count_comment(stats, piece)
+                    _count_comment(stats, buf[:close + len(closer)])
+                spool.close()
+                buf = buf[close + len(closer):]
+
+            if final:
+                limit = len(buf)
+            else:
+                # Only scan complete lines; very long lines are cut near the end
+                limit = buf.rfind('\n') + 1
+                if limit == 0:
+                    if len(buf) < max(spool_size, 2 * LOOKAHEAD):
+                        continue
+                    limit = len(buf) - LOOKAHEAD
+
+            out: List[str] = []
+            found = {}
+            unclosed = {}
+            pos = i = 0
+            carry = None
+            while True:
+                match = search(buf, i)
+                if match is None or (match.start() >= limit and not final):
+                    break
+                tokens += 1
+                if deadline is not None and not tokens % DEADLINE_EVERY:
+                    check_deadline(deadline)
+                kind = match.lastgroup
+                start, end = match.span()
+                if kind[0] == 'h':
+                    end = self._log_end(buf, match, found)
+                    if end == -1:
+                        if (not final and len(buf) - start <= MAX_CARRY
+                                and _find_from(buf, '\n', match.end(), found) == -1):
+                            # The line was cut, so the call may still close in a later chunk
+                            out.append(buf[pos:start])
+                            carry = buf[start:]
+                            pos = i = len(buf)
+                            break
+                        i = start + 1
+                        continue
+                    kind = 'log'
+
+                if kind == 'line':
+                    out.append(buf[pos:start])
+                    newline = buf.find('\n', end)
+                    if stats is not None:
+                        _count_comment(stats, buf[start:] if newline == -1 else buf[start:newline])
+                    if newline == -1:
+                        in_line = not final
+                        pos = i = len(buf)
+                        break
+                    pos = i = newline
+                elif kind == 'log':
+                    if end == len(buf) and not final and len(buf) < MAX_CARRY:
+                        # A '$'-anchored pattern may continue in the next chunk
+                        carry = buf[pos:]
+                        break
+                    out.append(buf[pos:start])
+                    pos = end
+                    i = end if end > start else end + 1
+                    if stats is not None:
+                        _count_log(stats)
+                elif kind[0] == 'b':
+                    closer = self.blocks[int(kind[1:])][1]
+                    close = -1 if closer in missing else buf.find(closer, end)
+                    if close != -1:
+                        out.append(buf[pos:start])
+                        pos = i = close + len(closer)
+                        if stats is not None:
+                            _count_comment(stats, buf[start:pos])
+                    elif final or closer in missing:
+                        missing.add(closer)
+                        i = end
+                    else:
+                        out.append(buf[pos:start])
+                        keep = max(end, len(buf) - len(closer) + 1)
+                        block = (closer, tempfile.SpooledTemporaryFile(max_size=spool_size, mode='w+',
+                                                                       encoding='utf-8'))
+                        block[1].write(buf[start:keep])
+                        carry = buf[keep:]
+                        pos = i = len(buf)
+                        break
+                else:
+                    index = int(kind[1:])
+                    rule = self.strings[index]
+                    if unclosed.get(index, -1) > start:
+                        i = end
+                        continue
+                    body = self._string_bodies[index].match(buf, end)
+                    if body:
+                        i = body.end()
+                    elif (final or len(buf) - start > MAX_CARRY
+                          or (not rule.multiline and _find_from(buf, '\n', end, found) != -1)):
+                        i = end
+                        unclosed[index] = self._unclosed_end(buf, index, end, found)
+                    else:
+                        # The literal may close in a later chunk
+                        carry = buf[pos:]
+                        pos = i = len(buf)
+                        break
+
+            if carry is None:
+                cut = max(i, limit) if pos < len(buf) else pos
+                out.append(buf[pos:cut])
+                carry = buf[cut:]
+            buf = carry
+            if out:
+                yield ''.join(out)
+
+
+def compile_scanner(syntax: Dict[str, list], log_patterns: Sequence[str],
+                    strings: Optional[Sequence[StringRule]] = None) -> Scanner:
+    """Build a scanner from a COMMENT_PATTERNS entry and its log patterns."""
+    return Scanner(syntax.get('line', []), syntax.get('block', []), strings or [], log_patterns)
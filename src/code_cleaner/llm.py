@@ -0,0 +1,245 @@
+"""Client for the Ollama generate API, used by the LLM dead-code pass."""
+
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from code_cleaner.chunking import chunk_source
+from code_cleaner.deadcode import Analysis, analyze
+from code_cleaner.llm_cache import LLMCache
+
+DEFAULT_URL = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+DEFAULT_MODEL = 'llama3.2'
+
+# Bump when PROMPT changes, so anything keyed on the prompt is invalidated
+PROMPT_VERSION = 1
+
+PROMPT = """You are an expert code analyzer. Analyze the following {language} code and remove any dead code (code that is never executed or has no effect).
+        Do not remove functional code. Return only the cleaned code without any explanations.
+
+        CODE:
+        {code}
+
+        CLEANED CODE:"""
+
+# Responses with these statuses are worth retrying; anything else 4xx is final
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Sources larger than this are sent in chunks; the prompt and the answer
+# both have to fit in the model's context, which Ollama defaults to 2048
+MAX_CHUNK_TOKENS = 800
+
+
+class LLMError(Exception):
+    """Raised when the model could not be reached or gave no usable answer."""
+
+
+class _StatusError(http.client.HTTPException):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _holding_lines(chunks: List[str], lines: List[int]) -> List[bool]:
+    """Return, for each chunk of a text, whether it holds one of the given 1-based lines."""
+    holding = []
+    first = 1
+    for chunk in chunks:
+        following = first + chunk.count('\n')
+        last = following - 1 if chunk.endswith('\n') else following
+        holding.append(any(first <= line <= last for line in lines))
+        first = following
+    return holding
+
+
+class OllamaClient:
+    """Thread-safe Ollama client with a pool of keep-alive connections.
+
+    At most ``concurrency`` requests are in flight at once, however many
+    threads call ``generate``; each gets ``timeout`` seconds per attempt
+    and is retried up to ``retries`` times with exponential backoff on
+    timeouts, dropped connections and 429/5xx answers. A refused
+    connection means no server is running, so it fails at once. With a
+    ``cache``, dead-code results are looked up there before asking the
+    model.
+
+    Sources over ``max_chunk_tokens`` are split into chunks of whole
+    definitions (see chunking.py) that are sent concurrently and stitched
+    back in order. Each chunk is cached on its own, so after an edit only
+    the chunks that changed go to the model again.
+
+    With ``static_pass``, sources first go through the static analysis of
+    deadcode.py: what it proves dead is removed without asking the model,
+    and only the chunks holding lines it is unsure about are sent. Files
+    it finds nothing uncertain in make no call at all.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, model: str = DEFAULT_MODEL, concurrency: int = 4,
+                 timeout: float = 120.0, retries: int = 2, backoff: float = 0.5, cache: Optional[LLMCache] = None,
+                 max_chunk_tokens: int = MAX_CHUNK_TOKENS, static_pass: bool = True):
+        url = urlsplit(base_url if '://' in base_url else f'http://{base_url}')
+        self.base_url = base_url
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.max_chunk_tokens = max_chunk_tokens
+        self.static_pass = static_pass
+        # Chunks sent to the model and chunks the static pass kept from it
+        self.chunks_sent = 0
+        self.chunks_skipped = 0
+        self._connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self._host = url.hostname or 'localhost'
+        self._port = url.port
+        self._path = url.path.rstrip('/')
+        self._idle: 'queue.LifoQueue[http.client.HTTPConnection]' = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        """Send one request over a pooled connection and return the decoded JSON answer."""
+        try:
+            connection, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            connection, reused = self._connection_class(self._host, self._port, timeout=self.timeout), False
+        try:
+            payload = json.dumps(body).encode('utf-8') if body is not None else None
+            connection.request(method, self._path + path, payload, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            connection.close()
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection; that is no failure of this request
+            return self._request(method, path, body)
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        if response.status != 200:
+            raise _StatusError(response.status, f'HTTP {response.status} from {path}: {data[:200]!r}')
+        return json.loads(data)
+
+    def _call(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        for attempt in range(self.retries + 1):
+            try:
+                with self._slots:
+                    return self._request(method, path, body)
+            except ConnectionRefusedError as e:
+                raise LLMError(f'Ollama is not reachable at {self.base_url}: {e}') from e
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                final = isinstance(e, _StatusError) and e.status not in RETRY_STATUSES
+                if attempt == self.retries or final:
+                    raise LLMError(f'{method} {path} failed after {attempt + 1} attempt(s): {e}') from e
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def generate(self, prompt: str) -> str:
+        """Return the model's completion of ``prompt``."""
+        answer = self._call('POST', '/api/generate', {'model': self.model, 'prompt': prompt, 'stream': False})
+        return answer.get('response', '')
+
+    def health(self) -> dict:
+        """Check that the server answers and has the model, without retrying.
+
+        Returns ``{'reachable': bool, 'model_available': bool, 'models': [...]}``,
+        with an ``'error'`` when the server could not be reached.
+        """
+        try:
+            with self._slots:
+                answer = self._request('GET', '/api/tags')
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            return {'reachable': False, 'model_available': False, 'models': [], 'error': str(e)}
+        models = [model.get('name', '') for model in answer.get('models', [])]
+        available = any(name == self.model or name.split(':')[0] == self.model for name in models)
+        return {'reachable': True, 'model_available': available, 'models': models}
+
+    def warmup(self) -> None:
+        """Load the model into the server's memory, so the first file doesn't wait for it.
+
+        A generate call without a prompt only loads the model.
+        """
+        self._call('POST', '/api/generate', {'model': self.model, 'stream': False})
+
+    def remove_dead_code(self, code: str, language: str, analysis: Optional[Analysis] = None) -> str:
+        """Ask the model to remove dead code, chunk by chunk for large sources.
+
+        ``analysis`` is the static pass already run over ``code`` by a
+        caller that wants its result even if the model fails; it is used
+        instead of running the pass again.
+        """
+        uncertain = None
+        if analysis is not None:
+            code, _, uncertain = analysis
+        elif self.static_pass:
+            code, _, uncertain = analyze(code, language)
+
+        chunks = chunk_source(code, language, self.max_chunk_tokens) if self.max_chunk_tokens else [code]
+        send = [True] * len(chunks) if uncertain is None else _holding_lines(chunks, uncertain)
+        with self._lock:
+            self.chunks_sent += sum(send)
+            self.chunks_skipped += len(send) - sum(send)
+        if not any(send):
+            return code
+        if len(chunks) == 1:
+            return self._remove_dead_code(code, language)
+
+        def clean(index: int) -> str:
+            return self._remove_dead_code(chunks[index], language) if send[index] else chunks[index]
+
+        results = self._get_executor().map(clean, range(len(chunks)))
+        # Keep chunks on separate lines even if the model drops a final newline
+        return ''.join(result + '\n' if chunk.endswith('\n') and not result.endswith('\n') else result
+                       for chunk, result in zip(chunks, results))
+
+    def _remove_dead_code(self, code: str, language: str) -> str:
+        """Send one prompt, keeping the original if the answer looks truncated."""
+        if self.cache is not None:
+            cached = self.cache.get(code, language, self.model, PROMPT_VERSION)
+            if cached is not None:
+                return cached
+
+        result = self.generate(PROMPT.format(code=code, language=language))
+        # If the result is empty or significantly shorter than the original, return the original
+        if not result or len(result) < len(code) * 0.5:
+            result = code
+
+        if self.cache is not None:
+            self.cache.put(code, language, self.model, PROMPT_VERSION, result)
+        return result
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='code-cleaner-llm')
+            return self._executor
+
+    def close(self) -> None:
+        """Stop the chunk workers and close the idle connections."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,116 @@
+"""On-disk, content-addressed cache of LLM dead-code results."""
+
+import hashlib
+import os
+import threading
+import uuid
+from typing import Dict, Optional
+
+# Entries are evicted down to this fraction of the size limit, so eviction doesn't run on every write
+EVICT_TO = 0.9
+
+# Bytes charged per entry on top of its contents, so that empty entries count too
+ENTRY_OVERHEAD = 512
+
+
+def cache_key(code: str, language: str, model: str, prompt_version: int) -> str:
+    """Return the key of a result: a SHA-256 of everything the answer depends on."""
+    digest = hashlib.sha256(f'{prompt_version}\0{model}\0{language}\0'.encode('utf-8'))
+    digest.update(code.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Size-bounded LRU cache of results, one file per entry under ``directory``.
+
+    Entries live in ``<key[:2]>/<key>``; a file's mtime is its last use and
+    is bumped on every hit, so the least recently used entries are the
+    first evicted once the cache outgrows ``max_bytes``. An empty file
+    records that the model left the code unchanged. The cache may be
+    shared by several processes; each keeps its own counters and its own
+    estimate of the total size, refreshed by every eviction scan.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yield (path, mtime, charged size) of every entry."""
+        with os.scandir(self.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.endswith('.tmp'):
+                            stat = entry.stat()
+                            yield entry.path, stat.st_mtime_ns, stat.st_size + ENTRY_OVERHEAD
+
+    def get(self, code: str, language: str, model: str, prompt_version: int) -> Optional[str]:
+        """Return the cached result for ``code``, or None on a miss."""
+        path = self._path(cache_key(code, language, model, prompt_version))
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                result = file.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result or code
+
+    def put(self, code: str, language: str, model: str, prompt_version: int, result: str) -> None:
+        """Store the result for ``code``, evicting old entries if the cache is over its limit."""
+        path = self._path(cache_key(code, language, model, prompt_version))
+        data = b'' if result == code else result.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(partial, 'wb') as file:
+            file.write(data)
+        os.replace(partial, path)
+        with self._lock:
+            self.writes += 1
+            self._size += len(data) + ENTRY_OVERHEAD
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(entry[2] for entry in entries)
+        target = self.max_bytes * EVICT_TO
+        for path, _, entry_size in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
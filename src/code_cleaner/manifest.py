@@ -0,0 +1,148 @@
+"""Manifest of cleaned files, used to skip unchanged inputs on incremental runs."""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional
+
+from code_cleaner import __version__
+from code_cleaner.rules import rules
+
+MANIFEST_NAME = '.code-cleaner-manifest.json'
+
+# Bump when the layout of the manifest file changes
+MANIFEST_FORMAT = 1
+
+
+def hash_file(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Records, per relative path, the size, mtime, content hash and rules of each input.
+
+    The manifest lives in the output directory. Entries from a different
+    package version or manifest format are discarded on load, so every
+    file is cleaned again after an upgrade.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries: Dict[str, dict] = {}
+        self.seen = set()
+        self._pending: Dict[str, dict] = {}
+
+    @classmethod
+    def load(cls, output_dir: str) -> 'Manifest':
+        manifest = cls(output_dir)
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return manifest
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable manifest {manifest.path}: {e}", file=sys.stderr)
+            return manifest
+
+        if data.get('format') == MANIFEST_FORMAT and data.get('version') == __version__:
+            manifest.entries = data.get('files', {})
+        return manifest
+
+    def is_current(self, relative_path: str, file_path: str, language: str,
+                   stat: Optional[os.stat_result] = None) -> bool:
+        """Check whether the output of a file is up to date.
+
+        If it is not, the new entry is kept aside and only written to the
+        manifest once ``commit`` confirms the file was cleaned.
+        """
+        self.seen.add(relative_path)
+        if stat is None:
+            stat = os.stat(file_path)
+        fingerprint = rules.fingerprint(language)
+        entry = self.entries.get(relative_path)
+        output_exists = os.path.exists(os.path.join(self.output_dir, relative_path))
+
+        if entry and output_exists and entry['rules'] == fingerprint:
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                return True
+
+        new_entry = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': hash_file(file_path),
+            'rules': fingerprint,
+        }
+        if entry and output_exists and entry['rules'] == fingerprint and entry['hash'] == new_entry['hash']:
+            # Touched but not modified: remember the new mtime and move on
+            self.entries[relative_path] = new_entry
+            return True
+
+        self._pending[relative_path] = new_entry
+        return False
+
+    def commit(self, relative_path: str, success: bool) -> None:
+        """Record a file as cleaned, or forget it if it wasn't, so that the next run tries it again."""
+        entry = self._pending.pop(relative_path, None)
+        if success and entry is not None:
+            self.entries[relative_path] = entry
+        else:
+            self.entries.pop(relative_path, None)
+
+    def remove_stale(self, source_dir: str) -> List[str]:
+        """Delete outputs whose sources no longer exist and return their paths."""
+        removed = []
+        for relative_path in sorted(set(self.entries) - self.seen):
+            if os.path.exists(os.path.join(source_dir, relative_path)):
+                continue
+            del self.entries[relative_path]
+            if remove_output(self.output_dir, relative_path):
+                removed.append(relative_path)
+        return removed
+
+    def forget(self, relative_path: str) -> None:
+        """Drop the entry of a removed file, or the entries of every file under a removed directory."""
+        prefix = relative_path + os.sep
+        for path in [path for path in self.entries if path == relative_path or path.startswith(prefix)]:
+            del self.entries[path]
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        data = {'format': MANIFEST_FORMAT, 'version': __version__, 'files': self.entries}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def remove_output(output_dir: str, relative_path: str) -> bool:
+    """Delete the output of a removed source file or directory, and the directories it leaves empty."""
+    output_file = os.path.join(output_dir, relative_path)
+    try:
+        if os.path.isdir(output_file) and not os.path.islink(output_file):
+            shutil.rmtree(output_file)
+        else:
+            os.remove(output_file)
+    except FileNotFoundError:
+        return False
+    _prune_empty_dirs(os.path.dirname(output_file), output_dir)
+    return True
+
+
+def _prune_empty_dirs(directory: str, stop: str) -> None:
+    """Remove empty directories from ``directory`` up to, but excluding, ``stop``."""
+    stop = os.path.abspath(stop)
+    directory = os.path.abspath(directory)
+    while directory != stop and directory.startswith(stop):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
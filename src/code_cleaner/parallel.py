@@ -0,0 +1,81 @@
+"""Ordered, bounded fan-out of per-file work to a process pool."""
+
+import functools
+from collections import deque
+from typing import Any, Callable, List, Tuple
+
+# Files handed to a worker in one task, to amortize inter-process overhead
+BATCH_SIZE = 32
+
+
+def _run_batch(func: Callable, batch: List[tuple]) -> List[Any]:
+    """Run ``func`` over a batch of argument tuples inside a worker."""
+    return [func(*args) for args in batch]
+
+
+class OrderedPool:
+    """Runs ``func`` over submitted arguments and returns results in submission order.
+
+    Work is sent to the pool in batches of ``batch_size`` and at most
+    ``2 * jobs`` batches are in flight, so the caller can keep discovering
+    files while workers clean them without the queue growing unbounded.
+    With ``jobs <= 1`` everything runs inline in the calling process.
+    """
+
+    def __init__(self, func: Callable, jobs: int, batch_size: int = BATCH_SIZE):
+        self.func = func
+        self.jobs = max(1, jobs)
+        self.batch_size = batch_size
+        self._keys: List[Any] = []
+        self._batch: List[tuple] = []
+        self._pending: deque = deque()
+        self._executor = None
+        if self.jobs > 1:
+            # Imported here: it pulls in multiprocessing, which serial runs and --help don't need
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, key: Any, *args) -> List[Tuple[Any, Any]]:
+        """Queue one call and return the (key, result) pairs that completed meanwhile."""
+        if self._executor is None:
+            return [(key, self.func(*args))]
+
+        self._keys.append(key)
+        self._batch.append(args)
+        if len(self._batch) < self.batch_size:
+            return []
+
+        self._flush()
+        done = []
+        while len(self._pending) > 2 * self.jobs:
+            done.extend(self._collect())
+        return done
+
+    def finish(self) -> List[Tuple[Any, Any]]:
+        """Wait for all queued calls and return their (key, result) pairs."""
+        self._flush()
+        done = []
+        while self._pending:
+            done.extend(self._collect())
+        return done
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _flush(self) -> None:
+        if self._batch:
+            future = self._executor.submit(functools.partial(_run_batch, self.func), self._batch)
+            self._pending.append((self._keys, future))
+            self._keys, self._batch = [], []
+
+    def _collect(self) -> List[Tuple[Any, Any]]:
+        keys, future = self._pending.popleft()
+        return list(zip(keys, future.result()))
@@ -0,0 +1,147 @@
+"""Per-stage timing instrumentation for the CLI and the web pipeline."""
+
+import heapq
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_NULL_STAGE = nullcontext()
+
+
+class StageRecorder:
+    """Records the stages of one file's processing, inside whichever process runs it."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float, float, int]] = []
+        self.rules: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, started, time.perf_counter() - clock, nbytes))
+
+    def to_dict(self) -> dict:
+        return {'pid': os.getpid(), 'stages': self.stages, 'rules': self.rules}
+
+
+class NullRecorder:
+    """Stand-in used when profiling is off; every stage is a shared no-op context."""
+
+    def stage(self, name: str, nbytes: int = 0):
+        return _NULL_STAGE
+
+
+NULL_RECORDER = NullRecorder()
+
+
+class Profiler:
+    """Aggregates stage and rule timings and keeps the slowest files.
+
+    Stage timings of worker processes arrive through the ``profile`` entry
+    of the statistics returned by ``clean_file``. Every stage is also kept
+    as a complete ("X") event so the run can be written as a Chrome trace,
+    which chrome://tracing, Perfetto and speedscope can open.
+    """
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.stages: Dict[str, List[float]] = {}
+        self.rules: Dict[str, List[float]] = {}
+        self.events: List[dict] = []
+        self._slowest: List[Tuple[float, str]] = []
+        self._origin = time.time()
+
+    def add_stage(self, name: str, seconds: float, nbytes: int = 0, started: Optional[float] = None,
+                  pid: Optional[int] = None, path: Optional[str] = None) -> None:
+        totals = self.stages.setdefault(name, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += nbytes
+        if started is not None:
+            event = {
+                'name': name, 'ph': 'X', 'pid': pid or os.getpid(), 'tid': pid or os.getpid(),
+                'ts': (started - self._origin) * 1e6, 'dur': seconds * 1e6,
+            }
+            if path is not None:
+                event['args'] = {'path': path, 'bytes': nbytes}
+            self.events.append(event)
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - clock, nbytes, started)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from ``iterable``, charging the time spent producing items to a stage."""
+        iterator = iter(iterable)
+        while True:
+            started = time.time()
+            clock = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_stage(name, time.perf_counter() - clock, 0, started)
+            yield item
+
+    def add_file(self, path: str, stats: dict) -> None:
+        """Merge the profile of one processed file."""
+        profile = stats.get('profile')
+        if not profile:
+            return
+        for name, started, seconds, nbytes in profile['stages']:
+            self.add_stage(name, seconds, nbytes, started, profile['pid'], path)
+        for rule, (seconds, matches) in profile['rules'].items():
+            totals = self.rules.setdefault(rule, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += matches
+
+        item = (stats.get('seconds', 0.0), path)
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+
+    def slowest(self) -> List[Tuple[float, str]]:
+        return sorted(self._slowest, reverse=True)
+
+    def summary(self) -> dict:
+        return {
+            'stages': {name: {'seconds': s, 'calls': c, 'bytes': b} for name, (s, c, b) in self.stages.items()},
+            'rules': {rule: {'seconds': s, 'matches': m} for rule, (s, m) in self.rules.items()},
+            'slowest': [{'path': path, 'seconds': seconds} for seconds, path in self.slowest()],
+        }
+
+    def print_summary(self) -> None:
+        print("Profile")
+        print("-------")
+        print(f"{'stage':24} {'seconds':>10} {'calls':>8} {'MB':>10}")
+        for name, (seconds, calls, nbytes) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            print(f"{name:24} {seconds:10.4f} {calls:8d} {nbytes / (1024 * 1024):10.2f}")
+        if self.rules:
+            print()
+            print(f"{'rule (isolated)':48} {'seconds':>10} {'matches':>8}")
+            for rule, (seconds, matches) in sorted(self.rules.items(), key=lambda item: -item[1][0])[:self.top]:
+                print(f"{rule[:48]:48} {seconds:10.4f} {matches:8d}")
+        if self._slowest:
+            print()
+            print(f"Slowest {len(self._slowest)} files:")
+            for seconds, path in self.slowest():
+                print(f"  {seconds:10.4f}s  {path}")
+
+    def write_trace(self, path: str) -> None:
+        """Write the events in Chrome trace format, with the summary as metadata."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms',
+                       'otherData': self.summary()}, file)
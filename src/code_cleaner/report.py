@@ -0,0 +1,54 @@
+"""Machine-readable report of what a cleaning run changed."""
+
+import json
+from typing import Dict, List
+
+# Per-file counters summed into the per-language and overall totals
+COUNTERS = ('bytes_in', 'bytes_out', 'comment_bytes', 'log_statements', 'seconds')
+
+
+def _empty_totals() -> Dict[str, float]:
+    totals = {'files': 0}
+    totals.update((counter, 0) for counter in COUNTERS)
+    return totals
+
+
+class Report:
+    """Collects the statistics returned by ``clean_file`` for each file."""
+
+    def __init__(self):
+        self.files: List[dict] = []
+        self.languages: Dict[str, dict] = {}
+        self.totals = _empty_totals()
+        self.failed: List[str] = []
+
+    def add(self, relative_path: str, stats: dict) -> None:
+        """Record the statistics of one cleaned file."""
+        entry = {key: value for key, value in stats.items() if key != 'profile'}
+        entry['path'] = relative_path
+        self.files.append(entry)
+        language = self.languages.setdefault(stats['language'], _empty_totals())
+        for totals in (language, self.totals):
+            totals['files'] += 1
+            for counter in COUNTERS:
+                totals[counter] += stats.get(counter, 0)
+
+    def add_failure(self, relative_path: str) -> None:
+        self.failed.append(relative_path)
+
+    def to_dict(self, dry_run: bool = False) -> dict:
+        summary = dict(self.totals, dry_run=dry_run, failed=len(self.failed),
+                       over_budget=sum(1 for entry in self.files if entry.get('budget')),
+                       bytes_removed=self.totals['bytes_in'] - self.totals['bytes_out'])
+        return {
+            'summary': summary,
+            'languages': {name: self.languages[name] for name in sorted(self.languages)},
+            'files': self.files,
+            'failed': self.failed,
+        }
+
+    def write(self, path: str, dry_run: bool = False) -> None:
+        """Write the report as JSON."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(dry_run), file, indent=2)
+            file.write('\n')
@@ -0,0 +1,389 @@
+"""Language rule tables and the registry that compiles them on demand."""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
+from code_cleaner.budget import BudgetExceeded, check_deadline
+from code_cleaner.lexer import DEADLINE_EVERY, ENGINE_VERSION, Scanner, StringRule, compile_scanner
+
+# Entry point group third-party packages use to add languages
+ENTRY_POINT_GROUP = 'code_cleaner.languages'
+
+EXTENSION_MAP = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.java': 'java',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.cs': 'csharp',
+    '.go': 'go',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.swift': 'swift',
+    '.ts': 'typescript',
+    '.html': 'html',
+    '.css': 'css',
+    '.sh': 'shell',
+    '.pl': 'perl',
+    '.kt': 'kotlin',
+    '.rs': 'rust',
+}
+
+# Comment syntax for different languages: line comment markers and
+# (open, close) block comment delimiters
+C_STYLE_COMMENTS = {
+    'line': ['//'],
+    'block': [('/*', '*/')],
+}
+
+COMMENT_PATTERNS = {
+    'python': {
+        'line': ['#'],
+        'block': [('"""', '"""'), ("'''", "'''")],  # Docstrings
+    },
+    'javascript': C_STYLE_COMMENTS,
+    'java': C_STYLE_COMMENTS,
+    'c': C_STYLE_COMMENTS,
+    'cpp': C_STYLE_COMMENTS,
+    'csharp': C_STYLE_COMMENTS,
+    'go': C_STYLE_COMMENTS,
+    'ruby': {
+        'line': ['#'],
+        'block': [('=begin', '=end')],
+    },
+    'php': {
+        'line': ['//', '#'],
+        'block': [('/*', '*/')],
+    },
+    'swift': C_STYLE_COMMENTS,
+    'typescript': C_STYLE_COMMENTS,
+    'html': {
+        'block': [('<!--', '-->')],
+    },
+    'css': {
+        'block': [('/*', '*/')],
+    },
+    'shell': {
+        'line': ['#'],
+    },
+    'perl': {
+        'line': ['#'],
+        'block': [('=pod', '=cut')],  # POD documentation
+    },
+    'kotlin': C_STYLE_COMMENTS,
+    'rust': C_STYLE_COMMENTS,
+    'unknown': {
+        'line': ['//', '#'],
+        'block': [('/*', '*/'), ('"""', '"""'), ("'''", "'''")],
+    },
+}
+
+# String, char and template literals; comment markers inside them are kept
+QUOTED_STRINGS = [StringRule('"'), StringRule("'")]
+
+# A Rust char literal; a quote not closed this way starts a lifetime or label
+RUST_CHAR = StringRule("'", body=r"(?:[^'\\\n]|\\(?:u\{[0-9a-fA-F_]{1,8}\}|x[0-9a-fA-F]{2}|.))'")
+
+STRING_PATTERNS = {
+    'python': QUOTED_STRINGS,
+    'javascript': QUOTED_STRINGS + [StringRule('`', multiline=True)],
+    'java': QUOTED_STRINGS,
+    'c': QUOTED_STRINGS,
+    'cpp': QUOTED_STRINGS,
+    'csharp': QUOTED_STRINGS,
+    'go': QUOTED_STRINGS + [StringRule('`', multiline=True, escapes=False)],
+    'ruby': QUOTED_STRINGS,
+    'php': QUOTED_STRINGS,
+    'swift': QUOTED_STRINGS,
+    'typescript': QUOTED_STRINGS + [StringRule('`', multiline=True)],
+    'html': [],
+    'css': QUOTED_STRINGS,
+    'shell': [StringRule('"'), StringRule("'", escapes=False)],
+    'perl': QUOTED_STRINGS,
+    'kotlin': QUOTED_STRINGS,
+    'rust': [StringRule('"', multiline=True), RUST_CHAR],
+    'unknown': QUOTED_STRINGS,
+}
+
+# Console/log statement patterns for different languages
+LOG_PATTERNS = {
+    'python': [
+        r'print\s*\(.*?\)',
+        r'logging\.\w+\s*\(.*?\)',
+    ],
+    'javascript': [
+        r'console\.\w+\s*\(.*?\)',
+        r'alert\s*\(.*?\)',
+    ],
+    'java': [
+        r'System\.out\.\w+\s*\(.*?\)',
+        r'System\.err\.\w+\s*\(.*?\)',
+        r'logger\.\w+\s*\(.*?\)',
+    ],
+    'c': [
+        r'printf\s*\(.*?\)',
+        r'fprintf\s*\(.*?\)',
+    ],
+    'cpp': [
+        r'std::cout.*?<<',
+        r'std::cerr.*?<<',
+    ],
+    'csharp': [
+        r'Console\.\w+\s*\(.*?\)',
+        r'Debug\.\w+\s*\(.*?\)',
+    ],
+    'go': [
+        r'fmt\.\w+\s*\(.*?\)',
+        r'log\.\w+\s*\(.*?\)',
+    ],
+    'ruby': [
+        r'puts\s+.*?$',
+        r'print\s+.*?$',
+        r'p\s+.*?$',
+    ],
+    'php': [
+        r'echo\s+.*?;',
+        r'print\s+.*?;',
+        r'var_dump\s*\(.*?\)',
+    ],
+    'swift': [
+        r'print\s*\(.*?\)',
+        r'NSLog\s*\(.*?\)',
+    ],
+    'typescript': [
+        r'console\.\w+\s*\(.*?\)',
+    ],
+    'shell': [
+        r'echo\s+.*?$',
+    ],
+    'perl': [
+        r'print\s+.*?;',
+    ],
+    'kotlin': [
+        r'println\s*\(.*?\)',
+    ],
+    'rust': [
+        r'println!\s*\(.*?\)',
+        r'print!\s*\(.*?\)',
+    ],
+    'unknown': [
+        r'console\.\w+\s*\(.*?\)',
+        r'print\s*\(.*?\)',
+        r'System\.out\.\w+\s*\(.*?\)',
+        r'echo\s+.*?$',
+    ],
+}
+
+
+def _as_string_rule(rule) -> StringRule:
+    """Accept a StringRule, a bare quote or a (quote, multiline, escapes) tuple."""
+    if isinstance(rule, StringRule):
+        return rule
+    if isinstance(rule, str):
+        return StringRule(rule)
+    return StringRule(*rule)
+
+
+class LanguageRules:
+    """The compiled comment and log rules of a single language."""
+
+    def __init__(self, name: str, comments: Mapping[str, list], logs: List[str],
+                 strings: List[StringRule]):
+        self.name = name
+        self.comments = comments
+        self.scanner: Scanner = compile_scanner(comments, logs, strings)
+        self.log_matchers = [re.compile(pattern, re.MULTILINE) for pattern in logs]
+        self._isolated = None
+
+    def clean(self, text: str, stats: Optional[Dict[str, int]] = None, deadline: Optional[float] = None) -> str:
+        """Remove comments and log statements from ``text``."""
+        return self.scanner.clean(text, stats, deadline)
+
+    def clean_stream(self, chunks: Iterable[str], stats: Optional[Dict[str, int]] = None,
+                     deadline: Optional[float] = None) -> Iterator[str]:
+        """Remove comments and log statements from text read in chunks."""
+        return self.scanner.clean_stream(chunks, stats=stats, deadline=deadline)
+
+    def profile_rules(self, text: str, deadline: Optional[float] = None) -> Dict[str, List[float]]:
+        """Time every rule on its own over ``text``, returning [seconds, matches] per rule.
+
+        The scanner runs all rules in one pass, so this extra pass is what
+        tells which individual rule is expensive on a given input. Each rule
+        is matched the linear way the scanner matches it, and once the
+        ``time.perf_counter()`` value ``deadline`` has passed, the rules not
+        yet timed are left out rather than letting profiling stall the file.
+        """
+        if self._isolated is None:
+            isolated = []
+            if self.scanner.pattern is not None:
+                isolated.append(('scanner', partial(_count_regex, self.scanner.pattern)))
+            for marker in self.comments.get('line', []):
+                regex = re.compile(re.escape(marker) + '[^\n]*')
+                isolated.append((marker + ' comment', partial(_count_regex, regex)))
+            for opener, closer in self.comments.get('block', []):
+                isolated.append((opener + closer + ' comment', partial(_count_blocks, opener, closer)))
+            for matcher in self.log_matchers:
+                scanner = Scanner([], [], [], [matcher.pattern])
+                counter = partial(_count_logs, scanner) if scanner.pattern is not None else None
+                isolated.append((matcher.pattern, counter))
+            self._isolated = [(f'{self.name}: {label}', counter) for label, counter in isolated if counter is not None]
+
+        timings = {}
+        for label, counter in self._isolated:
+            clock = time.perf_counter()
+            if deadline is not None and clock > deadline:
+                break
+            try:
+                matches = counter(text, deadline)
+            except BudgetExceeded:
+                break
+            timings[label] = [time.perf_counter() - clock, matches]
+        return timings
+
+
+def _count_regex(regex, text: str, deadline: Optional[float]) -> int:
+    matches = 0
+    for _ in regex.finditer(text):
+        matches += 1
+        if not matches % DEADLINE_EVERY:
+            check_deadline(deadline)
+    return matches
+
+
+def _count_blocks(opener: str, closer: str, text: str, deadline: Optional[float]) -> int:
+    # What opener[\s\S]*?closer matches, without rescanning to the end for every unclosed opener
+    matches = 0
+    start = text.find(opener)
+    while start != -1:
+        close = text.find(closer, start + len(opener))
+        if close == -1:
+            break
+        matches += 1
+        if not matches % DEADLINE_EVERY:
+            check_deadline(deadline)
+        start = text.find(opener, close + len(closer))
+    return matches
+
+
+def _count_logs(scanner: Scanner, text: str, deadline: Optional[float]) -> int:
+    stats = {'log_statements': 0}
+    scanner.clean(text, stats, deadline)
+    return stats['log_statements']
+
+
+class RuleRegistry:
+    """Maps languages to their rules, compiling each language on first use.
+
+    Built-in languages come from the tables above. Extra languages are
+    discovered through the ``code_cleaner.languages`` entry point group the
+    first time a lookup misses; each entry point must load to a mapping with
+    ``extensions``, ``comments``, ``logs`` and optionally ``strings`` keys.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, tuple] = {}
+        self._extensions: Dict[str, str] = {}
+        self._compiled: Dict[str, LanguageRules] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._plugins_loaded = False
+        self._lock = threading.Lock()
+
+        for language, comments in COMMENT_PATTERNS.items():
+            self.register(language, comments, LOG_PATTERNS.get(language, []),
+                          STRING_PATTERNS.get(language, []))
+        for extension, language in EXTENSION_MAP.items():
+            self._extensions[extension] = language
+
+    def register(self, language: str, comments: Mapping[str, list], logs: List[str] = (),
+                 strings: List = (), extensions: List[str] = ()) -> None:
+        """Add or replace a language. Its rules are compiled lazily by ``get``."""
+        strings = [_as_string_rule(rule) for rule in strings]
+        with self._lock:
+            self._sources[language] = (comments, list(logs), strings)
+            self._compiled.pop(language, None)
+            self._fingerprints.pop(language, None)
+            for extension in extensions:
+                self._extensions[extension.lower()] = language
+
+    def detect_language(self, file_path: str) -> str:
+        """Return the language registered for a file's extension, or 'unknown'."""
+        extension = os.path.splitext(file_path)[1].lower()
+        language = self._extensions.get(extension)
+        if language is None and not self._plugins_loaded:
+            self.load_plugins()
+            language = self._extensions.get(extension)
+        return language or 'unknown'
+
+    def get(self, language: str) -> LanguageRules:
+        """Return the compiled rules for a language, falling back to 'unknown'."""
+        rules = self._compiled.get(language)
+        if rules is not None:
+            return rules
+
+        if language not in self._sources and not self._plugins_loaded:
+            self.load_plugins()
+        if language not in self._sources:
+            return self.get('unknown')
+
+        with self._lock:
+            rules = self._compiled.get(language)
+            if rules is None:
+                rules = LanguageRules(language, *self._sources[language])
+                self._compiled[language] = rules
+        return rules
+
+    def fingerprint(self, language: str) -> str:
+        """Return a short hash of the engine version and the rules used for a language."""
+        fingerprint = self._fingerprints.get(language)
+        if fingerprint is None:
+            if language not in self._sources and not self._plugins_loaded:
+                self.load_plugins()
+            source = self._sources.get(language, self._sources['unknown'])
+            fingerprint = hashlib.sha1(repr((ENGINE_VERSION, source)).encode()).hexdigest()[:16]
+            self._fingerprints[language] = fingerprint
+        return fingerprint
+
+    def languages(self) -> List[str]:
+        """Return the names of all registered languages."""
+        self.load_plugins()
+        return sorted(self._sources)
+
+    def load_plugins(self) -> None:
+        """Register languages advertised through package entry points."""
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # Python < 3.8
+            return
+
+        found = entry_points()
+        if hasattr(found, 'select'):
+            found = found.select(group=ENTRY_POINT_GROUP)
+        else:
+            found = found.get(ENTRY_POINT_GROUP, [])
+
+        for entry_point in found:
+            try:
+                spec = entry_point.load()
+                self.register(entry_point.name, spec['comments'], spec.get('logs', []),
+                              spec.get('strings', []), spec.get('extensions', []))
+            except Exception as e:
+                print(f"Warning: Could not load language plugin {entry_point.name}: {e}", file=sys.stderr)
+
+
+# Shared registry used by the CLI and the web app
+rules = RuleRegistry()
+
+
+def detect_language(file_path: str) -> str:
+    """Detect the programming language based on file extension."""
+    return rules.detect_language(file_path)
@@ -0,0 +1,97 @@
+"""Checks that keep a hostile ZIP archive from exhausting a worker's disk or memory."""
+
+import os
+import zipfile
+from typing import NamedTuple
+
+# Fixed part of a member's local header, from the ZIP format (APPNOTE 4.3.7)
+LOCAL_HEADER_SIZE = 30
+
+
+class ArchiveLimits(NamedTuple):
+    """Bounds an uploaded archive must stay within; see ``from_env`` for per-deployment settings."""
+    max_entries: int = 100_000
+    max_total_size: int = 4 * 1024 * 1024 * 1024
+    max_entry_size: int = 1024 * 1024 * 1024
+    # Uncompressed over compressed size, only checked for members of at least
+    # ratio_min_size bytes, as small text files legitimately compress well
+    max_ratio: float = 200.0
+    ratio_min_size: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> 'ArchiveLimits':
+        """Read the limits from CODE_CLEANER_MAX_ENTRIES, _MAX_UNCOMPRESSED_MB, _MAX_ENTRY_MB and _MAX_RATIO."""
+        defaults = cls()
+        return cls(
+            max_entries=int(os.environ.get('CODE_CLEANER_MAX_ENTRIES', defaults.max_entries)),
+            max_total_size=int(os.environ.get('CODE_CLEANER_MAX_UNCOMPRESSED_MB',
+                                              defaults.max_total_size // (1024 * 1024))) * 1024 * 1024,
+            max_entry_size=int(os.environ.get('CODE_CLEANER_MAX_ENTRY_MB',
+                                              defaults.max_entry_size // (1024 * 1024))) * 1024 * 1024,
+            max_ratio=float(os.environ.get('CODE_CLEANER_MAX_RATIO', defaults.max_ratio)),
+        )
+
+
+class UnsafeArchive(zipfile.BadZipFile):
+    """Raised when an archive breaks its limits or holds a path that escapes its root."""
+
+
+def is_unsafe_path(name: str) -> bool:
+    """Check whether a member name is absolute, has a drive or walks up with '..'."""
+    parts = name.replace('\\', '/').split('/')
+    return (name.startswith(('/', '\\')) or '\0' in name or (len(name) > 1 and name[1] == ':')
+            or '..' in parts)
+
+
+def check_archive(archive: zipfile.ZipFile, limits: ArchiveLimits) -> None:
+    """Raise UnsafeArchive if the members of ``archive`` break ``limits``.
+
+    Only the central directory is read. Its declared sizes can be trusted
+    as far as memory goes: zipfile stops decompressing a member at its
+    declared size and fails on a CRC mismatch. Members whose data overlap
+    are refused too, since that is how a small archive declares far more
+    data than it holds.
+    """
+    members = archive.infolist()
+    if len(members) > limits.max_entries:
+        raise UnsafeArchive(f'Archive has {len(members)} entries, the limit is {limits.max_entries}')
+
+    total = 0
+    for info in members:
+        if is_unsafe_path(info.filename):
+            raise UnsafeArchive(f'Unsafe path in archive: {info.filename!r}')
+        if info.file_size > limits.max_entry_size:
+            raise UnsafeArchive(f'{info.filename} is {info.file_size} bytes uncompressed, '
+                                f'the limit is {limits.max_entry_size}')
+        ratio = info.file_size / max(info.compress_size, 1)
+        if info.file_size >= limits.ratio_min_size and ratio > limits.max_ratio:
+            raise UnsafeArchive(f'{info.filename} compresses {ratio:.0f} to 1, the limit is {limits.max_ratio:.0f}')
+        total += info.file_size
+    if total > limits.max_total_size:
+        raise UnsafeArchive(f'Archive is {total} bytes uncompressed, the limit is {limits.max_total_size}')
+
+    end = 0
+    for info in sorted(members, key=lambda info: info.header_offset):
+        if info.header_offset < end:
+            raise UnsafeArchive(f'{info.filename} overlaps another entry')
+        # A lower bound of where the entry ends: its local name and extra field are left out
+        end = info.header_offset + LOCAL_HEADER_SIZE + info.compress_size
+
+
+def open_archive(path, limits: ArchiveLimits) -> zipfile.ZipFile:
+    """Open a ZIP archive for reading after checking it against ``limits``.
+
+    Besides ``check_archive``, the data and local headers the members
+    declare must fit in the file itself.
+    """
+    archive = zipfile.ZipFile(path)
+    try:
+        check_archive(archive, limits)
+        declared = sum(info.compress_size + LOCAL_HEADER_SIZE for info in archive.infolist())
+        size = os.path.getsize(path)
+        if declared > size:
+            raise UnsafeArchive(f'Archive declares {declared} bytes of entries but holds {size}')
+    except BaseException:
+        archive.close()
+        raise
+    return archive
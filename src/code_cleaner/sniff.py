@@ -0,0 +1,83 @@
+"""In-process text/binary classification of files."""
+
+import os
+from typing import Dict, Optional, Tuple
+
+# How much of a file is inspected to classify it
+HEADER_SIZE = 8192
+
+# Verdicts are cached per file version; the cache is cleared when it gets this big
+MAX_CACHE_ENTRIES = 100000
+
+TEXT_BOMS = (
+    b'\xef\xbb\xbf',         # UTF-8
+    b'\xff\xfe\x00\x00',     # UTF-32 LE
+    b'\x00\x00\xfe\xff',     # UTF-32 BE
+    b'\xff\xfe',             # UTF-16 LE
+    b'\xfe\xff',             # UTF-16 BE
+)
+
+BINARY_MAGIC = (
+    b'\x89PNG',              # PNG
+    b'GIF8',                 # GIF
+    b'\xff\xd8\xff',         # JPEG
+    b'%PDF',                 # PDF
+    b'PK\x03\x04',           # ZIP, JAR, DOCX, ...
+    b'\x1f\x8b',             # gzip
+    b'BZh',                  # bzip2
+    b'\xfd7zXZ\x00',         # xz
+    b'7z\xbc\xaf\x27\x1c',   # 7-Zip
+    b'\x7fELF',              # ELF executables and libraries
+    b'\xca\xfe\xba\xbe',     # Java class, Mach-O fat binary
+    b'\xcf\xfa\xed\xfe',     # Mach-O 64-bit
+    b'\xce\xfa\xed\xfe',     # Mach-O 32-bit
+    b'MZ',                   # Windows PE
+    b'\x00asm',              # WebAssembly
+    b'SQLite format 3\x00',  # SQLite
+    b'wOFF',                 # WOFF font
+    b'wOF2',                 # WOFF2 font
+    b'RIFF',                 # WAV, AVI, WEBP
+    b'OggS',                 # Ogg
+    b'ID3',                  # MP3
+)
+
+# Bytes that never appear in text files (everything below 0x20 except \b\t\n\f\r and ESC)
+_CONTROL_BYTES = bytes(set(range(32)) - {8, 9, 10, 12, 13, 27})
+
+_cache: Dict[Tuple[int, int, int, int], bool] = {}
+
+
+def classify_header(header: bytes) -> bool:
+    """Return True if the first bytes of a file look like text."""
+    if not header:
+        return True
+    if header.startswith(TEXT_BOMS):
+        return True
+    if header.startswith(BINARY_MAGIC):
+        return False
+    if b'\x00' in header:
+        return False
+    # Mostly control characters means some binary format we don't know by magic
+    binary = len(header) - len(header.translate(None, _CONTROL_BYTES))
+    return binary * 10 < len(header)
+
+
+def is_text_file(file_path: str, stat: Optional[os.stat_result] = None) -> bool:
+    """Check if a file is text, caching the verdict per (device, inode, mtime, size)."""
+    try:
+        if stat is None:
+            stat = os.stat(file_path)
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        verdict = _cache.get(key)
+        if verdict is not None:
+            return verdict
+
+        with open(file_path, 'rb') as file:
+            verdict = classify_header(file.read(HEADER_SIZE))
+    except OSError:
+        return False
+
+    if len(_cache) >= MAX_CACHE_ENTRIES:
+        _cache.clear()
+    _cache[key] = verdict
+    return verdict
@@ -0,0 +1,199 @@
+"""Content-addressed store of cleaned files, shared by jobs and runs on one machine."""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from code_cleaner import __version__
+from code_cleaner.rules import rules
+
+# Entries are evicted down to this fraction of the size limit, so eviction doesn't run on every write
+EVICT_TO = 0.9
+
+# Statistics that describe one run rather than the content, and aren't stored
+_RUN_STATS = ('seconds', 'profile', 'cached', 'link')
+
+
+def default_directory() -> str:
+    """Return the per-user store location: $CODE_CLEANER_STORE, or code-cleaner/results in the cache dir."""
+    if os.environ.get('CODE_CLEANER_STORE'):
+        return os.environ['CODE_CLEANER_STORE']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'code-cleaner', 'results')
+
+
+class ResultStore:
+    """Cleaned outputs keyed by a hash of the input bytes, the language and the rules.
+
+    Entries live in ``<key[:2]>/<key>`` with their statistics next to them
+    in ``<key>.json``, written last, so an entry only counts once both are
+    there. A file's mtime is its last use. ``evict`` removes entries
+    unused for ``max_age`` seconds, then the least recently used ones
+    until the store is back under ``max_bytes``; callers run it after a
+    job or a run rather than on every write.
+
+    With ``link``, outputs are hard-linked to and from the store instead
+    of copied. Only use it where outputs are never rewritten in place, as
+    a rewrite would change the stored entry too.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024, max_age: float = 30 * 86400,
+                 link: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Sent to worker processes, which keep their own counters
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _digest(self, language: str) -> 'hashlib._Hash':
+        return hashlib.sha256(f'{__version__}\0{rules.fingerprint(language)}\0{language}\0'.encode('utf-8'))
+
+    def key(self, data: bytes, language: str) -> str:
+        """Return the key of an input given as bytes."""
+        digest = self._digest(language)
+        digest.update(data)
+        return digest.hexdigest()
+
+    def key_file(self, file_path: str, language: str) -> str:
+        """Return the key of an input file, reading it in blocks."""
+        digest = self._digest(language)
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _stats(self, path: str) -> Optional[Dict]:
+        try:
+            with open(f'{path}.json', 'r', encoding='utf-8') as file:
+                stats = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        stats['cached'] = True
+        return stats
+
+    def fetch(self, key: str, output_file: str) -> Optional[Dict]:
+        """Put the stored output for ``key`` at ``output_file`` and return its statistics, or None on a miss."""
+        path = self._path(key)
+        stats = self._stats(path)
+        if stats is not None:
+            partial = f'{output_file}.{uuid.uuid4().hex}.tmp'
+            try:
+                if self.link:
+                    os.link(path, partial)
+                else:
+                    shutil.copyfile(path, partial)
+                os.replace(partial, output_file)
+            except OSError:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                stats = None
+        self._count(stats is not None)
+        return stats
+
+    def load(self, key: str) -> Optional[Tuple[bytes, Dict]]:
+        """Return the stored output for ``key`` and its statistics, or None on a miss."""
+        path = self._path(key)
+        stats = self._stats(path)
+        data = None
+        if stats is not None:
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+            except OSError:
+                pass
+        self._count(data is not None)
+        return (data, stats) if data is not None else None
+
+    def add(self, key: str, output_file: str, stats: Dict) -> None:
+        """Store a cleaned output file under ``key``."""
+        self._put(key, stats, lambda partial: (os.link if self.link else shutil.copyfile)(output_file, partial))
+
+    def save(self, key: str, data: bytes, stats: Dict) -> None:
+        """Store a cleaned output given as bytes under ``key``."""
+        def write(partial):
+            with open(partial, 'wb') as file:
+                file.write(data)
+
+        self._put(key, stats, write)
+
+    def _put(self, key: str, stats: Dict, write) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stats = {name: value for name, value in stats.items() if name not in _RUN_STATS}
+        suffix = uuid.uuid4().hex
+        try:
+            write(f'{path}.{suffix}.tmp')
+            os.replace(f'{path}.{suffix}.tmp', path)
+            with open(f'{path}.{suffix}.tmp', 'w', encoding='utf-8') as file:
+                json.dump(stats, file)
+            os.replace(f'{path}.{suffix}.tmp', f'{path}.json')
+        except OSError:
+            # The store is an optimization; a full disk or a race with eviction only costs a miss later
+            if os.path.exists(f'{path}.{suffix}.tmp'):
+                os.remove(f'{path}.{suffix}.tmp')
+
+    def evict(self) -> int:
+        """Remove expired entries, then the least recently used ones over the size limit; return how many."""
+        entries = []
+        with os.scandir(self.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.is_file() and not entry.name.endswith(('.json', '.tmp')):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        expired = time.time() - self.max_age
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * EVICT_TO if size > self.max_bytes else size
+        removed = 0
+        for mtime, entry_size, path in entries:
+            if mtime >= expired and size <= target:
+                break
+            for name in (f'{path}.json', path):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+            size -= entry_size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,140 @@
+"""Chunked, resumable uploads, written straight to disk as they arrive."""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Tuple
+
+# Bytes copied from the request to disk at a time
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Base class of the errors of a chunked upload."""
+
+
+class UploadNotFound(UploadError):
+    """Raised for an unknown or expired upload ID."""
+
+
+class UploadTooLarge(UploadError):
+    """Raised when an upload is declared, or sent, larger than allowed."""
+
+
+class UploadConflict(UploadError):
+    """Raised when a chunk doesn't start where the upload left off, or an upload is finished early."""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+class ChunkedUploads:
+    """Uploads sent in chunks at increasing offsets, which survive dropped connections.
+
+    Each upload is ``<id>.part`` under ``directory`` with its name and
+    declared size in ``<id>.json``. The size of the part file is what the
+    server holds, so a client whose chunk failed half way asks for it and
+    carries on from there, even across server restarts. Uploads untouched
+    for ``expiry`` seconds are removed when the next one starts.
+    """
+
+    def __init__(self, directory: str, max_size: int, expiry: float = 24 * 3600):
+        self.directory = directory
+        self.max_size = max_size
+        self.expiry = expiry
+        self._lock = threading.Lock()
+        self._writing = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except ValueError:
+            raise UploadNotFound(f'Unknown upload {upload_id!r}') from None
+        base = os.path.join(self.directory, upload_id)
+        return f'{base}.part', f'{base}.json'
+
+    def start(self, filename: str, size: int) -> str:
+        """Register an upload of ``size`` bytes and return its ID."""
+        if size < 0 or size > self.max_size:
+            raise UploadTooLarge(f'Uploads are limited to {self.max_size} bytes')
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as file:
+            json.dump({'filename': filename, 'size': size}, file)
+        return upload_id
+
+    def status(self, upload_id: str) -> Dict:
+        """Return the filename, declared size and bytes received of an upload."""
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            meta['received'] = os.path.getsize(part_path)
+        except (OSError, ValueError):
+            raise UploadNotFound(f'Unknown upload {upload_id!r}') from None
+        return meta
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO, length: int) -> int:
+        """Write ``length`` bytes of ``stream`` at ``offset`` and return the bytes received so far.
+
+        What arrived before the stream broke off is kept, so the client can
+        resume from the returned, or later queried, offset.
+        """
+        meta = self.status(upload_id)
+        if offset + length > meta['size']:
+            raise UploadTooLarge(f'Chunk ends past the declared size of {meta["size"]} bytes')
+        part_path, _ = self._paths(upload_id)
+        with self._lock:
+            if part_path in self._writing:
+                raise UploadConflict('Another chunk of this upload is being written', meta['received'])
+            self._writing.add(part_path)
+        try:
+            with open(part_path, 'r+b') as file:
+                received = file.seek(0, os.SEEK_END)
+                if offset != received:
+                    raise UploadConflict(f'Expected a chunk at offset {received}', received)
+                remaining = length
+                while remaining:
+                    block = stream.read(min(remaining, BLOCK_SIZE))
+                    if not block:
+                        break
+                    file.write(block)
+                    remaining -= len(block)
+                return file.tell()
+        finally:
+            with self._lock:
+                self._writing.discard(part_path)
+
+    def finish(self, upload_id: str, destination: str) -> str:
+        """Move a complete upload to ``destination`` and return its original filename."""
+        meta = self.status(upload_id)
+        if meta['received'] != meta['size']:
+            raise UploadConflict(f'Upload has {meta["received"]} of {meta["size"]} bytes', meta['received'])
+        part_path, meta_path = self._paths(upload_id)
+        with self._lock:
+            if part_path in self._writing:
+                raise UploadConflict('A chunk of this upload is still being written', meta['received'])
+            os.replace(part_path, destination)
+        os.remove(meta_path)
+        return meta['filename']
+
+    def discard(self, upload_id: str) -> None:
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def expire(self) -> None:
+        """Remove uploads that haven't received anything for ``expiry`` seconds."""
+        cutoff = time.time() - self.expiry
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                    self.discard(entry.name[:-len('.part')])
@@ -0,0 +1,251 @@
+"""Directory walker built on os.scandir with compiled exclude and ignore-file matching."""
+
+import fnmatch
+import functools
+import os
+import re
+import stat
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Per-directory ignore files honored when ignore files are enabled
+IGNORE_FILES = ('.gitignore', '.ignore')
+
+
+class ExcludeMatcher:
+    """Glob patterns compiled into one regex each for names and for paths.
+
+    A pattern without a slash (``node_modules``, ``*.min.js``) is matched
+    against every path component; a pattern with a slash (``docs/build``)
+    is matched against the path relative to the walk root.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        names, paths = [], []
+        for pattern in patterns:
+            pattern = pattern.strip().strip('/')
+            if not pattern:
+                continue
+            (paths if '/' in pattern else names).append(fnmatch.translate(pattern))
+        self._names = re.compile('|'.join(names)) if names else None
+        self._paths = re.compile('|'.join(paths)) if paths else None
+
+    def match(self, name: str, relative_path: str = '') -> bool:
+        """Check a single entry given its name and its '/'-separated relative path."""
+        if self._names is not None and self._names.match(name):
+            return True
+        return self._paths is not None and bool(self._paths.match(relative_path or name))
+
+    def match_path(self, path: str) -> bool:
+        """Check a path relative to the walk root, and each directory above it, as the walker would.
+
+        Slash patterns are anchored at the root, as in .gitignore, so
+        ``build/out`` excludes ``build/out/x`` but not ``src/build/out``.
+        """
+        parts = [part for part in path.replace(os.sep, '/').split('/') if part]
+        if self._names is not None and any(self._names.match(part) for part in parts):
+            return True
+        if self._paths is not None:
+            for end in range(1, len(parts) + 1):
+                if self._paths.match('/'.join(parts[:end])):
+                    return True
+        return False
+
+
+@functools.lru_cache(maxsize=32)
+def compile_excludes(patterns: Tuple[str, ...]) -> ExcludeMatcher:
+    """Return a cached matcher for a tuple of exclude patterns."""
+    return ExcludeMatcher(patterns)
+
+
+def _translate_ignore(pattern: str) -> str:
+    """Translate a gitignore glob into a regex matching a '/'-separated relative path."""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    regex, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex.append('/.*')
+            i += 3
+        elif pattern[i] == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            regex.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            close = pattern.index(']', i + 1)
+            regex.append('[' + pattern[i + 1:close].replace('!', '^', 1).replace('\\', '\\\\') + ']')
+            i = close + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return prefix + ''.join(regex) + r'\Z'
+
+
+class IgnoreFile:
+    """The rules of one .gitignore/.ignore file, relative to its directory."""
+
+    def __init__(self, base: str, lines: Iterable[str]):
+        self.base = base
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            if line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if line:
+                self.rules.append((re.compile(_translate_ignore(line)), negate, dir_only))
+
+    @classmethod
+    def load(cls, directory: str, base: str) -> Optional['IgnoreFile']:
+        lines: List[str] = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='ignore') as file:
+                    lines.extend(file)
+            except OSError:
+                continue
+        ignore = cls(base, lines)
+        return ignore if ignore.rules else None
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True if ignored, False if re-included, None if no rule applies."""
+        if self.base:
+            if not relative_path.startswith(self.base + '/'):
+                return None
+            relative_path = relative_path[len(self.base) + 1:]
+        for regex, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                return not negate
+        return None
+
+
+def _is_ignored(ignores: Sequence[IgnoreFile], relative_path: str, is_dir: bool) -> bool:
+    # Deeper ignore files override their parents
+    for ignore in reversed(ignores):
+        verdict = ignore.match(relative_path, is_dir)
+        if verdict is not None:
+            return verdict
+    return False
+
+
+def is_ignored(root: str, relative_path: str, cache: Optional[Dict[str, Optional[IgnoreFile]]] = None) -> bool:
+    """Check one path against the ignore files of the directories above it, as ``walk_files`` would.
+
+    ``cache`` keeps the ignore files loaded per directory across calls,
+    for checking a batch of paths.
+    """
+    cache = {} if cache is None else cache
+    parts = relative_path.replace(os.sep, '/').split('/')
+    ignores: List[IgnoreFile] = []
+    for depth in range(len(parts)):
+        relative_dir = '/'.join(parts[:depth])
+        if depth and _is_ignored(ignores, relative_dir, True):
+            return True
+        if relative_dir not in cache:
+            cache[relative_dir] = IgnoreFile.load(os.path.join(root, relative_dir), relative_dir)
+        if cache[relative_dir] is not None:
+            ignores.append(cache[relative_dir])
+    return _is_ignored(ignores, '/'.join(parts), False)
+
+
+def walk_files(root: str, exclude: Iterable[str] = (), recursive: bool = True,
+               use_ignore_files: bool = False, skip: Iterable[str] = ()) -> Iterator[Tuple[os.DirEntry, str]]:
+    """Yield ``(entry, relative_path)`` for every file under ``root``, in sorted order.
+
+    Excluded and ignored directories are pruned before they are opened,
+    and directories listed in ``skip`` (such as the output directory) are
+    never entered. The ``DirEntry`` objects carry their cached stat
+    results, so callers should use ``entry.stat()`` instead of
+    ``os.stat``.
+    """
+    matcher = compile_excludes(tuple(exclude))
+    skip = {os.path.abspath(path) for path in skip}
+    root = os.path.abspath(root)
+    stack: List[Tuple[str, str, Tuple[IgnoreFile, ...]]] = [(root, '', ())]
+
+    while stack:
+        directory, relative_dir, ignores = stack.pop()
+        if use_ignore_files:
+            ignore = IgnoreFile.load(directory, relative_dir)
+            if ignore is not None:
+                ignores = ignores + (ignore,)
+
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            relative_path = relative_dir + '/' + entry.name if relative_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if matcher.match(entry.name, relative_path):
+                continue
+            if ignores and _is_ignored(ignores, relative_path, is_dir):
+                continue
+            if is_dir:
+                if recursive and entry.path not in skip:
+                    subdirs.append((entry.path, relative_path, ignores))
+            elif entry.is_file():
+                yield entry, relative_path.replace('/', os.sep)
+
+        stack.extend(reversed(subdirs))
+
+
+class PathEntry:
+    """Stand-in for ``os.DirEntry`` for files named in a list rather than found by a scan."""
+
+    __slots__ = ('path', 'name', '_stat')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat: Optional[os.stat_result] = None
+
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_file(self) -> bool:
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+def walk_paths(root: str, relative_paths: Iterable[str], exclude: Iterable[str] = (),
+               skip: Iterable[str] = ()) -> Iterator[Tuple[PathEntry, str]]:
+    """Yield ``(entry, relative_path)`` like ``walk_files``, but only for the listed paths.
+
+    Paths are '/'-separated and relative to ``root``, as git prints them.
+    Those that no longer exist, aren't regular files, are excluded or lie
+    under a directory in ``skip`` are left out.
+    """
+    matcher = compile_excludes(tuple(exclude))
+    skip = [os.path.abspath(path) + os.sep for path in skip]
+    root = os.path.abspath(root)
+    for relative_path in sorted(relative_paths):
+        if matcher.match_path(relative_path):
+            continue
+        entry = PathEntry(os.path.join(root, relative_path.replace('/', os.sep)))
+        if any(entry.path.startswith(directory) for directory in skip) or not entry.is_file():
+            continue
+        yield entry, relative_path.replace('/', os.sep)
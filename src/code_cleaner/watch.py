@@ -0,0 +1,258 @@
+"""Watch a source tree for changed files, with inotify on Linux and by polling elsewhere."""
+
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from code_cleaner.walker import compile_excludes, walk_files
+
+# Seconds without events before a burst of changes is handed over
+DEBOUNCE = 0.2
+
+# Seconds after which a burst that never settles is handed over anyway
+MAX_DELAY = 2.0
+
+# Seconds between scans of the polling watcher
+POLL_INTERVAL = 1.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# Closing after a write rather than every write, so a file is reported once it is complete
+_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+# struct inotify_event without its trailing name
+_EVENT = struct.Struct('iIII')
+
+
+def _load_inotify():
+    if not sys.platform.startswith('linux'):
+        raise OSError('inotify is only available on Linux')
+    # Imported here: polling platforms, and runs without --watch, don't need ctypes
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    try:
+        libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        libc.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        libc.inotify_init1.argtypes = (ctypes.c_int,)
+    except AttributeError:
+        raise OSError('The C library has no inotify support') from None
+    return libc, ctypes.get_errno
+
+
+class InotifyWatcher:
+    """Recursive inotify watch of a tree, with one watch per directory.
+
+    Directories created or moved into the tree are watched as they appear,
+    and the files already in them reported. Excluded directories and those
+    in ``skip`` are never watched. ``read`` returns changed paths relative
+    to ``root``; a removed or moved-away directory is reported as itself.
+    If the kernel queue overflows, every file in the tree is reported.
+    """
+
+    kind = 'inotify'
+
+    def __init__(self, root: str, exclude: Iterable[str] = (), recursive: bool = True, skip: Iterable[str] = ()):
+        self.root = os.path.abspath(root)
+        self._matcher = compile_excludes(tuple(exclude))
+        self._recursive = recursive
+        self._skip = {os.path.abspath(path) for path in skip}
+        self._libc, self._errno = _load_inotify()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = self._errno()
+            raise OSError(error, f'inotify_init1: {os.strerror(error)}')
+        self._dirs: Dict[int, str] = {}
+        try:
+            self._add_tree('')
+        except BaseException:
+            self.close()
+            raise
+
+    def _add(self, relative_dir: str) -> bool:
+        path = os.path.join(self.root, relative_dir)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _MASK)
+        if wd < 0:
+            error = self._errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, 'Out of inotify watches; raise fs.inotify.max_user_watches or poll')
+            # Removed again before it could be watched
+            return False
+        self._dirs[wd] = relative_dir
+        return True
+
+    def _add_tree(self, relative_dir: str) -> List[str]:
+        """Watch a directory and those below it, and return the files in them."""
+        files = []
+        stack = [relative_dir]
+        while stack:
+            current = stack.pop()
+            # Watched before it is listed, so a file created in between is still seen
+            if not self._add(current):
+                continue
+            try:
+                with os.scandir(os.path.join(self.root, current)) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                relative_path = current + '/' + entry.name if current else entry.name
+                if self._matcher.match(entry.name, relative_path):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if not is_dir:
+                    files.append(relative_path)
+                elif self._recursive and entry.path not in self._skip:
+                    stack.append(relative_path)
+        return files
+
+    def _remove_tree(self, relative_dir: str) -> None:
+        prefix = relative_dir + '/'
+        for wd, directory in list(self._dirs.items()):
+            if directory == relative_dir or directory.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def read(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait up to ``timeout`` seconds (forever if None) for events and return the paths they touch."""
+        changed: Set[str] = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return changed
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self._add_tree(''))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            relative_path = directory + '/' + name if directory else name
+            if self._matcher.match(name, relative_path):
+                continue
+            if not mask & IN_ISDIR:
+                changed.add(relative_path)
+            elif self._recursive and os.path.join(self.root, relative_path) not in self._skip:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self._add_tree(relative_path))
+                else:
+                    if mask & IN_MOVED_FROM:
+                        self._remove_tree(relative_path)
+                    changed.add(relative_path)
+        return {path.replace('/', os.sep) for path in changed}
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Finds changes by rescanning the tree every ``interval`` seconds and comparing sizes and mtimes.
+
+    Used where inotify isn't available or runs out of watches, and on
+    network filesystems, which don't deliver inotify events for changes
+    made by other machines.
+    """
+
+    kind = 'polling'
+
+    def __init__(self, root: str, exclude: Iterable[str] = (), recursive: bool = True, skip: Iterable[str] = (),
+                 interval: float = POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.exclude = tuple(exclude)
+        self.recursive = recursive
+        self.skip = tuple(skip)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next = time.monotonic() + interval
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for entry, relative_path in walk_files(self.root, self.exclude, self.recursive, skip=self.skip):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[relative_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def read(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait up to ``timeout`` seconds (forever if None) for the next scan and return the paths it found changed."""
+        wait = self._next - time.monotonic()
+        if timeout is not None and timeout < wait:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        snapshot = self._scan()
+        self._next = time.monotonic() + self.interval
+        changed = {path for path, signature in snapshot.items() if self._snapshot.get(path) != signature}
+        changed.update(self._snapshot.keys() - snapshot.keys())
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(root: str, exclude: Iterable[str] = (), recursive: bool = True, skip: Iterable[str] = (),
+                 poll: Optional[float] = None):
+    """Return an inotify watcher of ``root``, or a polling one if ``poll`` is given or inotify is unavailable."""
+    if poll is None:
+        try:
+            return InotifyWatcher(root, exclude, recursive, skip)
+        except OSError as e:
+            print(f"Warning: Falling back to polling: {e}", file=sys.stderr)
+    return PollingWatcher(root, exclude, recursive, skip, poll or POLL_INTERVAL)
+
+
+def debounced(watcher, debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY) -> Iterator[Set[str]]:
+    """Yield the sets of paths changed, each once events have stopped for ``debounce`` seconds.
+
+    Coalescing bursts (a branch switch, a formatter run) means each file
+    is cleaned once per burst rather than once per event. A burst that
+    keeps going is still handed over every ``max_delay`` seconds.
+    """
+    while True:
+        changed = watcher.read()
+        if not changed:
+            continue
+        deadline = time.monotonic() + max_delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = watcher.read(min(debounce, remaining))
+            if not more:
+                break
+            changed |= more
+        yield changed
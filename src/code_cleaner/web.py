@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from flask import Flask, request, render_template, send_file, jsonify
+from flask import Flask, Response, request, render_template, send_file, jsonify
 import os
 import zipfile
 import tempfile
@@ -12,7 +12,16 @@ import sys
 from pathlib import Path
 
 # Import the processing functions from the CLI module
-from code_cleaner.cli import process_file, detect_language, should_process_file
+from code_cleaner.archive import clean_archive, stream_archive
+from code_cleaner.budget import Budget
+from code_cleaner.cli import clean_file, detect_language, should_process_file
+from code_cleaner.clone import clone_file
+from code_cleaner.jobs import JobQueue, QueueFull, is_job_id
+from code_cleaner.profiler import Profiler
+from code_cleaner.safezip import ArchiveLimits, UnsafeArchive, open_archive
+from code_cleaner.store import ResultStore
+from code_cleaner.uploads import ChunkedUploads, UploadConflict, UploadNotFound, UploadTooLarge
+from code_cleaner.walker import walk_files
 
 # Create Flask app
 app = Flask(__name__)
@@ -20,17 +29,35 @@ app = Flask(__name__)
 # Default configuration
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['PROCESSED_FOLDER'] = 'processed'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload size
+# Largest request body: a whole upload to /upload, or one chunk of a chunked upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('CODE_CLEANER_MAX_REQUEST_MB', 16)) * 1024 * 1024
+# Chunk size suggested to clients, largest chunked upload, and hours before an abandoned one is removed
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('CODE_CLEANER_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('CODE_CLEANER_MAX_UPLOAD_MB', 2048)) * 1024 * 1024
+app.config['UPLOAD_EXPIRY_HOURS'] = float(os.environ.get('CODE_CLEANER_UPLOAD_EXPIRY_HOURS', 24))
+# Entry count, sizes and compression ratio an uploaded archive must stay within
+app.config['ARCHIVE_LIMITS'] = ArchiveLimits.from_env()
+# Seconds and size allowed to clean one file before it is copied unchanged instead;
+# 30 seconds unless configured, so one file can't hold up a worker, and no size limit
+app.config['FILE_BUDGET'] = Budget.from_env(seconds=30.0)
+# Write a per-job timing trace next to each processed job
+app.config['PROFILE'] = os.environ.get('CODE_CLEANER_PROFILE', '') not in ('', '0')
+# Jobs processed at the same time, and jobs allowed to wait before uploads get a 503
+app.config['MAX_CONCURRENT_JOBS'] = int(os.environ.get('CODE_CLEANER_MAX_JOBS', 2))
+app.config['MAX_QUEUED_JOBS'] = int(os.environ.get('CODE_CLEANER_MAX_QUEUED', 16))
+# Clean uploads while /download streams the result, instead of queueing a job first
+app.config['STREAM_DOWNLOADS'] = os.environ.get('CODE_CLEANER_STREAM_DOWNLOADS', '') not in ('', '0')
+# Keep each completed stream as processed.zip, so repeat downloads are served from disk
+app.config['CACHE_STREAMED_DOWNLOADS'] = os.environ.get('CODE_CLEANER_CACHE_STREAMS', '1') not in ('', '0')
+# Store of cleaned files shared by all jobs (empty to disable), and when its entries are evicted
+app.config['RESULT_STORE'] = os.environ.get('CODE_CLEANER_STORE', 'result_store')
+app.config['RESULT_STORE_MB'] = int(os.environ.get('CODE_CLEANER_STORE_MB', 1024))
+app.config['RESULT_STORE_DAYS'] = float(os.environ.get('CODE_CLEANER_STORE_DAYS', 30))
 
-# Try to import Ollama if available
-try:
-    from langchain.llms import Ollama
-    from langchain.chains import LLMChain
-    from langchain.prompts import PromptTemplate
-    ollama_llm = Ollama(model="llama3.2")
-except Exception as e:
-    print(f"Warning: Could not initialize Ollama: {e}")
-    ollama_llm = None
+# Created on first use so the settings above can be changed before
+job_queue = None
+result_store = None
+chunked_uploads = None
 
 
 @app.route('/')
@@ -63,59 +90,270 @@ def upload_file():
     zip_path = os.path.join(upload_dir, secure_filename(file.filename))
     file.save(zip_path)
     
-    # Extract the ZIP file
-    extract_dir = os.path.join(upload_dir, 'extracted')
-    os.makedirs(extract_dir, exist_ok=True)
+    return queue_upload(job_id, zip_path, upload_dir, processed_dir)
+
+
+@app.route('/uploads', methods=['POST'])
+def start_chunked_upload():
+    """Start a chunked upload of a large archive; the chunks are then PUT to the returned URL."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not filename.endswith('.zip'):
+        return jsonify({'error': 'Only ZIP files are supported'}), 400
+    if not isinstance(data.get('size'), int):
+        return jsonify({'error': 'The upload size is required'}), 400
     
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
+    try:
+        upload_id = get_chunked_uploads().start(filename, data['size'])
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     
-    # Process the files
-    process_files(extract_dir, processed_dir)
+    return jsonify({
+        'upload_id': upload_id,
+        'upload_url': f'/uploads/{upload_id}',
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Report how many bytes of an upload arrived, so a client can resume after a failed chunk."""
+    try:
+        status = get_chunked_uploads().status(upload_id)
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'received': status['received'], 'size': status['size']})
+
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the request body at the byte offset given in the Upload-Offset header."""
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'error': 'Upload-Offset and Content-Length headers are required'}), 400
     
-    # Create a ZIP file with the processed files
-    processed_zip_path = os.path.join(processed_dir, 'processed.zip')
-    create_zip(processed_dir, processed_zip_path)
+    try:
+        received = get_chunked_uploads().append(upload_id, offset, request.stream, request.content_length)
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except UploadConflict as e:
+        return jsonify({'error': str(e), 'received': e.received}), 409
+    return jsonify({'received': received})
+
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Turn a fully received chunked upload into a job, as /upload does."""
+    uploads = get_chunked_uploads()
+    try:
+        filename = uploads.status(upload_id)['filename']
+    except UploadNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    
+    job_id = str(uuid.uuid4())
+    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+    processed_dir = os.path.join(app.config['PROCESSED_FOLDER'], job_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(processed_dir, exist_ok=True)
+    
+    zip_path = os.path.join(upload_dir, secure_filename(filename))
+    try:
+        uploads.finish(upload_id, zip_path)
+    except (UploadNotFound, UploadConflict) as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        shutil.rmtree(processed_dir, ignore_errors=True)
+        status = 404 if isinstance(e, UploadNotFound) else 409
+        return jsonify({'error': str(e)}), status
+    
+    return queue_upload(job_id, zip_path, upload_dir, processed_dir)
+
+
+def queue_upload(job_id, zip_path, upload_dir, processed_dir):
+    """Check a saved upload against the archive limits and queue its job, or stream it."""
+    try:
+        open_archive(zip_path, app.config['ARCHIVE_LIMITS']).close()
+    except zipfile.BadZipFile as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        shutil.rmtree(processed_dir, ignore_errors=True)
+        return jsonify({'error': str(e) if isinstance(e, UnsafeArchive) else 'Invalid ZIP file format'}), 400
+    
+    # In streaming mode the download itself does the cleaning
+    if app.config['STREAM_DOWNLOADS']:
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'stream': True,
+            'download_url': f'/download/{job_id}'
+        })
+    
+    # Hand the work to a background worker and answer right away
+    try:
+        get_job_queue().submit(run_job, zip_path, processed_dir, job_id=job_id)
+    except QueueFull:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        shutil.rmtree(processed_dir, ignore_errors=True)
+        return jsonify({'error': 'Server is busy, please retry later'}), 503
     
     return jsonify({
         'success': True,
         'job_id': job_id,
+        'status_url': f'/status/{job_id}',
         'download_url': f'/download/{job_id}'
-    })
+    }), 202
+
+
+@app.route('/status/<job_id>')
+def status(job_id):
+    if not is_job_id(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    result = job.to_dict()
+    result['queue_position'] = get_job_queue().position(job)
+    if job.status == 'done':
+        result.update(job.result)
+    return jsonify(result)
 
 
 @app.route('/download/<job_id>')
 def download(job_id):
-    processed_zip_path = os.path.join(app.config['PROCESSED_FOLDER'], job_id, 'processed.zip')
-    if not os.path.exists(processed_zip_path):
+    # Checked before it goes into any path, so '..' can't reach outside the job folders
+    if not is_job_id(job_id):
         return jsonify({'error': 'File not found'}), 404
+    job = get_job_queue().get(job_id)
+    if job is not None and job.status != 'done':
+        return jsonify({'error': 'Job has not finished', 'status': job.status}), 409
+    processed_zip_path = os.path.join(app.config['PROCESSED_FOLDER'], job_id, 'processed.zip')
+    if os.path.exists(processed_zip_path):
+        return send_file(processed_zip_path, as_attachment=True, download_name='processed_code.zip')
+    
+    # Stream the archive while cleaning it, if asked for and the upload is still around;
+    # not for an upload with a job, which would clean it a second time
+    if job is None and (app.config['STREAM_DOWNLOADS'] or request.args.get('stream') == '1'):
+        zip_path = find_upload(job_id)
+        if zip_path is not None:
+            if not zipfile.is_zipfile(zip_path):
+                return jsonify({'error': 'Invalid ZIP file format'}), 400
+            # The stream does a job's work, so it takes a job's slot
+            try:
+                get_job_queue().start_stream()
+            except QueueFull:
+                return jsonify({'error': 'Server is busy, please retry later'}), 503
+            cache_path = processed_zip_path if app.config['CACHE_STREAMED_DOWNLOADS'] else None
+            response = Response(stream_archive(zip_path, cache_path=cache_path, store=get_result_store(),
+                                               limits=app.config['ARCHIVE_LIMITS'], budget=app.config['FILE_BUDGET']),
+                                mimetype='application/zip',
+                                headers={'Content-Disposition': 'attachment; filename=processed_code.zip'})
+            response.call_on_close(get_job_queue().end_stream)
+            return response
+    
+    return jsonify({'error': 'File not found'}), 404
+
+
+def get_job_queue():
+    """Return the shared job queue, creating it from the app config on first use."""
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(app.config['MAX_CONCURRENT_JOBS'], app.config['MAX_QUEUED_JOBS'])
+    return job_queue
+
+
+def get_result_store():
+    """Return the shared result store, creating it on first use, or None if it is disabled."""
+    global result_store
+    if result_store is None and app.config['RESULT_STORE']:
+        result_store = ResultStore(app.config['RESULT_STORE'], app.config['RESULT_STORE_MB'] * 1024 * 1024,
+                                   app.config['RESULT_STORE_DAYS'] * 86400)
+    return result_store
+
+
+def get_chunked_uploads():
+    """Return the chunked uploads in progress, kept next to the other uploads."""
+    global chunked_uploads
+    if chunked_uploads is None:
+        chunked_uploads = ChunkedUploads(os.path.join(app.config['UPLOAD_FOLDER'], 'chunked'),
+                                         app.config['MAX_UPLOAD_SIZE'], app.config['UPLOAD_EXPIRY_HOURS'] * 3600)
+    return chunked_uploads
+
+
+def find_upload(job_id):
+    """Return the path of a job's uploaded ZIP file, or None if there is none."""
+    if not is_job_id(job_id):
+        return None
+    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+    if os.path.isdir(upload_dir):
+        for name in sorted(os.listdir(upload_dir)):
+            if name.endswith('.zip'):
+                return os.path.join(upload_dir, name)
+    return None
+
+
+def run_job(job, zip_path, processed_dir):
+    """Clean one upload into a new ZIP; runs on a job queue worker.
+    
+    Members are read from the uploaded archive and written to the processed
+    one in a single pass, without extracting anything to disk.
+    """
+    profiler = Profiler() if app.config['PROFILE'] else None
+    processed_zip_path = os.path.join(processed_dir, 'processed.zip')
+    store = get_result_store()
+    processed, skipped, over_budget = clean_archive(zip_path, processed_zip_path, progress=job.progress,
+                                                    profiler=profiler, store=store,
+                                                    limits=app.config['ARCHIVE_LIMITS'],
+                                                    budget=app.config['FILE_BUDGET'])
+    if store is not None:
+        store.evict()
     
-    return send_file(processed_zip_path, as_attachment=True, download_name='processed_code.zip')
+    if profiler is not None:
+        profiler.write_trace(os.path.join(app.config['PROCESSED_FOLDER'], f'{job.id}.profile.json'))
+    
+    return {'processed_files': processed, 'skipped_files': skipped, 'over_budget_files': over_budget,
+            'download_url': f'/download/{job.id}'}
 
 
-def process_files(input_dir, output_dir):
-    """Process all files in the input directory and save to the output directory."""
+def process_files(input_dir, output_dir, profiler=None, progress=None, store=None, budget=None):
+    """Process all files in the input directory and save to the output directory.
+    
+    If a Profiler is given, stage timings of every file are recorded in it.
+    ``progress(done, total)`` is called after each file. Files found in a
+    ResultStore ``store`` are taken from it, and files over a Budget
+    ``budget`` are copied unchanged. Both trees are private to the job and
+    never edited in place, so skipped files and outputs identical to their
+    input are hard-linked when no reflink is possible. Returns the number
+    of processed and of copied files.
+    """
     exclude_patterns = ['node_modules', '.git', '__pycache__', '.DS_Store']
+    entries = list(walk_files(input_dir, exclude_patterns))
+    processed = skipped = 0
     
-    for root, dirs, files in os.walk(input_dir):
-        # Skip excluded directories
-        dirs[:] = [d for d in dirs if not any(pattern in os.path.join(root, d) for pattern in exclude_patterns)]
+    for done, (entry, relative_path) in enumerate(entries, 1):
+        file_path = entry.path
+        
+        # Determine the output file
+        output_file = os.path.join(output_dir, relative_path)
         
-        for file in files:
-            file_path = os.path.join(root, file)
-            
-            # Determine the relative path for the output file
-            relative_path = os.path.relpath(file_path, input_dir)
-            output_file = os.path.join(output_dir, relative_path)
-            
-            # Create the necessary directories in the output folder
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            # Process the file if it should be processed, otherwise just copy it
-            if should_process_file(file_path, exclude_patterns, output_dir):
-                process_file(file_path, output_file)
-            else:
-                shutil.copy2(file_path, output_file)
+        # Create the necessary directories in the output folder
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        
+        # Process the file if it should be processed, otherwise just copy it
+        if should_process_file(file_path, [], output_dir, entry.stat()):
+            stats = clean_file(file_path, output_file, profile=profiler is not None, store=store, budget=budget,
+                               hardlink=True)
+            if stats is not None and profiler is not None:
+                profiler.add_file(relative_path, stats)
+            processed += 1
+        else:
+            clone_file(file_path, output_file, hardlink=True)
+            skipped += 1
+        
+        if progress is not None:
+            progress(done, len(entries))
+    
+    return processed, skipped
 
 
 def create_zip(directory, zip_path):
@@ -0,0 +1,65 @@
+"""Archives cleaned in one pass, written to a file or streamed."""
+
+import io
+import random
+import zipfile
+
+from code_cleaner import archive
+
+
+def _make_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in members.items():
+            target.writestr(name, data)
+
+
+def test_stream_buffers_a_bounded_amount_of_a_large_member(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'CHUNK_SIZE', 64 * 1024)
+    sinks = []
+
+    class RecordingSink(archive._StreamSink):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            sinks.append(self)
+
+    monkeypatch.setattr(archive, '_StreamSink', RecordingSink)
+    generator = random.Random(0)
+    big = ''.join('v%d = "%x"  # note\n' % (n, generator.getrandbits(64)) for n in range(100000))
+    source = tmp_path / 'in.zip'
+    _make_zip(source, {'small.py': 'x = 1  # note\n', 'big.py': big})
+
+    output = io.BytesIO()
+    for chunk in archive.stream_archive(str(source), stream_threshold=64 * 1024):
+        assert len(chunk) <= archive.CHUNK_SIZE
+        output.write(chunk)
+
+    assert sinks[0].peak <= (archive.STREAM_BUFFER_CHUNKS + 2) * archive.CHUNK_SIZE
+    with zipfile.ZipFile(output) as result:
+        assert result.read('small.py') == b'x = 1  \n'
+        assert result.read('big.py').count(b'# note') == 0
+
+
+def test_abandoned_stream_leaves_no_cache(tmp_path):
+    source = tmp_path / 'in.zip'
+    _make_zip(source, {'a.py': 'a = 1\n', 'b.py': 'b = 2\n'})
+    cache = tmp_path / 'out.zip'
+    stream = archive.stream_archive(str(source), cache_path=str(cache))
+    next(stream)
+    stream.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['in.zip']
+
+
+def test_unchanged_members_are_copied_raw(tmp_path):
+    source = tmp_path / 'in.zip'
+    with zipfile.ZipFile(source, 'w', zipfile.ZIP_STORED) as target:
+        target.writestr('clean.py', 'x = 1\n')
+        target.writestr('dirty.py', 'x = 1  # note\n')
+    for spool in (False, True):
+        output = tmp_path / 'out.zip'
+        archive.clean_archive(str(source), str(output), stream_threshold=0 if spool else archive.STREAM_THRESHOLD)
+        with zipfile.ZipFile(output) as result:
+            # Copied raw, so still stored; cleaned members are always deflated
+            assert result.getinfo('clean.py').compress_type == zipfile.ZIP_STORED
+            assert result.getinfo('dirty.py').compress_type == zipfile.ZIP_DEFLATED
+            assert result.read('clean.py') == b'x = 1\n'
+            assert result.read('dirty.py') == b'x = 1  \n'
@@ -0,0 +1,55 @@
+"""The static dead-code pass may only remove what can't change what the program does."""
+
+from code_cleaner.deadcode import analyze
+
+
+def test_python_code_after_return_is_removed():
+    text = 'def f():\n    return 1\n    print(2)\n'
+    assert analyze(text, 'python').text == 'def f():\n    return 1\n'
+
+
+def test_python_if_false_as_only_statement_leaves_pass():
+    text = 'def f():\n    if False:\n        g()\n'
+    assert analyze(text, 'python').text == 'def f():\n    pass\n'
+
+
+def test_python_unused_private_function_is_only_a_candidate():
+    text = 'def _unused():\n    return 1\n'
+    analysis = analyze(text, 'python')
+    assert analysis.text == text
+    assert analysis.uncertain == [1]
+
+
+def test_c_false_block_is_removed_between_statements():
+    text = 'int f() {\n  a();\n  if (0) {\n    g();\n  }\n  h();\n}\n'
+    assert analyze(text, 'c').text == 'int f() {\n  a();\n  h();\n}\n'
+
+
+def test_c_false_block_as_body_of_braceless_if_becomes_empty_statement():
+    text = 'if (x)\n    if (0) {\n g();\n }\n h();\n'
+    assert analyze(text, 'c').text == 'if (x)\n    ;\n h();\n'
+
+
+def test_c_false_block_as_body_of_braceless_loop_becomes_empty_statement():
+    text = 'for (;;)\n while (false) {\n g();\n }\n h();'
+    assert analyze(text, 'c').text == 'for (;;)\n ;\n h();'
+
+
+def test_c_false_block_after_else_becomes_empty_statement():
+    text = 'if (x) a();\nelse\n  if (0) {\n    g();\n  }\nh();\n'
+    assert analyze(text, 'c').text == 'if (x) a();\nelse\n  ;\nh();\n'
+
+
+def test_c_false_block_with_else_is_kept():
+    text = 'if (0) {\n  g();\n}\nelse {\n  h();\n}\n'
+    assert analyze(text, 'c').text == text
+
+
+def test_javascript_false_block_with_var_is_kept():
+    text = 'a();\nif (false) {\n  var x = 1;\n}\n'
+    assert analyze(text, 'javascript').text == text
+
+
+def test_c_if_0_preprocessor_block_is_removed():
+    text = 'a();\n#if 0\ng();\n#endif\nh();\n'
+    assert analyze(text, 'c').text == 'a();\nh();\n'
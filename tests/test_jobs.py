@@ -0,0 +1,42 @@
+"""Streams and jobs share the worker slots of a JobQueue."""
+
+import threading
+
+import pytest
+
+from code_cleaner.jobs import JobQueue, QueueFull
+
+
+def test_stream_takes_a_worker_slot():
+    queue = JobQueue(workers=1)
+    queue.start_stream()
+    with pytest.raises(QueueFull):
+        queue.start_stream()
+
+    started = threading.Event()
+    job = queue.submit(lambda job: started.set())
+    assert not started.wait(0.2)
+    assert job.status == 'queued'
+
+    queue.end_stream()
+    assert started.wait(5)
+
+
+def test_running_job_blocks_a_stream():
+    queue = JobQueue(workers=1)
+    running, release = threading.Event(), threading.Event()
+    queue.submit(lambda job: (running.set(), release.wait(5)))
+    assert running.wait(5)
+    with pytest.raises(QueueFull):
+        queue.start_stream()
+
+    release.set()
+    for _ in range(50):
+        try:
+            queue.start_stream()
+            break
+        except QueueFull:
+            threading.Event().wait(0.1)
+    else:
+        pytest.fail('the slot was not given back')
+    queue.end_stream()
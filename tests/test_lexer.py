@@ -0,0 +1,25 @@
+"""Scanner output on literals that look like comments or log calls."""
+
+from code_cleaner.rules import rules
+
+
+def test_comment_markers_in_strings_are_kept():
+    text = 'url = "http://x" # link\ns = \'# not\'  # yes\n'
+    stats = {}
+    assert rules.get('python').clean(text, stats) == 'url = "http://x" \ns = \'# not\'  \n'
+    assert stats == {'comment_bytes': len('# link# yes')}
+
+
+def test_rust_char_literal_quote_does_not_open_a_string():
+    text = "let q = '\"'; // comment\nprintln!(\"x\");\nlet y = 1;\n"
+    assert rules.get('rust').clean(text) == "let q = '\"'; \n;\nlet y = 1;\n"
+
+
+def test_rust_lifetimes_are_not_char_literals():
+    text = "fn f<'a>(x: &'a str) -> &'a str { x } // it's\n"
+    assert rules.get('rust').clean(text) == "fn f<'a>(x: &'a str) -> &'a str { x } \n"
+
+
+def test_rust_escaped_char_literals():
+    text = "let a = '\\''; let b = '\\u{1F600}'; // c\nlet c = '\"';\n"
+    assert rules.get('rust').clean(text) == "let a = '\\''; let b = '\\u{1F600}'; \nlet c = '\"';\n"
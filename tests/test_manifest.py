@@ -0,0 +1,34 @@
+"""Removing the outputs of deleted sources stays inside the output directory."""
+
+import os
+
+from code_cleaner.manifest import Manifest, remove_output
+
+
+def test_symlinked_output_directory_is_unlinked_not_emptied(tmp_path):
+    target = tmp_path / 'elsewhere'
+    target.mkdir()
+    (target / 'keep.py').write_text('x = 1\n')
+    output = tmp_path / 'out'
+    output.mkdir()
+    os.symlink(target, output / 'linked')
+
+    assert remove_output(str(output), 'linked')
+    assert not os.path.lexists(output / 'linked')
+    assert (target / 'keep.py').exists()
+
+
+def test_remove_stale_only_removes_outputs_of_deleted_sources(tmp_path):
+    source, output = tmp_path / 'src', tmp_path / 'out'
+    for directory in (source / 'pkg', output / 'pkg'):
+        directory.mkdir(parents=True)
+    (source / 'pkg' / 'kept.py').write_text('x = 1\n')
+    for name in ('kept.py', 'gone.py'):
+        (output / 'pkg' / name).write_text('x = 1\n')
+
+    manifest = Manifest(str(output))
+    entry = {'size': 0, 'mtime': 0, 'hash': '', 'rules': ''}
+    manifest.entries = {os.path.join('pkg', 'kept.py'): entry, os.path.join('pkg', 'gone.py'): entry}
+    assert manifest.remove_stale(str(source)) == [os.path.join('pkg', 'gone.py')]
+    assert (output / 'pkg' / 'kept.py').exists()
+    assert not (output / 'pkg' / 'gone.py').exists()
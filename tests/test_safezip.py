@@ -0,0 +1,71 @@
+"""Archive checks against zip-slip paths and zip bombs."""
+
+import zipfile
+
+import pytest
+
+from code_cleaner.safezip import ArchiveLimits, UnsafeArchive, check_archive, is_unsafe_path, open_archive
+
+
+def _make_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as target:
+        for name, data in members.items():
+            target.writestr(name, data)
+    return path
+
+
+@pytest.mark.parametrize('name', ['../evil.py', 'src/../../evil.py', '..\\evil.py', '/etc/passwd',
+                                  '\\windows\\evil.py', 'C:evil.py', 'C:/evil.py', 'a\0.py'])
+def test_unsafe_paths(name):
+    assert is_unsafe_path(name)
+
+
+@pytest.mark.parametrize('name', ['evil.py', 'src/app.py', 'dots..py', '..hidden/x.py', 'a/./b.py'])
+def test_safe_paths(name):
+    assert not is_unsafe_path(name)
+
+
+@pytest.mark.parametrize('name', ['../evil.py', '/etc/cron.d/evil'])
+def test_archive_with_unsafe_path_is_refused(tmp_path, name):
+    path = _make_zip(tmp_path / 'in.zip', {'ok.py': 'x = 1\n', name: 'x = 2\n'})
+    with pytest.raises(UnsafeArchive, match='Unsafe path'):
+        open_archive(path, ArchiveLimits())
+
+
+def test_entry_over_size_limit_is_refused(tmp_path):
+    path = _make_zip(tmp_path / 'in.zip', {'big.py': 'x' * 2000})
+    with zipfile.ZipFile(path) as archive:
+        check_archive(archive, ArchiveLimits(max_entry_size=2000))
+        with pytest.raises(UnsafeArchive, match='bytes uncompressed'):
+            check_archive(archive, ArchiveLimits(max_entry_size=1999))
+
+
+def test_total_over_size_limit_is_refused(tmp_path):
+    path = _make_zip(tmp_path / 'in.zip', {'a.py': 'x' * 600, 'b.py': 'y' * 600})
+    with zipfile.ZipFile(path) as archive:
+        with pytest.raises(UnsafeArchive, match='Archive is 1200 bytes'):
+            check_archive(archive, ArchiveLimits(max_total_size=1000))
+
+
+def test_entry_over_ratio_limit_is_refused(tmp_path):
+    path = _make_zip(tmp_path / 'in.zip', {'bomb.txt': b'\0' * (2 * 1024 * 1024)})
+    with zipfile.ZipFile(path) as archive:
+        with pytest.raises(UnsafeArchive, match='compresses'):
+            check_archive(archive, ArchiveLimits(max_ratio=100))
+        # Members under ratio_min_size are allowed to compress well
+        check_archive(archive, ArchiveLimits(max_ratio=100, ratio_min_size=4 * 1024 * 1024))
+
+
+def test_too_many_entries_are_refused(tmp_path):
+    path = _make_zip(tmp_path / 'in.zip', {f'{n}.py': '' for n in range(5)})
+    with pytest.raises(UnsafeArchive, match='5 entries'):
+        open_archive(path, ArchiveLimits(max_entries=4))
+
+
+def test_overlapping_entries_are_refused(tmp_path):
+    path = _make_zip(tmp_path / 'in.zip', {'a.py': 'x' * 100, 'b.py': 'y' * 100}, zipfile.ZIP_STORED)
+    with zipfile.ZipFile(path) as archive:
+        # Point the second entry into the data of the first, as a bomb reusing its data would
+        archive.infolist()[1].header_offset = archive.infolist()[0].header_offset + 10
+        with pytest.raises(UnsafeArchive, match='overlaps'):
+            check_archive(archive, ArchiveLimits())
@@ -0,0 +1,40 @@
+"""Streamed cleaning must give the same output as cleaning the whole text at once."""
+
+import random
+
+from code_cleaner.rules import rules
+
+
+def _stream(scanner, text, chunk_size, spool_size):
+    chunks = (text[start:start + chunk_size] for start in range(0, len(text), chunk_size))
+    return ''.join(scanner.clean_stream(chunks, spool_size=spool_size))
+
+
+def test_log_call_across_a_cut_long_line():
+    scanner = rules.get('javascript').scanner
+    call = 'console.log(' + ','.join(['a'] * 40) + ',b);'
+    for offset in range(0, 200, 7):
+        text = 'x=1;' * 100 + 'y' * offset + call + 'z=2;' * 50 + '\n'
+        expected = scanner.clean(text)
+        assert call not in expected
+        for chunk_size in (64, 100, 333):
+            assert _stream(scanner, text, chunk_size, 256) == expected, (offset, chunk_size)
+
+
+def test_unclosed_log_call_on_a_cut_long_line_is_kept():
+    scanner = rules.get('javascript').scanner
+    text = 'x=1;' * 100 + 'console.log(a, b' + 'z=2;' * 100 + '\nconsole.log(c);\n'
+    expected = scanner.clean(text)
+    assert _stream(scanner, text, 50, 128) == expected
+
+
+def test_fuzz_matches_clean():
+    generator = random.Random(0)
+    tokens = ['console.log(', 'print(', 'printf(', 'System.out.println(', 'a', ')', ';', '"', "'", '\\',
+              '//', '/*', '*/', '#', ' ', 'x', '\n', 'println!(', "'a"]
+    for language in ('javascript', 'python', 'c', 'java', 'rust'):
+        scanner = rules.get(language).scanner
+        for _ in range(300):
+            text = ''.join(generator.choice(tokens) for _ in range(generator.randint(1, 200)))
+            chunk_size = generator.randint(1, 30)
+            assert _stream(scanner, text, chunk_size, 4) == scanner.clean(text), (language, text, chunk_size)
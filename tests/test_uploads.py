@@ -0,0 +1,60 @@
+"""Resumable chunked uploads only accept each chunk at the offset the server holds."""
+
+import io
+
+import pytest
+
+from code_cleaner.uploads import ChunkedUploads, UploadConflict, UploadNotFound, UploadTooLarge
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return ChunkedUploads(str(tmp_path / 'chunks'), max_size=100)
+
+
+def _append(uploads, upload_id, offset, data):
+    return uploads.append(upload_id, offset, io.BytesIO(data), len(data))
+
+
+def test_chunks_in_order_are_assembled(uploads, tmp_path):
+    upload_id = uploads.start('code.zip', 10)
+    assert _append(uploads, upload_id, 0, b'01234') == 5
+    assert _append(uploads, upload_id, 5, b'56789') == 10
+    destination = tmp_path / 'code.zip'
+    assert uploads.finish(upload_id, str(destination)) == 'code.zip'
+    assert destination.read_bytes() == b'0123456789'
+
+
+@pytest.mark.parametrize('offset', [0, 3, 7])
+def test_chunk_at_wrong_offset_is_refused(uploads, offset):
+    upload_id = uploads.start('code.zip', 10)
+    _append(uploads, upload_id, 0, b'01234')
+    with pytest.raises(UploadConflict) as error:
+        _append(uploads, upload_id, offset, b'xyz')
+    # The client is told where to carry on, and nothing was written
+    assert error.value.received == 5
+    assert uploads.status(upload_id)['received'] == 5
+
+
+def test_chunk_past_declared_size_is_refused(uploads):
+    upload_id = uploads.start('code.zip', 10)
+    with pytest.raises(UploadTooLarge):
+        _append(uploads, upload_id, 0, b'0' * 11)
+
+
+def test_upload_over_max_size_is_refused(uploads):
+    with pytest.raises(UploadTooLarge):
+        uploads.start('code.zip', 101)
+
+
+def test_incomplete_upload_cannot_be_finished(uploads, tmp_path):
+    upload_id = uploads.start('code.zip', 10)
+    _append(uploads, upload_id, 0, b'01234')
+    with pytest.raises(UploadConflict):
+        uploads.finish(upload_id, str(tmp_path / 'code.zip'))
+
+
+@pytest.mark.parametrize('upload_id', ['../../etc/passwd', 'not-an-id', ''])
+def test_malformed_upload_ids_are_not_found(uploads, upload_id):
+    with pytest.raises(UploadNotFound):
+        uploads.status(upload_id)